@@ -0,0 +1,104 @@
+"""
+Заглушка Bot API для прогонов бота без Telegram: подставляется в Application
+вместо HTTP-запросов (telegram.request.BaseRequest), отдаёт загруженные заранее
+файлы по getFile/скачиванию и записывает всё, что бот отправляет.
+
+    api = FakeBotAPI(latency=0.03)
+    file_id = api.add_file(data)
+    app = main.build_application(request=api)
+
+Отправленные сообщения лежат в api.calls (метод, chat_id, текст, время); сообщения
+с кнопками — в api.keyboards, чтобы «нажать» кнопку следующим апдейтом (take_button).
+"""
+import asyncio
+import itertools
+import json
+import time
+
+from telegram.request import BaseRequest
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "ReplayBot", "username": "replay_bot"}
+
+
+class FakeBotAPI(BaseRequest):
+    """Ответы Bot API без сети; latency — задержка каждого запроса в секундах."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.files = {}
+        self.calls = []
+        self.keyboards = {}  # (chat_id, callback_data) -> сообщение с этой кнопкой
+        self._ids = itertools.count(1)
+
+    def add_file(self, data: bytes) -> str:
+        file_id = f"file{next(self._ids)}"
+        self.files[file_id] = data
+        return file_id
+
+    def take_button(self, chat_id, action):
+        """
+        (сообщение, callback_data) кнопки action в чате: callback_data равна action или
+        начинается с «action:» (ключ загрузки в кнопке заранее неизвестен); нет — None.
+        """
+        for (chat, data), message in self.keyboards.items():
+            if chat == chat_id and (data == action or data.startswith(action + ":")):
+                del self.keyboards[chat, data]
+                return message, data
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if "/file/bot" in url:
+            # Скачивание: .../file/bot<token>/<file_path>, file_path — это file_id
+            data = self.files.get(url.rsplit("/", 1)[1])
+            return (200, data) if data is not None else (404, b"Not Found")
+
+        api_method = url.rsplit("/", 1)[1]
+        params = request_data.parameters if request_data is not None else {}
+        handler = getattr(self, "_" + api_method, None)
+        result = handler(params) if handler is not None else True
+        if api_method not in ("getMe", "getFile"):
+            self.calls.append((api_method, params.get("chat_id"), params.get("text") or params.get("caption"),
+                               time.perf_counter()))
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    # ---------- Методы Bot API ----------
+
+    def _getMe(self, params):
+        return BOT_USER
+
+    def _getFile(self, params):
+        file_id = params["file_id"]
+        return {"file_id": file_id, "file_unique_id": file_id, "file_size": len(self.files[file_id]),
+                "file_path": file_id}
+
+    def _message(self, params):
+        chat_id = params["chat_id"]
+        message = {
+            "message_id": params.get("message_id") or next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        markup = params.get("reply_markup")
+        if markup:
+            message["reply_markup"] = markup
+            for row in markup.get("inline_keyboard", ()):
+                for button in row:
+                    if "callback_data" in button:
+                        self.keyboards[chat_id, button["callback_data"]] = message
+        return message
+
+    _sendMessage = _message
+    _editMessageText = _message
+    _editMessageReplyMarkup = _message
+    _sendDocument = _message
@@ -0,0 +1,215 @@
+"""
+Сверка xlsx_fast с openpyxl: значения листа (вместе с типами) и готовые отчёты
+должны совпадать. Проверяются синтетические файлы всех форматов (workbooks.py)
+и набор файлов с неудобными ячейками — даты, строки прямо в ячейке, ошибки,
+формулы, разреженные строки, лист без <dimension>.
+
+Кроме того, отчёты потокового разбора (и через xlsx_fast, и через openpyxl) сверяются
+с полной загрузкой листа — для всех форматов, в том числе без <dimension> и с устаревшим
+<dimension> («A1» или слишком маленький диапазон), который нельзя брать за размер листа.
+
+Примеры:
+    python bench/parity.py
+    python bench/parity.py --rows 20000 --seed 3
+"""
+import argparse
+import datetime
+import io
+import os
+import re
+import sys
+import zipfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "bot_app"))
+sys.path.insert(0, BENCH_DIR)
+
+import openpyxl  # noqa: E402
+
+import excel_parser  # noqa: E402
+from renderers import render_html  # noqa: E402
+from thresholds import DEFAULT_LIMITS, apply_thresholds  # noqa: E402
+from workbooks import GENERATORS, make_workbook  # noqa: E402
+from xlsx_fast import FastSheet, FastUnsupported  # noqa: E402
+
+SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    ' xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+)
+
+
+# ---------- Файлы с неудобными ячейками ----------
+
+def _save(wb) -> bytes:
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _values_workbook() -> bytes:
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["ФИО", "Дата", "Время", "Длительность", "Флаг", "Число", "Текст"])
+    ws.append(["Иванов", datetime.datetime(2024, 9, 1, 8, 30), datetime.time(14, 5), datetime.timedelta(hours=30),
+               True, 1e-7, "a & b < c\nвторая строка"])
+    ws.append(["Петров", datetime.date(1900, 2, 28), None, None, False, 12345678901234, "  пробелы  "])
+    ws.append(["=1/0", "=A2", 0, -3.25, "", "x005F_x0041_", "_x000D_"])
+    ws["C10"] = "разреженная строка"
+    ws["Z12"] = 42
+    ws["A14"].number_format = "0.00%"
+    ws["A14"] = 0.4
+    return _save(wb)
+
+
+def _date1904_workbook() -> bytes:
+    wb = openpyxl.Workbook()
+    wb.epoch = openpyxl.utils.datetime.CALENDAR_MAC_1904
+    wb.active.append(["Дата", datetime.datetime(2020, 1, 1)])
+    return _save(wb)
+
+
+def _with_sheet_xml(body: str) -> bytes:
+    """Книга openpyxl, в которой XML первого листа заменён на свой."""
+    base = _save(openpyxl.Workbook())
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(base)) as src, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            data = src.read(info)
+            if info.filename == "xl/worksheets/sheet1.xml":
+                data = (SHEET_HEAD + body + "</worksheet>").encode("utf-8")
+            dst.writestr(info, data)
+    return out.getvalue()
+
+
+# Атрибуты не по порядку, одинарные кавычки, строки без r, rich text с rPh
+RAW_CELLS = """<sheetData>
+<row r="1"><c r="A1" t="inlineStr"><is><r><t>Жир</t></r><r><rPr><b/></rPr><t xml:space="preserve"> ный</t></r>\
+<rPh sb="0" eb="1"><t>x</t></rPh></is></c><c t="n" r="C1"><v>1.5</v></c><c s='0' r='D1' t='b'><v>1</v></c></row>
+<row><c><v>7</v></c><c t="e"><v>#N/A</v></c><c t="str"><f>A1</f><v>a&amp;b&#x41;</v></c><c t="inlineStr"/></row>
+<row r="5" spans="1:3"><c r="B5"/><c r="C5" t="s"/></row>
+<row r="7" customHeight="1" ht="20"/>
+</sheetData>"""
+
+EDGE_CASES = {
+    "values": _values_workbook,
+    "date1904": _date1904_workbook,
+    "raw_no_dimension": lambda: _with_sheet_xml(RAW_CELLS),
+    "raw_dimension": lambda: _with_sheet_xml('<dimension ref="A1:E7"/>' + RAW_CELLS),
+    "empty_sheet": lambda: _with_sheet_xml("<sheetData/>"),
+    # Такой лист xlsx_fast не читает — проверяется, что ParsedWorkbook уходит на openpyxl
+    "cdata_fallback": lambda: _with_sheet_xml(RAW_CELLS.replace("<v>7</v>", "<v><![CDATA[7]]></v>")),
+}
+
+
+def with_dimension(data: bytes, ref=None) -> bytes:
+    """
+    Та же книга, но в XML листов <dimension ref="ref"> — устаревший размер, как в выгрузках
+    сторонних программ; ref=None — <dimension> нет, строки читаются «рваными».
+    """
+    replacement = f'<dimension ref="{ref}"/>'.encode() if ref else b""
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as src, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            part = src.read(info)
+            if info.filename.startswith("xl/worksheets/"):
+                part = re.sub(rb"<dimension[^>]*/>", replacement, part)
+            dst.writestr(info, part)
+    return out.getvalue()
+
+
+# Без <dimension>, одна ячейка и диапазон меньше данных
+DIMENSIONS = {"без <dimension>": None, "<dimension A1>": "A1", "<dimension A1:C5>": "A1:C5"}
+
+
+# ---------- Сверка ----------
+
+def _typed(rows):
+    return [tuple((type(v).__name__, v) for v in row) for row in rows]
+
+
+def _first_diff(expected, actual):
+    for i, (a, b) in enumerate(zip(expected, actual), 1):
+        if a != b:
+            return f"строка {i}: openpyxl {a} / xlsx_fast {b}"
+    return f"строк: openpyxl {len(expected)} / xlsx_fast {len(actual)}"
+
+
+def check_rows(name, data) -> list:
+    problems = []
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    for index, ws in enumerate(wb.worksheets):
+        # Как в ParsedWorkbook: <dimension> не ограничивает чтение
+        ws.reset_dimensions()
+        try:
+            sheet = FastSheet(data, index)
+        except FastUnsupported as e:
+            print(f"  {name}[{index}]: xlsx_fast не читает ({e}) — будет openpyxl")
+            continue
+        for min_row, max_row in ((None, None), (1, 3), (2, 8), (5, 4)):
+            expected = _typed(ws.iter_rows(min_row=min_row, max_row=max_row, values_only=True))
+            actual = _typed(sheet.iter_rows(min_row=min_row, max_row=max_row))
+            if expected != actual:
+                problems.append(f"{name}[{index}] min_row={min_row} max_row={max_row}: {_first_diff(expected, actual)}")
+    wb.close()
+    return problems
+
+
+# Пороги с распределением — чтобы сверить и его
+BANDS = {name: (limits[0], limits[0] / 2, limits[0] * 1.5) for name, limits in DEFAULT_LIMITS.items()}
+
+
+def _rendered(data, fast, streaming=True):
+    book = excel_parser.load_parsed_workbook(data, streaming=streaming, fast=fast)
+    if book.is_students_choice:
+        reports = list(excel_parser.build_students_choices(book).values())
+    else:
+        reports = [excel_parser.build_report(book)]
+    return [render_html(apply_thresholds(report, limits)) for report in reports for limits in (DEFAULT_LIMITS, BANDS)]
+
+
+def check_report(name, data) -> list:
+    if _rendered(data, fast=True) != _rendered(data, fast=False):
+        return [f"{name}: отчёт через xlsx_fast отличается от openpyxl"]
+    return []
+
+
+def check_streaming(name, data) -> list:
+    problems = []
+    full = _rendered(data, fast=False, streaming=False)
+    for fast, reader in ((True, "xlsx_fast"), (False, "openpyxl")):
+        if _rendered(data, fast=fast) != full:
+            problems.append(f"{name}: потоковый разбор ({reader}) отличается от полной загрузки листа")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    problems = []
+    for fmt in GENERATORS:
+        data = make_workbook(fmt, args.rows, args.seed)
+        problems += check_rows(fmt, data)
+        problems += check_report(fmt, data)
+        problems += check_streaming(fmt, data)
+        for label, ref in DIMENSIONS.items():
+            changed = with_dimension(data, ref)
+            problems += check_rows(f"{fmt} {label}", changed)
+            problems += check_streaming(f"{fmt} {label}", changed)
+    for name, build in EDGE_CASES.items():
+        data = build()
+        problems += check_rows(name, data)
+        problems += check_report(name, data)
+        problems += check_streaming(name, data)
+
+    for problem in problems:
+        print("✗", problem)
+    print(f"Расхождений: {len(problems)}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Нагрузочный прогон бота без Telegram: апдейты с файлами подаются прямо в Application
+(application.process_update), а Bot API заменён заглушкой fake_telegram.py — она отдаёт
+файлы и записывает ответы бота. Работают настоящие обработчики, пул разбора,
+очередь с чередованием пользователей, кэш и очередь отправки.
+
+Трасса — JSONL, одна загрузка на строку:
+    {"at": 0.4, "user": 1001, "name": "students.xlsx",
+     "file": {"format": "students", "rows": 2000, "seed": 7}, "choose": "rep:3"}
+    at     — секунда от начала прогона, когда пришёл файл;
+    file   — синтетический файл (workbooks.py) или {"path": "выгрузка.xlsx"};
+    chat   — id чата (по умолчанию личный чат user);
+    choose — кнопка, которую пользователь нажимает после отчёта (on_choose_report).
+Без --trace трасса генерируется (--uploads, --users, --rate, ...) и может быть
+сохранена через --record, чтобы сравнивать прогоны на одних и тех же данных.
+
+Выводится пропускная способность и p50/p95/p99 полного времени ответа
+on_document и on_choose_report (от прихода апдейта до последнего ответа бота),
+счётчики и этапы из /stats бота.
+
+Примеры:
+    python bench/replay.py
+    python bench/replay.py --uploads 200 --users 20 --rate 10 --concurrency 64
+    python bench/replay.py --record /tmp/trace.jsonl --no-send-limits
+    python bench/replay.py --trace /tmp/trace.jsonl --speed 0 --out /tmp/run.json
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, "bot_app"))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_telegram import FakeBotAPI  # noqa: E402
+from stats import STAGES  # noqa: E402
+from workbooks import GENERATORS, make_workbook  # noqa: E402
+
+HANDLERS = ("on_document", "on_choose_report")
+QUANTILES = (0.5, 0.95, 0.99)
+# Лимиты Telegram на отправку при --no-send-limits
+UNLIMITED = 1e9
+
+
+def _quantile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, int(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+# ---------- Трасса ----------
+
+def generate_trace(uploads, users, rate, rows, formats, repeats, seed) -> list:
+    """
+    Загрузки с пуассоновскими интервалами (в среднем rate файлов в секунду) от users
+    пользователей; доля repeats — повторная загрузка уже присланного файла тем же пользователем.
+    """
+    rnd = random.Random(seed)
+    at, trace, sent = 0.0, [], {}
+    for i in range(uploads):
+        at += rnd.expovariate(rate)
+        user = 1000 + rnd.randrange(users)
+        if sent.get(user) and rnd.random() < repeats:
+            event = dict(rnd.choice(sent[user]), at=round(at, 3))
+        else:
+            fmt = rnd.choice(formats)
+            size = max(10, int(rnd.uniform(0.5, 1.5) * rows))
+            event = {"at": round(at, 3), "user": user, "name": f"{fmt}_{i}.xlsx",
+                     "file": {"format": fmt, "rows": size, "seed": i}}
+            # Отчёт по студентам предлагает выбрать 3 или 6
+            if fmt == "students":
+                event["choose"] = rnd.choice(("rep:3", "rep:6"))
+            sent.setdefault(user, []).append(event)
+        trace.append(event)
+    return trace
+
+
+def load_trace(path) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_trace(trace, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for event in trace:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def file_bytes(spec, cache) -> bytes:
+    key = json.dumps(spec, sort_keys=True)
+    if key not in cache:
+        if "path" in spec:
+            with open(spec["path"], "rb") as f:
+                cache[key] = f.read()
+        else:
+            cache[key] = make_workbook(spec["format"], spec["rows"], spec.get("seed", 0))
+    return cache[key]
+
+
+# ---------- Прогон ----------
+
+class Replay:
+    def __init__(self, main, api, concurrency, speed):
+        self.main = main
+        self.api = api
+        self.app = main.build_application(request=api)
+        self.speed = speed
+        self.latency = {name: [] for name in HANDLERS}
+        self.missing_buttons = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._update_ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def _document_update(self, event, file_id, size):
+        from telegram import Update
+
+        chat_id = event.get("chat", event["user"])
+        message = {
+            "message_id": next(self._update_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": self._user(event["user"]),
+            "document": {"file_id": file_id, "file_unique_id": file_id,
+                         "file_name": event.get("name", "report.xlsx"), "file_size": size},
+        }
+        return Update.de_json({"update_id": next(self._update_ids), "message": message}, self.app.bot)
+
+    def _callback_update(self, event, message, data):
+        from telegram import Update
+
+        query = {"id": str(next(self._update_ids)), "from": self._user(event["user"]),
+                 "chat_instance": str(message["chat"]["id"]), "data": data, "message": message}
+        return Update.de_json({"update_id": next(self._update_ids), "callback_query": query}, self.app.bot)
+
+    async def _process(self, handler, update, arrived):
+        async with self._slots:
+            await self.app.process_update(update)
+        self.latency[handler].append(time.perf_counter() - arrived)
+
+    async def _user_session(self, event, data, started):
+        if self.speed:
+            await asyncio.sleep(max(0.0, started + event["at"] / self.speed - time.perf_counter()))
+        file_id = self.api.add_file(data)
+        await self._process("on_document", self._document_update(event, file_id, len(data)), time.perf_counter())
+
+        if event.get("choose"):
+            button = self.api.take_button(event.get("chat", event["user"]), event["choose"])
+            if button is None:
+                self.missing_buttons += 1  # отчёт не дошёл или кнопки не было
+                return
+            await self._process("on_choose_report", self._callback_update(event, *button), time.perf_counter())
+
+    async def run(self, trace, files):
+        await self.app.initialize()
+        if self.app.post_init is not None:
+            await self.app.post_init(self.app)
+        if self.main._prewarm_task is not None:
+            # Прогон меряет тёплого бота: модули разбора уже импортированы
+            await self.main._prewarm_task
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(self._user_session(event, data, started) for event, data in zip(trace, files)))
+            return time.perf_counter() - started
+        finally:
+            await self.app.shutdown()
+
+
+def _summary(replay, api, wall) -> dict:
+    handlers = {}
+    for name, values in replay.latency.items():
+        if values:
+            ordered = sorted(values)
+            handlers[name] = {
+                "n": len(ordered),
+                "per_second": len(ordered) / wall,
+                "latency": {str(q): _quantile(ordered, q) for q in QUANTILES},
+            }
+    stages = {}
+    for stage in STAGES:
+        q = replay.main.stats.quantiles(stage)
+        if q is not None:
+            stages[stage] = {"n": q[1], "latency": dict(zip(map(str, QUANTILES), q[0]))}
+    sent = {}
+    for method, _, _, _ in api.calls:
+        sent[method] = sent.get(method, 0) + 1
+    return {
+        "wall": wall,
+        "handlers": handlers,
+        "stages": stages,
+        "counters": dict(sorted(replay.main.stats.counters.items())),
+        "sent": sent,
+        "error_replies": sum(1 for _, _, text, _ in api.calls if (text or "").startswith("❌")),
+        "missing_buttons": replay.missing_buttons,
+    }
+
+
+def _ms(latency) -> str:
+    return " / ".join(f"{latency[str(q)] * 1000:.0f}" for q in QUANTILES)
+
+
+def print_summary(summary):
+    print(f"\nПрогон: {summary['wall']:.1f} с")
+    print("Полное время ответа, мс (p50 / p95 / p99):")
+    for name, row in summary["handlers"].items():
+        print(f"  {name:17} n={row['n']:<5} {row['per_second']:6.2f}/с  {_ms(row['latency'])}")
+    print("Этапы бота, мс (p50 / p95 / p99):")
+    for stage, row in summary["stages"].items():
+        print(f"  {stage:17} n={row['n']:<5} {_ms(row['latency'])}")
+    print("Счётчики:", ", ".join(f"{k} {v}" for k, v in summary["counters"].items()))
+    print("Ответы бота:", ", ".join(f"{k} {v}" for k, v in sorted(summary["sent"].items())),
+          f"| с «❌» {summary['error_replies']}, не найдено кнопок {summary['missing_buttons']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон обработчиков бота с заглушкой Bot API")
+    parser.add_argument("--trace", help="JSONL-трасса загрузок; без неё трасса генерируется")
+    parser.add_argument("--record", help="сохранить трассу в JSONL")
+    parser.add_argument("--uploads", type=int, default=60)
+    parser.add_argument("--users", type=int, default=12)
+    parser.add_argument("--rate", type=float, default=6.0, help="файлов в секунду в среднем")
+    parser.add_argument("--rows", type=int, default=3000, help="строк в файле в среднем")
+    parser.add_argument("--formats", nargs="+", default=sorted(GENERATORS), choices=sorted(GENERATORS))
+    parser.add_argument("--repeats", type=float, default=0.15, help="доля повторных загрузок того же файла")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="апдейтов одновременно (по умолчанию UPDATE_CONCURRENCY бота)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="ускорение времени трассы; 0 — все апдейты сразу")
+    parser.add_argument("--api-latency-ms", type=float, default=30.0, help="задержка каждого запроса к Bot API")
+    parser.add_argument("--no-send-limits", action="store_true", help="отправлять без лимитов Telegram")
+    parser.add_argument("--out", help="записать итоги в JSON")
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        trace = generate_trace(args.uploads, args.users, args.rate, args.rows, args.formats, args.repeats, args.seed)
+    if args.record:
+        save_trace(trace, args.record)
+
+    cache = {}
+    files = [file_bytes(event["file"], cache) for event in trace]
+    print(f"Трасса: {len(trace)} загрузок, {len({e['user'] for e in trace})} пользователей, "
+          f"{len(cache)} разных файлов, {sum(map(len, cache.values())) / 1024 / 1024:.1f} МБ")
+
+    # Бот открывает свои SQLite-базы в текущей папке — прогон во временной
+    with tempfile.TemporaryDirectory() as cwd:
+        os.chdir(cwd)
+        import main as bot
+        import utils
+
+        if args.no_send_limits:
+            utils.SEND_PRIVATE_CHAT_RATE = utils.SEND_GROUP_CHAT_RATE = utils.SEND_CHAT_BURST = UNLIMITED
+            utils.send_queue = bot.send_queue = utils.SendQueue(global_rate=UNLIMITED)
+
+        api = FakeBotAPI(latency=args.api_latency_ms / 1000)
+        replay = Replay(bot, api, args.concurrency or bot.UPDATE_CONCURRENCY, args.speed)
+        try:
+            wall = asyncio.run(replay.run(trace, files))
+        finally:
+            bot.parse_pool.shutdown()
+            bot.file_pool.shutdown()
+            for store in (bot.report_cache, bot.chat_settings, bot.snapshots, bot.history):
+                store.close()
+            os.chdir(ROOT)
+
+    summary = _summary(replay, api, wall)
+    summary["started"] = datetime.datetime.now().isoformat(timespec="seconds")
+    print_summary(summary)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
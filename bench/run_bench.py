@@ -0,0 +1,276 @@
+"""
+Бенчмарк разбора отчётов на синтетических файлах (см. workbooks.py).
+
+Для каждого формата и размера отдельно замеряются этапы:
+    load    — открытие файла (в потоковом режиме — только шапка, в полном — весь лист)
+    detect  — определение типа отчёта по шапке (classify_header)
+    report  — функция report_* для этого формата
+    render  — текст для Telegram (render_html)
+    chunk   — нарезка текста на сообщения (split_html, как в send_long_message)
+
+Каждый случай выполняется в отдельном процессе, чтобы ru_maxrss относился только к нему.
+Результаты пишутся в bench/results/<commit>.json; --compare сравнивает два прогона.
+--reader openpyxl читает лист через openpyxl вместо xlsx_fast — сравнение двух таких
+прогонов показывает выигрыш быстрого чтения.
+
+Примеры:
+    python bench/run_bench.py
+    python bench/run_bench.py --sizes 100 10000 500000 --formats topics students
+    python bench/run_bench.py --compare bench/results/abc1234.json
+    python bench/run_bench.py --reader openpyxl --out /tmp/openpyxl.json
+    python bench/run_bench.py --compare bench/results/abc1234.json bench/results/def5678.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, "bot_app"))
+sys.path.insert(0, BENCH_DIR)
+
+import excel_parser  # noqa: E402
+from renderers import render_html  # noqa: E402
+from sheet_layout import classify_header  # noqa: E402
+from utils import split_html  # noqa: E402
+from workbooks import GENERATORS, make_workbook  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+STAGES = ("load", "detect", "report", "render", "chunk")
+
+REPORT_FUNCS = {
+    "schedule": excel_parser.report_schedule_count,
+    "topics": excel_parser.report_bad_topics_grouped,
+    "students": excel_parser.report_students_bad_grades,
+    "teachers_attendance": excel_parser.report_teachers_attendance_below_40,
+    "checked_homework": excel_parser.report_checked_homework_below_70,
+    "hw_completion": excel_parser.report_students_homework_completion_below_70,
+}
+
+
+# ---------- Данные ----------
+
+def workbook_path(fmt, rows, seed) -> str:
+    """Сгенерированные файлы кэшируются на диске: 500k строк собираются долго."""
+    path = os.path.join(DATA_DIR, f"{fmt}-{rows}-{seed}.xlsx")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(make_workbook(fmt, rows, seed))
+        os.replace(tmp, path)
+    return path
+
+
+# ---------- Один случай (в отдельном процессе) ----------
+
+def _run_stages(data, fmt, streaming, fast, trace):
+    timings = {}
+    peaks = {}
+
+    def stage(name, func, *args):
+        if trace:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = func(*args)
+        timings[name] = time.perf_counter() - start
+        if trace:
+            peaks[name] = tracemalloc.get_traced_memory()[1] - base
+        return result
+
+    book = stage("load", excel_parser.load_parsed_workbook, data, streaming, 0, fast)
+    layout = stage("detect", classify_header, book.head)
+    if layout.kind != book.kind:
+        raise RuntimeError(f"{fmt}: повторное определение дало {layout.kind}, а не {book.kind}")
+    report = stage("report", REPORT_FUNCS[fmt], book)
+    text = stage("render", render_html, report)
+    chunks = stage("chunk", split_html, text)
+    return timings, peaks, {"kind": book.kind, "entries": len(report.entries), "chars": len(text), "chunks": len(chunks)}
+
+
+def run_case(fmt, rows, seed, streaming, fast, repeat, memory):
+    with open(workbook_path(fmt, rows, seed), "rb") as f:
+        data = f.read()
+
+    best = {}
+    info = None
+    for _ in range(repeat):
+        timings, _, info = _run_stages(data, fmt, streaming, fast, trace=False)
+        for name, seconds in timings.items():
+            best[name] = min(best.get(name, seconds), seconds)
+
+    # Отдельный проход под tracemalloc: трассировка сильно искажает время
+    peaks = {}
+    if memory:
+        tracemalloc.start()
+        _, peaks, _ = _run_stages(data, fmt, streaming, fast, trace=True)
+        tracemalloc.stop()
+
+    stages = {}
+    for name in STAGES:
+        seconds = best[name]
+        stages[name] = {
+            "seconds": seconds,
+            "rows_per_s": rows / seconds if seconds > 0 else None,
+            "peak_bytes": peaks.get(name),
+        }
+
+    total = sum(best.values())
+    return {
+        "format": fmt,
+        "rows": rows,
+        "file_bytes": len(data),
+        "streaming": streaming,
+        "reader": "fast" if fast else "openpyxl",
+        "stages": stages,
+        "total_seconds": total,
+        "mb_per_s": len(data) / total / 1e6 if total > 0 else None,
+        # ru_maxrss в Linux — КБ, в macOS — байты
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == "darwin" else 1),
+        **info,
+    }
+
+
+# ---------- Прогон и сохранение ----------
+
+def git_commit():
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True,
+        ).stdout.strip())
+        return sha, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def run_all(args):
+    commit, dirty = git_commit()
+    results = []
+    for fmt in args.formats:
+        for rows in args.sizes:
+            # Новый процесс на каждый случай — ru_maxrss не накапливается между случаями
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                case = pool.submit(
+                    run_case, fmt, rows, args.seed, not args.full, args.reader == "fast", args.repeat, args.memory,
+                ).result()
+            results.append(case)
+            print_case(case)
+
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "streaming": not args.full,
+        "reader": args.reader,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results,
+    }
+
+
+def print_case(case):
+    parts = []
+    for name in STAGES:
+        s = case["stages"][name]
+        part = f"{name} {s['seconds'] * 1000:8.1f} ms"
+        if s["peak_bytes"] is not None:
+            part += f" ({s['peak_bytes'] / 1e6:.1f} MB)"
+        parts.append(part)
+    print(
+        f"{case['format']:<20} {case['rows']:>7} строк  " + " | ".join(parts)
+        + f" | всего {case['total_seconds']:.2f} с, {case['mb_per_s']:.2f} MB/s, RSS {case['max_rss_kb'] / 1024:.0f} MB"
+    )
+
+
+def save(run, path=None) -> str:
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        name = run["commit"] + ("-dirty" if run["dirty"] else "")
+        path = os.path.join(RESULTS_DIR, f"{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(run, f, ensure_ascii=False, indent=2)
+    return path
+
+
+# ---------- Сравнение ----------
+
+def compare(old, new, tolerance) -> int:
+    """Печатает изменение времени по этапам; возвращает число регрессий больше tolerance."""
+    print(f"\n{old['commit']} -> {new['commit']}{' (dirty)' if new.get('dirty') else ''}")
+    old_cases = {(c["format"], c["rows"], c["streaming"]): c for c in old["results"]}
+    regressions = 0
+
+    for case in new["results"]:
+        before = old_cases.get((case["format"], case["rows"], case["streaming"]))
+        if before is None:
+            continue
+        parts = []
+        for name in STAGES + ("total",):
+            if name == "total":
+                a, b = before["total_seconds"], case["total_seconds"]
+            else:
+                a, b = before["stages"][name]["seconds"], case["stages"][name]["seconds"]
+            if a <= 0:
+                continue
+            change = b / a - 1
+            # Этапы короче миллисекунды — шум, регрессией не считаем
+            flag = change > tolerance and b - a > 0.001
+            regressions += flag
+            parts.append(f"{name} {change:+.0%}{' !' if flag else ''}")
+        print(f"{case['format']:<20} {case['rows']:>7}  " + "  ".join(parts))
+
+    print(f"Регрессий больше {tolerance:.0%}: {regressions}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--formats", nargs="+", choices=sorted(GENERATORS), default=list(GENERATORS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="берётся лучшее время из N повторов")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--full", action="store_true", help="полная загрузка листа вместо потоковой")
+    parser.add_argument("--reader", choices=("fast", "openpyxl"), default="fast",
+                        help="чем читать лист в потоковом режиме (полная загрузка — всегда openpyxl)")
+    parser.add_argument("--memory", action="store_true", help="пиковая память по этапам через tracemalloc")
+    parser.add_argument("--out", help="путь к JSON (по умолчанию bench/results/<commit>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="JSON",
+                        help="один файл — сравнить с текущим прогоном, два — сравнить файлы без прогона")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0], encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            new = json.load(f)
+        sys.exit(1 if compare(old, new, args.tolerance) else 0)
+
+    run = run_all(args)
+    print(f"\nСохранено: {save(run, args.out)}")
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            old = json.load(f)
+        sys.exit(1 if compare(old, run, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Замер холодного старта бота: python -X importtime -c "import main" в новом процессе.
+
+Проверяется бюджет:
+    import  — суммарное время импорта main (cumulative из -X importtime), медиана
+              по нескольким запускам, не больше --budget-ms;
+    lazy    — среди импортированных при старте модулей нет тяжёлых модулей разбора
+              (openpyxl, numpy, excel_parser, ...): они подгружаются после запуска.
+Дополнительно выводятся полное время до готового Application (запуск интерпретатора,
+импорт и build_application) и самые долгие импорты.
+
+Код возврата 1 — бюджет превышен (для проверки перед выкладкой).
+
+Примеры:
+    python bench/startup.py
+    python bench/startup.py --runs 10 --budget-ms 350 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+BOT_DIR = os.path.join(ROOT, "bot_app")
+
+DEFAULT_BUDGET_MS = 450
+# Не должны импортироваться до первого файла
+LAZY_MODULES = ("openpyxl", "numpy", "excel_parser", "batch", "report_files", "xlsx_fast")
+
+READY_CODE = (
+    "import time; t = time.perf_counter(); import main; main.build_application(); "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _run(args, cwd):
+    # Бот при импорте открывает свои SQLite-базы в текущей папке — запускаем во временной
+    env = dict(os.environ, PYTHONPATH=BOT_DIR, PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Имя модуля -> (собственное время, суммарное время в микросекундах, вложенность)."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Каждый уровень вложенности — два пробела перед именем
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def measure(runs: int):
+    imports, ready, last = [], [], {}
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(runs):
+            last = parse_importtime(_run(["-X", "importtime", "-c", "import main"], cwd).stderr)
+            imports.append(last["main"][1] / 1000)
+            ready.append(float(_run(["-c", READY_CODE], cwd).stdout.strip().splitlines()[-1]) * 1000)
+    return statistics.median(imports), statistics.median(ready), last
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного старта бота и проверка бюджета")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="сколько самых долгих импортов показать")
+    args = parser.parse_args()
+
+    import_ms, ready_ms, modules = measure(args.runs)
+    print(f"Импорт main: {import_ms:.0f} мс (медиана из {args.runs}), бюджет {args.budget_ms:.0f} мс")
+    print(f"До готового Application: {ready_ms:.0f} мс")
+
+    print("\nСамые долгие импорты из main (суммарно, мс):")
+    # Модули, которые первым импортировал сам main, вместе со всем, что они тянут за собой
+    top = sorted(((cum, name) for name, (_, cum, depth) in modules.items() if depth == 1), reverse=True)
+    for cum, name in top[:args.top]:
+        print(f"  {cum / 1000:8.1f}  {name}")
+
+    failed = False
+    loaded = [name for name in LAZY_MODULES if name in modules]
+    if loaded:
+        failed = True
+        print(f"\n❌ При старте импортированы модули разбора: {', '.join(loaded)}")
+    if import_ms > args.budget_ms:
+        failed = True
+        print(f"\n❌ Импорт main дольше бюджета: {import_ms:.0f} > {args.budget_ms:.0f} мс")
+    if not failed:
+        print("\n✅ В бюджете")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Генераторы синтетических .xlsx для всех форматов, которые понимает excel_parser.
+Файлы пишутся openpyxl в режиме write_only, поэтому и 500k строк собираются без
+огромного расхода памяти.
+"""
+import io
+import random
+
+import openpyxl
+
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Кузнецов", "Смирнов", "Попов", "Волков", "Соколов", "Лебедев", "Козлов"]
+FIRST_NAMES = ["Алексей", "Мария", "Иван", "Ольга", "Дмитрий", "Анна", "Сергей", "Елена", "Павел", "Наталья"]
+SUBJECTS = ["Python", "C#", "Математика", "Web-разработка", "Базы данных", "Алгоритмы", "Английский", "Дизайн"]
+GROUPS = ["П-21", "П-22", "В-11", "Д-31", "С-41"]
+
+
+def _fio(rnd, i):
+    return f"{rnd.choice(LAST_NAMES)} {rnd.choice(FIRST_NAMES)} #{i}"
+
+
+def _save(rows_iter) -> bytes:
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Лист1")
+    for row in rows_iter:
+        ws.append(row)
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+# Метод 1: ячейки расписания с «Предмет:»
+def schedule_rows(n, rnd):
+    yield ["Время", "Понедельник", "Вторник", "Среда", "Четверг", "Пятница"]
+    for i in range(n):
+        row = [f"{8 + i % 10}:00"]
+        for _ in range(5):
+            if rnd.random() < 0.7:
+                row.append(f"{rnd.choice(GROUPS)}\nПредмет: {rnd.choice(SUBJECTS)}\nАуд. {rnd.randint(100, 420)}")
+            else:
+                row.append(None)
+        yield row
+
+
+# Метод 2: темы уроков
+def topics_rows(n, rnd):
+    yield ["Отчёт по темам занятий"]
+    yield ["Дата", "Пара", "Предмет", "Группа", "Преподаватель", "Тема урока"]
+    for i in range(n):
+        r = rnd.random()
+        if r < 0.8:
+            topic = f"Урок № {i % 40 + 1}. Тема: {rnd.choice(SUBJECTS)}, занятие {i}"
+        elif r < 0.9:
+            topic = f"Урок {i % 40 + 1} Тема {rnd.choice(SUBJECTS)}"
+        elif r < 0.95:
+            topic = f"Урок № {i % 40 + 1}. {rnd.choice(SUBJECTS)}"
+        else:
+            topic = None
+        yield [f"{i % 28 + 1:02d}.09", i % 6 + 1, rnd.choice(SUBJECTS), rnd.choice(GROUPS), _fio(rnd, i % 50), topic]
+
+
+# Метод 3: FIO / Homework / Classroom
+def students_rows(n, rnd):
+    yield ["FIO", "Group", "Homework", "Classroom"]
+    yield [None, None, None, None]
+    for i in range(n):
+        yield [_fio(rnd, i), rnd.choice(GROUPS), rnd.choice([1, 1.05, 2, 3, 4, 5, 4.5, None]), rnd.choice([1, 2, 2.5, 3, 4, 5, None])]
+
+
+# Метод 4: посещаемость преподавателей
+def attendance_rows(n, rnd):
+    yield ["Отчёт по посещаемости"]
+    yield ["№", "ФИО преподавателя", "Группы", "Средняя посещаемость"]
+    for i in range(n):
+        value = rnd.choice([rnd.random(), f"{rnd.randint(0, 100)}%", f"{rnd.randint(0, 100)},{rnd.randint(0, 9)}"])
+        yield [i + 1, _fio(rnd, i), rnd.choice(GROUPS), value]
+
+
+# Метод 5: блоки месяц / неделя / день по 5 колонок
+def checked_homework_rows(n, rnd):
+    head = ["ФИО преподавателя"]
+    for period in ("Месяц", "Неделя", "День"):
+        head += [period, None, None, None, None]
+    yield head
+    yield [None] + ["Выдано", "Проверено, %", "Получено", "Проверено", "Осталось"] * 3
+    for i in range(n):
+        row = [_fio(rnd, i)]
+        for scale in (80, 20, 4):
+            received = rnd.randint(0, scale)
+            checked = rnd.randint(0, received) if received else 0
+            row += [scale, None, received, checked, received - checked]
+        yield row
+
+
+# Метод 6: Percentage Homework
+def hw_completion_rows(n, rnd):
+    yield ["FIO", "Group", "Percentage Homework"]
+    for i in range(n):
+        yield [_fio(rnd, i), rnd.choice(GROUPS), rnd.choice([rnd.random(), f"{rnd.randint(0, 100)}%", rnd.randint(0, 100)])]
+
+
+GENERATORS = {
+    "schedule": schedule_rows,
+    "topics": topics_rows,
+    "students": students_rows,
+    "teachers_attendance": attendance_rows,
+    "checked_homework": checked_homework_rows,
+    "hw_completion": hw_completion_rows,
+}
+
+
+def make_workbook(fmt, rows, seed=0) -> bytes:
+    return _save(GENERATORS[fmt](rows, random.Random(seed)))
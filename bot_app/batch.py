@@ -0,0 +1,255 @@
+import html
+import io
+import os
+import posixpath
+import threading
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import (
+    BATCH_MAX_WORKERS,
+    BATCH_MAX_FILES,
+    BATCH_MAX_SHEETS,
+    BATCH_MAX_UNPACKED_BYTES,
+)
+from excel_parser import (
+    PROCESSING_ERROR,
+    REPORT_SCHEDULE,
+    REPORT_TOPICS,
+    REPORT_STUDENTS,
+    REPORT_TEACHERS_ATTENDANCE,
+    REPORT_CHECKED_HOMEWORK,
+    REPORT_HW_COMPLETION,
+    process_upload,
+)
+from reports import Report, ReportEntry
+from xlsx_fast import worksheet_parts
+
+# Порядок отчётов в ответе на пакетную загрузку
+KIND_ORDER = (
+    REPORT_SCHEDULE,
+    REPORT_TOPICS,
+    REPORT_STUDENTS,
+    REPORT_HW_COMPLETION,
+    REPORT_TEACHERS_ATTENDANCE,
+    REPORT_CHECKED_HOMEWORK,
+)
+
+
+class BatchError(Exception):
+    pass
+
+
+# ---------- Из чего состоит загрузка ----------
+
+def _sheet_units(label, data):
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            names = [name for name, _ in worksheet_parts(zf)]
+    except (zipfile.BadZipFile, KeyError, ET.ParseError):
+        # Не смогли прочитать список листов — разбираем первый лист, как раньше
+        return [(label, data, 0)]
+
+    if len(names) <= 1:
+        return [(label, data, 0)]
+    return [(f"{label} / {name}" if label else name, data, i) for i, name in enumerate(names)]
+
+
+def split_upload(data: bytes) -> list:
+    """
+    Раскладывает загрузку на части (подпись, байты xlsx, номер листа):
+    книга — по листам, zip-архив — по вложенным .xlsx и их листам.
+    """
+    try:
+        zf = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        return [("", data, 0)]
+
+    with zf:
+        names = zf.namelist()
+        if "xl/workbook.xml" in names:
+            return _sheet_units("", data)
+
+        members = [
+            info for info in zf.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith(".xlsx")
+            and not posixpath.basename(info.filename).startswith(("~$", "."))
+            and not info.filename.startswith("__MACOSX/")
+        ]
+        if not members:
+            raise BatchError("❌ В архиве нет файлов .xlsx")
+        if len(members) > BATCH_MAX_FILES:
+            raise BatchError(f"❌ В архиве больше {BATCH_MAX_FILES} файлов .xlsx")
+        # Размеры из оглавления архива — проверяем до распаковки
+        if sum(info.file_size for info in members) > BATCH_MAX_UNPACKED_BYTES:
+            raise BatchError("❌ Архив слишком большой после распаковки")
+
+        units = []
+        for info in sorted(members, key=lambda i: i.filename):
+            units.extend(_sheet_units(posixpath.basename(info.filename), zf.read(info)))
+
+    if len(units) > BATCH_MAX_SHEETS:
+        raise BatchError(f"❌ Слишком много листов: {len(units)} (максимум {BATCH_MAX_SHEETS})")
+    return units
+
+
+# ---------- Объединение отчётов ----------
+
+def _labelled(entry, label):
+    if not label:
+        return entry
+    return ReportEntry(f"{entry.name} — {label}", entry.value, entry.group, entry.extra)
+
+
+def merge_reports(kind, parts) -> Report:
+    """parts — список (подпись, Report) одного типа; порядок строк как в одиночных отчётах."""
+    first = parts[0][1]
+
+    if kind == REPORT_SCHEDULE:
+        counter = Counter()
+        for _, report in parts:
+            for e in report.entries:
+                counter[e.name] += e.value
+        return Report(kind, [ReportEntry(name, cnt) for name, cnt in counter.most_common()])
+
+    if kind == REPORT_TOPICS:
+        by_subject = defaultdict(list)
+        for label, report in parts:
+            for e in report.entries:
+                by_subject[e.group].append(_labelled(e, label))
+        return Report(kind, [e for subj in sorted(by_subject) for e in by_subject[subj]])
+
+    if kind == REPORT_CHECKED_HOMEWORK:
+        # Разделы сопоставляются по подписи периода: порядок — как в первом листе,
+        # периоды, которых в нём нет, добавляются следом в порядке появления
+        by_period = {}
+        for label, report in parts:
+            for group in report.groups:
+                by_period.setdefault(group, [])
+            for e in report.entries:
+                by_period.setdefault(e.group, []).append(_labelled(e, label))
+        groups = tuple(by_period)
+        entries = []
+        for period_entries in by_period.values():
+            period_entries.sort(key=lambda e: e.value)
+            entries.extend(period_entries)
+        return Report(kind, entries, threshold=first.threshold, groups=groups)
+
+    entries = [_labelled(e, label) for label, report in parts for e in report.entries]
+    if kind in (REPORT_TEACHERS_ATTENDANCE, REPORT_HW_COMPLETION):
+        entries.sort(key=lambda e: e.value)
+    elif first.groups:
+        order = {g: i for i, g in enumerate(first.groups)}
+        entries.sort(key=lambda e: order[e.group])
+    return Report(kind, entries, threshold=first.threshold, groups=first.groups)
+
+
+# ---------- Обработка ----------
+
+def _process_unit(label, data, sheet, streaming):
+    choices, report = process_upload(data, streaming=streaming, sheet=sheet)
+    return label, choices, report
+
+
+# Один пул процессов на все пакеты: создаётся при первом пакете и живёт до остановки
+# бота — запуск процессов (на Windows spawn с импортом main) оплачивается один раз,
+# а одновременные пакеты делят BATCH_MAX_WORKERS процессов, не плодя свои
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _shared_executor(max_workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=max_workers)
+        return _executor
+
+
+def shutdown_executor(wait=True):
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _run_units(units, streaming, max_workers):
+    global _executor
+    workers = max_workers or os.cpu_count() or 1
+    if min(len(units), workers) <= 1:
+        return [_process_unit(label, data, sheet, streaming) for label, data, sheet in units]
+
+    # Листы и файлы независимы — разбираем на нескольких ядрах
+    executor = _shared_executor(workers)
+    try:
+        futures = [executor.submit(_process_unit, label, data, sheet, streaming) for label, data, sheet in units]
+        return [f.result() for f in futures]
+    except BrokenProcessPool:
+        # Процесс пула упал — следующий пакет получит новый пул
+        with _executor_lock:
+            if _executor is executor:
+                _executor = None
+        raise
+
+
+def process_batch(data: bytes, streaming=True, timings=None, max_workers=BATCH_MAX_WORKERS):
+    """
+    Точка входа для загрузки с несколькими листами или zip-архива с .xlsx.
+    Возвращает (choices, reports): reports — список отчётов, объединённых по типу;
+    choices — как в process_upload, если все части — отчёты по студентам (выбор 3/6).
+    Файл с одним листом обрабатывается ровно как process_upload.
+    """
+    if timings is None:
+        timings = {}
+    try:
+        units = split_upload(data)
+    except BatchError as e:
+        return None, [Report(None, error=str(e))]
+    except Exception as e:
+        return None, [Report(None, error=f"{PROCESSING_ERROR}: {e}")]
+
+    if len(units) == 1:
+        label, data, sheet = units[0]
+        choices, report = process_upload(data, streaming=streaming, timings=timings, sheet=sheet)
+        return choices, [] if report is None else [report]
+
+    start = time.perf_counter()
+    try:
+        results = _run_units(units, streaming, max_workers)
+    except Exception as e:
+        return None, [Report(None, error=f"{PROCESSING_ERROR}: {e}")]
+    timings["kind"] = "batch"
+    timings["units"] = len(units)
+
+    by_kind = defaultdict(list)
+    failed = []
+    choice_units = 0
+    for label, choices, report in results:
+        if choices is not None:
+            choice_units += 1
+            for kind, choice in choices.items():
+                by_kind[kind].append((label, choice))
+        elif report.error is not None:
+            failed.append(f"• {html.escape(label, quote=False)}: {report.error}")
+        else:
+            by_kind[report.kind].append((label, report))
+
+    merged = {kind: merge_reports(kind, parts) for kind, parts in by_kind.items()}
+    reports = []
+    choices = None
+    if choice_units and choice_units == len(results) - len(failed):
+        choices = merged
+    else:
+        reports = [merged[kind] for kind in KIND_ORDER if kind in merged]
+
+    if failed:
+        reports.append(Report(None, error=f"⚠️ Не удалось обработать ({len(failed)} из {len(units)}):\n" + "\n".join(failed)))
+
+    timings["report"] = time.perf_counter() - start
+    return choices, reports
@@ -0,0 +1,76 @@
+import sqlite3
+
+
+class ChatSettings:
+    """
+    Пороги отчётов по чатам: имя порога -> кортеж границ, поверх defaults.
+    В памяти — словарь; при указании path настройки хранятся в SQLite
+    и переживают перезапуск бота. Чат читается из базы при первом обращении.
+    """
+
+    def __init__(self, defaults, path=None):
+        self.defaults = dict(defaults)
+        self._chats = {}  # chat_id -> {имя: границы}, только изменённые пороги
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS thresholds ("
+                "chat_id INTEGER NOT NULL, name TEXT NOT NULL, limits TEXT NOT NULL, "
+                "PRIMARY KEY (chat_id, name))"
+            )
+            self._db.commit()
+
+    def _own(self, chat_id) -> dict:
+        own = self._chats.get(chat_id)
+        if own is None:
+            own = {}
+            if self._db is not None:
+                rows = self._db.execute("SELECT name, limits FROM thresholds WHERE chat_id = ?", (chat_id,))
+                for name, limits in rows:
+                    # Порог, которого больше нет в defaults, пропускаем
+                    if name in self.defaults:
+                        own[name] = tuple(float(v) for v in limits.split())
+            self._chats[chat_id] = own
+        return own
+
+    def get(self, chat_id) -> dict:
+        """Все пороги чата: изменённые в чате, остальные — по умолчанию."""
+        return {**self.defaults, **self._own(chat_id)}
+
+    def is_default(self, chat_id, name) -> bool:
+        return name not in self._own(chat_id)
+
+    def set(self, chat_id, name, limits):
+        if name not in self.defaults:
+            raise KeyError(name)
+        limits = tuple(float(v) for v in limits)
+        self._own(chat_id)[name] = limits
+
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO thresholds (chat_id, name, limits) VALUES (?, ?, ?)",
+                (chat_id, name, " ".join(repr(v) for v in limits)),
+            )
+            self._db.commit()
+
+    def reset(self, chat_id, name=None):
+        """Вернуть порог name (или все пороги чата) к значению по умолчанию."""
+        own = self._own(chat_id)
+        if name is None:
+            own.clear()
+        else:
+            own.pop(name, None)
+
+        if self._db is not None:
+            if name is None:
+                self._db.execute("DELETE FROM thresholds WHERE chat_id = ?", (chat_id,))
+            else:
+                self._db.execute("DELETE FROM thresholds WHERE chat_id = ? AND name = ?", (chat_id, name))
+            self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,205 @@
+"""
+Колоночный расчёт отчётов по оценкам и процентам (методы 3–6).
+
+Нужные колонки один раз вынимаются из строк листа, приводятся к числам массивом
+numpy, а отбор строк со значением и сортировка — маски и один argsort. Порог здесь
+не применяется (см. thresholds.py). Записи и их порядок те же, что
+у построчного расчёта в excel_parser; без numpy (или с REPORT_NUMPY = False)
+excel_parser считает построчно теми же функциями приведения, что здесь.
+"""
+from itertools import islice
+from operator import itemgetter
+
+from config import REPORT_NUMPY
+from reports import ReportEntry, GROUP_HOMEWORK, GROUP_CLASSROOM
+
+np = None
+_enabled = None
+
+
+def enabled() -> bool:
+    """
+    Считать ли колонками. numpy импортируется здесь, при первом отчёте, а не при
+    импорте модуля: to_float нужен и боту (thresholds), которому numpy не нужен.
+    """
+    global np, _enabled
+    if _enabled is None:
+        _enabled = False
+        if REPORT_NUMPY:
+            try:
+                import numpy
+            except ImportError:  # numpy — необязательная зависимость
+                pass
+            else:
+                np = numpy
+                _enabled = True
+    return _enabled
+
+# Типы ячеек, которые numpy переводит в float так же, как float(); None становится nan
+_PLAIN_TYPES = {int, float, type(None)}
+_PLAIN_TYPES_BOOL = _PLAIN_TYPES | {bool}
+
+
+# ---------- Приведение одного значения (построчный расчёт) ----------
+
+def to_float(x):
+    try:
+        return float(x)
+    except (ValueError, TypeError):
+        return None
+
+
+def to_percent(x):
+    if x is None:
+        return None
+
+    if isinstance(x, (int, float)):
+        val = float(x)
+        return val * 100 if 0 <= val <= 1 else val
+
+    s = str(x).strip().replace("%", "").replace(",", ".")
+    if not s:
+        return None
+    try:
+        val = float(s)
+        return val * 100 if 0 <= val <= 1 else val
+    except ValueError:
+        return None
+
+
+def _percent_number(x):
+    # Число из ячейки с процентом — без перевода долей в проценты
+    s = str(x).strip().replace("%", "").replace(",", ".")
+    try:
+        return float(s) if s else None
+    except ValueError:
+        return None
+
+
+def to_num(x):
+    if x is None:
+        return None
+    try:
+        return float(str(x).replace(",", ".").strip())
+    except (ValueError, TypeError):
+        return None
+
+
+def calc_pct(checked, received):
+    if checked is None or received is None:
+        return None
+    if received <= 0:
+        return None
+    return (checked / received) * 100.0
+
+
+# ---------- Колонки ----------
+
+BLOCK_ROWS = 4096
+
+
+def _column(rows, index):
+    """Значения колонки; строкам короче index + 1 достаётся None."""
+    try:
+        return list(map(itemgetter(index), rows))
+    except IndexError:
+        return [row[index] if len(row) > index else None for row in rows]
+
+
+def _columns(book, header_row, indices):
+    """
+    Нужные колонки листа после шапки и длины строк. Строки читаются блоками,
+    так что в потоковом режиме в памяти остаются только эти колонки.
+    """
+    rows = book.iter_rows(min_row=header_row + 1)
+    lengths = []
+    columns = {i: [] for i in set(indices)}
+    while True:
+        block = list(islice(rows, BLOCK_ROWS))
+        if not block:
+            break
+        lengths.extend(map(len, block))
+        for i, values in columns.items():
+            values.extend(_column(block, i))
+    return np.array(lengths, dtype=np.intp), columns
+
+
+def _named(lengths, need, fios):
+    # Те же строки, что пропускает построчный расчёт: короткие и без ФИО
+    return (lengths > need) & np.fromiter(map(bool, fios), dtype=bool, count=len(fios))
+
+
+def _array(values, convert, plain_types):
+    """
+    float64-массив значений колонки, nan — там, где convert вернул бы None.
+    Числа переводит numpy, через convert проходят только остальные значения
+    (строки с запятой, «%», даты) — правила приведения остаются одни.
+    """
+    if set(map(type, values)) <= plain_types:
+        return np.array(values, dtype=np.float64)
+    # Строк вида «45%» в колонке немного разных — каждую приводим один раз
+    others = {v for v in values if type(v) not in plain_types}
+    converted = {v: convert(v) for v in others}
+    return np.array([v if type(v) in plain_types else converted[v] for v in values], dtype=np.float64)
+
+
+def _percent_array(values):
+    arr = _array(values, _percent_number, _PLAIN_TYPES_BOOL)
+    # Доли 0…1 — это проценты, как в to_percent
+    return np.where((arr >= 0) & (arr <= 1), arr * 100, arr)
+
+
+def _sorted(values, mask):
+    """Индексы строк из mask по возрастанию значения (устойчиво, как list.sort)."""
+    index = np.flatnonzero(mask)
+    return index[np.argsort(values[index], kind="stable")]
+
+
+# ---------- Отчёты ----------
+
+def students_grades(book, layout) -> list:
+    fio_idx, hw_idx, cr_idx = layout["fio"], layout["homework"], layout["classroom"]
+    lengths, columns = _columns(book, layout["header_row"], (fio_idx, hw_idx, cr_idx))
+    fios, hw_raw, cr_raw = columns[fio_idx], columns[hw_idx], columns[cr_idx]
+    named = _named(lengths, max(fio_idx, hw_idx, cr_idx), fios)
+
+    # В отчёт идёт исходное значение ячейки, число нужно только для отбора
+    hw = _array(hw_raw, to_float, _PLAIN_TYPES_BOOL)
+    cr = _array(cr_raw, to_float, _PLAIN_TYPES_BOOL)
+    hw_rows = [ReportEntry(str(fios[i]), hw_raw[i], GROUP_HOMEWORK) for i in np.flatnonzero(named & ~np.isnan(hw)).tolist()]
+    cr_rows = [ReportEntry(str(fios[i]), cr_raw[i], GROUP_CLASSROOM) for i in np.flatnonzero(named & ~np.isnan(cr)).tolist()]
+    return hw_rows + cr_rows
+
+
+def percent_sorted(book, fio_idx, pct_idx, header_row) -> list:
+    """Методы 4 и 6: процент в одной колонке, строки по возрастанию процента."""
+    lengths, columns = _columns(book, header_row, (fio_idx, pct_idx))
+    fios = columns[fio_idx]
+    pct = _percent_array(columns[pct_idx])
+
+    order = _sorted(pct, _named(lengths, max(fio_idx, pct_idx), fios) & ~np.isnan(pct))
+    return [ReportEntry(str(fios[i]).strip(), value) for i, value in zip(order.tolist(), pct[order].tolist())]
+
+
+def checked_homework(book, layout) -> list:
+    fio_idx = layout["fio"]
+    pretty = layout["periods"]
+    start = fio_idx + 1
+    # Получено и проверено — 3-я и 4-я колонки каждого из трёх блоков по 5
+    periods = [(start + p * 5 + 2, start + p * 5 + 3) for p in range(3)]
+    lengths, columns = _columns(book, layout["header_row"], (fio_idx, *(i for pair in periods for i in pair)))
+    fios = columns[fio_idx]
+    named = _named(lengths, fio_idx, fios)
+
+    entries = []
+    for p, (received_idx, checked_idx) in enumerate(periods):
+        # Строке без колонок периода досталось None — и она пропускается, как в построчном расчёте
+        received = _array(columns[received_idx], to_num, _PLAIN_TYPES)
+        checked = _array(columns[checked_idx], to_num, _PLAIN_TYPES)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = checked / received * 100.0
+
+        order = _sorted(pct, named & (received > 0) & np.isfinite(pct))
+        for i, value, c, r in zip(order.tolist(), pct[order].tolist(), checked[order].tolist(), received[order].tolist()):
+            entries.append(ReportEntry(str(fios[i]).strip(), value, pretty[p], (int(c), int(r))))
+    return entries
@@ -1,2 +1,98 @@
 BOT_TOKEN = ("Paste_Your_Token")
 
+# --- Режим работы: long polling или webhook ---
+BOT_MODE = "polling"               # "webhook" — апдейты присылает Telegram (можно несколько копий бота)
+UPDATE_CONCURRENCY = 256           # сколько апдейтов обрабатываются одновременно
+WEBHOOK_URL = ""                   # внешний https-адрес, например "https://bot.example.com"; к нему добавляется WEBHOOK_PATH
+WEBHOOK_PATH = "/telegram"
+WEBHOOK_LISTEN = "127.0.0.1"       # TLS снимает обратный прокси, бот слушает обычный HTTP
+WEBHOOK_PORT = 8080
+WEBHOOK_SECRET = ""                # секрет в заголовке X-Telegram-Bot-Api-Secret-Token; пусто — не проверяется
+WEBHOOK_MAX_CONNECTIONS = 40       # сколько соединений одновременно Telegram открывает к боту
+TELEGRAM_API_URL = None            # другой адрес Bot API, например "http://127.0.0.1:8081" (свой сервер или заглушка для тестов)
+
+# --- Обработка файлов ---
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024  # больше Bot API всё равно не отдаёт; проверяется до скачивания
+PARSE_EXECUTOR = "thread"  # "thread" или "process"
+PARSE_MAX_WORKERS = 2      # сколько файлов разбираем одновременно
+PARSE_MAX_QUEUE = 20       # сколько файлов может ждать в очереди
+PARSE_MAX_PER_USER = 1     # сколько файлов одного пользователя разбирается одновременно
+PARSE_MAX_QUEUE_PER_USER = 3  # сколько файлов одного пользователя может ждать в очереди
+PARSE_SUPERSEDE = True     # новая загрузка файла с тем же именем отменяет ещё не готовый разбор старой
+PARSE_STREAMING = True     # читать лист потоком (read-only), не держа все ячейки в памяти
+PARSE_FAST_XML = True      # потоковый лист читает xlsx_fast; openpyxl — только для необычных файлов
+REPORT_NUMPY = True        # методы 3–6 считаются колонками через numpy, если он установлен
+PREWARM_PARSER = True      # после запуска бота импортировать openpyxl и разбор в фоне, не дожидаясь первого файла
+
+# --- Разбор в отдельных процессах worker.py через очередь заданий (на той же машине, что и бот) ---
+PARSE_BACKEND = "pool"             # "queue" — бот кладёт файлы в очередь, разбирают процессы worker.py
+JOB_QUEUE_PATH = "jobs.sqlite3"    # общая для бота и воркеров
+JOB_SPOOL_DIR = "job_files"        # файлы заданий (в базе только имя)
+JOB_LEASE_SECONDS = 60             # аренда задания; воркер продлевает её, упавший — теряет
+JOB_MAX_ATTEMPTS = 3               # после стольких прерванных разборов задание считается неудачным
+JOB_RESULT_TTL = 3600              # секунд хранения результатов, которые бот не забрал
+JOB_POLL_INTERVAL = 0.1            # секунд между проверками готовности результата
+JOB_RESULT_TIMEOUT = 600           # секунд ждать результат; дольше — задание снимается, пользователю ошибка
+JOB_WORKER_TIMEOUT = 30            # воркер, не отмечавшийся столько секунд, считается остановленным
+WORKER_PROCESSES = None            # процессов в worker.py; None — по числу ядер
+WORKER_IDLE_SLEEP = 0.2            # секунд между проверками пустой очереди
+
+# --- Пакетная обработка: все листы книги и zip-архивы с .xlsx ---
+BATCH_MAX_WORKERS = None           # процессов на все пакеты вместе; None — по числу ядер
+BATCH_MAX_FILES = 50               # .xlsx в одном архиве
+BATCH_MAX_SHEETS = 100             # листов во всём пакете
+BATCH_MAX_UNPACKED_BYTES = 200 * 1024 * 1024
+
+# --- Кэш готовых отчётов (повторно присланный тот же файл не разбирается заново) ---
+REPORT_CACHE_MAX_ENTRIES = 500
+REPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+REPORT_CACHE_TTL = 24 * 3600         # секунд
+REPORT_CACHE_PATH = None             # например "report_cache.sqlite3", чтобы кэш пережил перезапуск
+
+# --- Последние загрузки пользователей (для кнопок под отчётами, /threshold и /full) ---
+UPLOAD_STORE_MAX_BYTES = 32 * 1024 * 1024        # бюджет памяти, сверх него — во временные файлы
+UPLOAD_STORE_MAX_SPILL_BYTES = 512 * 1024 * 1024
+UPLOAD_STORE_TTL = 6 * 3600                       # секунд; столько работают кнопки под отчётами
+UPLOAD_STORE_SPILL_DIR = None                     # None — системная временная папка
+
+# --- Пороги отчётов 3–6 (по умолчанию; в чате меняются командой /threshold) ---
+# Несколько чисел — порог списка (первое) и границы распределения, например (40.0, 60.0, 80.0)
+REPORT_THRESHOLDS = {
+    "attendance": (40.0,),   # посещаемость преподавателя ≤, %
+    "checked": (70.0,),      # проверенные ДЗ <, %
+    "completion": (70.0,),   # выполненные ДЗ студента <, %
+    "homework": (1.05,),     # оценка за ДЗ ≤ (то есть «ДЗ = 1»)
+    "classroom": (3.0,),     # оценка за КР <
+}
+CHAT_SETTINGS_PATH = "chat_settings.sqlite3"   # None — пороги чатов только в памяти, до перезапуска
+
+# --- Повторная загрузка того же отчёта в чат: только изменения ---
+DIFF_REPORTS = True                # False — всегда полный список
+SNAPSHOT_PATH = "snapshots.sqlite3"  # снимки последних отчётов; None — только в памяти
+
+# --- История отчётов 3–6 (/trend, /streak) ---
+HISTORY_PATH = "history.sqlite3"   # None — история только в памяти, до перезапуска
+HISTORY_KEEP_DAYS = 365            # более старые загрузки удаляются; None — хранить всё
+TREND_WEEKS = 8                    # недель в /trend по умолчанию
+STREAK_WEEKS = 3                   # недель подряд в /streak по умолчанию
+
+# --- Превью больших отчётов 3–6: сначала худшие строки, полный список — по кнопке ---
+PREVIEW_TOP_N = 20                 # худших строк в каждом разделе; 0 — сразу полный отчёт
+
+# --- Отправка длинных отчётов (лимиты Telegram) ---
+SEND_GLOBAL_RATE = 25              # сообщений в секунду на всего бота
+SEND_PRIVATE_CHAT_RATE = 1.0       # сообщений в секунду в личный чат
+SEND_GROUP_CHAT_RATE = 20 / 60     # сообщений в секунду в группу
+SEND_CHAT_BURST = 3                # сколько сообщений можно отправить подряд без паузы
+SEND_MAX_RETRIES = 5
+
+# --- Большие отчёты отправляются файлом, а не десятками сообщений ---
+REPORT_FILE_THRESHOLD = 12000      # символов в тексте отчёта (примерно 3 сообщения)
+REPORT_FILE_FORMAT = "xlsx"        # "xlsx", "csv" или "html"
+REPORT_FILE_WORKERS = 1            # свой пул для сборки файлов — не занимает слоты разбора
+
+# --- Статистика (/stats) ---
+ADMIN_IDS = set()                  # Telegram id пользователей, которым доступна команда /stats
+STATS_WINDOW = 1000                # сколько последних замеров хранить для p50/p95/p99
+STATS_PROMETHEUS_PATH = None       # например "bot_stats.prom" — выгрузка в формате Prometheus
+STATS_DUMP_INTERVAL = 60           # секунд между выгрузками
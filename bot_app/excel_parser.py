@@ -1,10 +1,36 @@
 import io
-import re
+import math
+import time
 from collections import defaultdict, Counter
+from itertools import islice
 import openpyxl
 
-
-THEME_REGEX = re.compile(r"^Урок\s*№\s*\d+\.\s*Тема:\s*.+$", re.IGNORECASE)
+import columnar
+from columnar import to_float, to_percent, to_num, calc_pct
+from config import PARSE_FAST_XML
+from sheet_layout import (
+    HEAD_ROWS,
+    REPORT_SCHEDULE,
+    REPORT_TOPICS,
+    REPORT_STUDENTS,
+    REPORT_TEACHERS_ATTENDANCE,
+    REPORT_CHECKED_HOMEWORK,
+    REPORT_HW_COMPLETION,
+    classify_header,
+)
+from reports import Report, ReportEntry, GROUP_HOMEWORK, GROUP_CLASSROOM, PROCESSING_ERROR
+from renderers import render_html
+from text_engine import (
+    BATCH_CELLS,
+    EMPTY_TOPIC,
+    SUBJECT_MARK,
+    count_subjects,
+    invalid_topics,
+    subject_name,
+    topic_rule,
+)
+from thresholds import DEFAULT_LIMITS, apply_thresholds, with_threshold, is_scored
+from xlsx_fast import FastSheet, FastUnsupported
 
 
 def detect_excel_type(data: bytes) -> str:
@@ -13,131 +39,163 @@ def detect_excel_type(data: bytes) -> str:
     return "unknown"
 
 
+class ParsedWorkbook:
+    """
+    Лист файла (по умолчанию первый), открытый один раз, и определённый тип отчёта.
+    rows — все значения листа в памяти; data — потоковый режим: строки читаются
+    из read-only листа по мере обхода, в памяти только шапка. fast — читать лист
+    через xlsx_fast, а openpyxl — только если файл ему не по силам.
+    """
+
+    def __init__(self, rows=None, data=None, sheet=0, fast=False):
+        self.rows = rows
+        self.data = data
+        self.sheet = sheet
+        self.fast = fast
+        self._sheet = None
+        self.head = None
+        self.width = 0
+        if data is not None:
+            self._open_sheet()
+
+        self.head = list(self.iter_rows(max_row=HEAD_ROWS))
+        # Ширина шапки: до неё дополняются короткие строки потокового листа
+        self.width = max(map(len, self.head), default=0)
+        self.layout = classify_header(self.head)
+        self.kind = self.layout.kind
+        self.is_students_choice = self.layout.is_students_choice
+
+    def _open_sheet(self):
+        if self.fast:
+            try:
+                self._sheet = FastSheet(self.data, self.sheet)
+                return
+            except FastUnsupported:
+                pass
+        # BytesIO поверх bytes не копирует данные, пока в него не пишут
+        wb = openpyxl.load_workbook(io.BytesIO(self.data), read_only=True, data_only=True)
+        self._sheet = wb.worksheets[self.sheet]
+        # <dimension> из файла бывает устаревшим (выгрузки сторонних программ) — тогда read-only
+        # лист обрезает по нему строки и колонки; без него читается весь sheetData,
+        # а разную ширину строк выравнивает _pad_rows
+        self._sheet.reset_dimensions()
+
+    def iter_rows(self, min_row=1, max_row=None):
+        # Те же номера строк (с 1), что и у openpyxl iter_rows(values_only=True)
+        if self.rows is not None:
+            return islice(self.rows, min_row - 1, max_row)
+        if max_row is not None and max_row <= HEAD_ROWS and self.head is not None:
+            return islice(self.head, min_row - 1, max_row)
+        rows = _skip_trailing_empty(self._sheet.iter_rows(min_row=min_row, max_row=max_row, values_only=True))
+        return _pad_rows(rows, self.width) if self.width else rows
+
+    def __getstate__(self):
+        # read-only лист не сериализуется (пул процессов) — передаём исходные байты
+        state = self.__dict__.copy()
+        state["_sheet"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.data is not None:
+            self._open_sheet()
+
+
+def _pad_rows(rows, width):
+    # Без <dimension> read-only лист отдаёт строки без пустых ячеек в конце, а полная
+    # загрузка — всегда до последней колонки; короткие строки дополняются None до ширины
+    # шапки, иначе проверки len(row) отбросили бы строку с пустой последней ячейкой
+    for row in rows:
+        if len(row) < width:
+            row = (*row, *(None,) * (width - len(row)))
+        yield row
+
+
+def _skip_trailing_empty(rows):
+    # read-only openpyxl отдаёт и пустые <row/> в конце листа (например, с заданной высотой),
+    # а полная загрузка их не видит — пустые строки отдаём только если за ними есть данные
+    empty = []
+    for row in rows:
+        if all(v is None for v in row):
+            empty.append(row)
+            continue
+        if empty:
+            yield from empty
+            empty = []
+        yield row
+
+
 # --- Метод 1: Расписание ---
-def report_schedule_count(wb) -> str:
+def report_schedule_count(book) -> Report:
+    # Ячейки с «Предмет:» копятся пачкой, строки «Предмет: ...» ищет один regex по склейке
     counter = Counter()
-    ws = wb.worksheets[0]
-    for row in ws.iter_rows(values_only=True):
+    cells = []
+    for row in book.iter_rows():
         for cell in row:
-            if isinstance(cell, str) and "Предмет:" in cell:
-                for line in cell.splitlines():
-                    line = line.strip()
-                    if line.startswith("Предмет:"):
-                        subj = line.replace("Предмет:", "", 1).strip()
-                        if subj:
-                            counter[subj] += 1
-
-    if not counter:
-        return "Не нашел строк 'Предмет:'."
+            if isinstance(cell, str) and SUBJECT_MARK in cell:
+                cells.append(cell)
+        if len(cells) >= BATCH_CELLS:
+            count_subjects(cells, counter)
+            cells = []
+    count_subjects(cells, counter)
 
-    lines = ["📊 <b>Количество пар по предметам:</b>\n"]
-    for name, cnt in counter.most_common():
-        lines.append(f"▫️ {name}: <b>{cnt}</b>")
-    return "\n".join(lines)
+    entries = [ReportEntry(name, cnt) for name, cnt in counter.most_common()]
+    return Report(REPORT_SCHEDULE, entries)
 
 
 # --- Метод 2: Темы уроков ---
-def report_bad_topics_grouped(wb) -> str:
-    ws = wb.worksheets[0]
-
-    topic_col_idx = -1
-    subj_col_idx = -1
-    header_row = -1
-
-    for r_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=10, values_only=True)):
-        for c_idx, val in enumerate(row):
-            if isinstance(val, str):
-                if "Тема урока" in val:
-                    topic_col_idx = c_idx
-                if "Предмет" in val:
-                    subj_col_idx = c_idx
-        if topic_col_idx != -1:
-            header_row = r_idx
-            break
-
-    if topic_col_idx == -1:
-        topic_col_idx = 5
-    if subj_col_idx == -1:
-        subj_col_idx = 2
-
-    start_row = header_row + 2 if header_row != -1 else 2
-    errors = defaultdict(list)
-    count = 0
-
-    for row in ws.iter_rows(min_row=start_row, values_only=True):
-        if len(row) <= max(topic_col_idx, subj_col_idx):
-            continue
-
-        subj = row[subj_col_idx]
-        topic = row[topic_col_idx]
-        if not subj:
-            subj = "Без предмета"
-        else:
-            subj = str(subj).strip()
-
-        t_str = str(topic).strip() if topic else ""
-        is_bad = False
-
-        if not topic:
-            t_str = "(пустая ячейка)"
-            is_bad = True
-        elif not THEME_REGEX.match(t_str):
-            is_bad = True
-
-        if is_bad:
-            errors[subj].append(t_str)
-            count += 1
-
-    if count == 0:
-        return "✅ Все темы верные!"
-
-    lines = [f"⚠️ <b>Темы с ошибками ({count} шт):</b>\n"]
-    for subj in sorted(errors.keys()):
-        lines.append(f"📕 <b>{subj}</b>")
-        for bad_t in errors[subj]:
-            lines.append(f"  • {bad_t}")
-        lines.append("")
-    return "\n".join(lines)
+def report_bad_topics_grouped(book) -> Report:
+    layout = book.layout.topics
+    topic_col_idx = layout["topic"]
+    subj_col_idx = layout["subject"]
+    start_row = layout["header_row"] + 1
 
+    need = max(topic_col_idx, subj_col_idx)
+    errors = defaultdict(list)
+    rows = book.iter_rows(min_row=start_row)
+    # Лист обрабатывается пачками строк: колонка тем проверяется целиком,
+    # предмет приводится к виду только у строк с ошибкой
+    while chunk := list(islice(rows, BATCH_CELLS)):
+        batch = [row for row in chunk if len(row) > need]
+        cells = [row[topic_col_idx] for row in batch]
+        topics = [str(topic).strip() if topic else "" for topic in cells]
+        for i in invalid_topics(topics):
+            subj = batch[i][subj_col_idx]
+            subj = subject_name(subj) if subj else "Без предмета"
+            if cells[i]:
+                errors[subj].append((topics[i], topic_rule(topics[i])))
+            else:
+                errors[subj].append((EMPTY_TOPIC, None))
+
+    entries = [
+        ReportEntry(bad_t, group=subj, extra=(rule,) if rule else ())
+        for subj in sorted(errors.keys())
+        for bad_t, rule in errors[subj]
+    ]
+    return Report(REPORT_TOPICS, entries)
+
+
+# Методы 3–6: threshold=None — все строки со значением, без порога (его применяют
+# потом, см. thresholds.apply_thresholds); иначе — только строки под порогом.
 
 # --- Метод 3: Отчет по студентам ---
-def report_students_bad_grades(wb) -> str:
-    ws = wb.worksheets[0]
-
-    fio_idx = -1
-    hw_idx = -1
-    cr_idx = -1
-    header_row = -1
-
-    for r_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=5, values_only=True)):
-        for c_idx, val in enumerate(row):
-            if not isinstance(val, str):
-                continue
+def report_students_bad_grades(book, threshold=(1.05, 3.0)) -> Report:
+    layout = book.layout.students
+    if layout is None:
+        return Report(REPORT_STUDENTS, error="❌ Не нашел нужные колонки (FIO, Homework, Classroom). Проверь заголовки.")
 
-            val_clean = val.strip().lower()
+    if columnar.enabled():
+        entries = columnar.students_grades(book, layout)
+        return with_threshold(Report(REPORT_STUDENTS, entries, groups=(GROUP_HOMEWORK, GROUP_CLASSROOM)), threshold)
 
-            if val_clean in ["fio", "фио"]:
-                fio_idx = c_idx
+    fio_idx = layout["fio"]
+    hw_idx = layout["homework"]
+    cr_idx = layout["classroom"]
 
-            if val_clean in ["homework", "дз", "домашняяработа"]:
-                hw_idx = c_idx
+    hw_list = []
+    cr_list = []
 
-            if val_clean in ["classroom", "кр", "класснаяработа"]:
-                cr_idx = c_idx
-
-        if fio_idx != -1 and hw_idx != -1:
-            header_row = r_idx
-            break
-
-    if fio_idx == -1 or hw_idx == -1 or cr_idx == -1:
-        return "❌ Не нашел нужные колонки (FIO, Homework, Classroom). Проверь заголовки."
-
-    hw_bad_list = []
-    cr_bad_list = []
-
-    start_row = header_row + 2
-
-    for row in ws.iter_rows(min_row=start_row, values_only=True):
+    for row in book.iter_rows(min_row=layout["header_row"] + 1):
         if len(row) <= max(fio_idx, hw_idx, cr_idx):
             continue
 
@@ -148,181 +206,75 @@ def report_students_bad_grades(wb) -> str:
         if not fio:
             continue
 
-        try:
-            hw_score = float(hw_val)
-            if hw_score <= 1.05:
-                hw_bad_list.append(f"{fio} (ДЗ: {hw_val})")
-        except (ValueError, TypeError):
-            pass
-
-        try:
-            cr_score = float(cr_val)
-            if cr_score < 3:
-                cr_bad_list.append(f"{fio} (КР: {cr_val})")
-        except (ValueError, TypeError):
-            pass
-
-    if not hw_bad_list and not cr_bad_list:
-        return "🎉 <b>Идеально!</b> Нет студентов с ДЗ=1 или КР<3."
-
-    report = []
-
-    if hw_bad_list:
-        report.append(f"📉 <b>ДЗ = 1 ({len(hw_bad_list)} чел):</b>")
-        for s in hw_bad_list:
-            report.append(f"  • {s}")
-    else:
-        report.append("✅ <b>По ДЗ (оценка 1):</b> никого не найдено.")
-
-    report.append("")
+        if is_scored(to_float(hw_val)):
+            hw_list.append(ReportEntry(str(fio), hw_val, GROUP_HOMEWORK))
 
-    if cr_bad_list:
-        report.append(f"🆘 <b>КР меньше 3 ({len(cr_bad_list)} чел):</b>")
-        for s in cr_bad_list:
-            report.append(f"  • {s}")
-    else:
-        report.append("✅ <b>По КР (оценка меньше 3):</b> никого не найдено.")
+        if is_scored(to_float(cr_val)):
+            cr_list.append(ReportEntry(str(fio), cr_val, GROUP_CLASSROOM))
 
-    return "\n".join(report)
+    return with_threshold(Report(REPORT_STUDENTS, hw_list + cr_list, groups=(GROUP_HOMEWORK, GROUP_CLASSROOM)), threshold)
 
 
 # --- Метод 4: Посещаемость по преподавателям (<= 40%) ---
-def report_teachers_attendance_below_40(wb, threshold=40.0) -> str:
-    ws = wb.worksheets[0]
-
-    fio_idx = -1
-    avg_idx = -1
-    header_row = -1
-
-    for r_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=10, values_only=True), start=1):
-        for c_idx, val in enumerate(row):
-            if not isinstance(val, str):
-                continue
-            v = val.strip().lower()
-
-            if "фио преподавателя" in v:
-                fio_idx = c_idx
-            if "средняя посещаемость" in v:
-                avg_idx = c_idx
-
-        if fio_idx != -1 and avg_idx != -1:
-            header_row = r_idx
-            break
-
-    if header_row == -1:
-        return "❌ Не нашёл заголовки 'ФИО преподавателя' и/или 'Средняя посещаемость'."
-
-    def to_percent(x):
-        if x is None:
-            return None
-
-        if isinstance(x, (int, float)):
-            val = float(x)
-            return val * 100 if 0 <= val <= 1 else val
-
-        s = str(x).strip().replace("%", "").replace(",", ".")
-        if not s:
-            return None
-        try:
-            val = float(s)
-            return val * 100 if 0 <= val <= 1 else val
-        except ValueError:
-            return None
+def report_teachers_attendance_below_40(book, threshold=40.0) -> Report:
+    layout = book.layout.attendance
+    if layout is None:
+        return Report(
+            REPORT_TEACHERS_ATTENDANCE,
+            threshold=threshold,
+            error="❌ Не нашёл заголовки 'ФИО преподавателя' и/или 'Средняя посещаемость'.",
+        )
+
+    fio_idx = layout["fio"]
+    avg_idx = layout["avg"]
+    header_row = layout["header_row"]
+
+    if columnar.enabled():
+        entries = columnar.percent_sorted(book, fio_idx, avg_idx, header_row)
+        return with_threshold(Report(REPORT_TEACHERS_ATTENDANCE, entries), threshold)
 
     bad = []
-    for row in ws.iter_rows(min_row=header_row + 1, values_only=True):
+    for row in book.iter_rows(min_row=header_row + 1):
         if len(row) <= max(fio_idx, avg_idx):
             continue
 
         fio = row[fio_idx]
         avg = to_percent(row[avg_idx])
 
-        if not fio or avg is None:
+        if not fio or not is_scored(avg):
             continue
 
-        if avg <= threshold:
-            bad.append((avg, str(fio).strip()))
-
-    if not bad:
-        return f"✅ <b>Посещаемость {int(threshold)}% и ниже</b>: преподавателей не найдено."
+        bad.append((avg, str(fio).strip()))
 
     bad.sort(key=lambda x: x[0])
 
-    lines = [f"⚠️ <b>Посещаемость {int(threshold)}% и ниже:</b>\n"]
-    for avg, fio in bad:
-        lines.append(f"• <b>{fio}</b>: {avg:.0f}%")
-
-    return "\n".join(lines)
+    entries = [ReportEntry(fio, avg) for avg, fio in bad]
+    return with_threshold(Report(REPORT_TEACHERS_ATTENDANCE, entries), threshold)
 
 
 # --- Метод 5: Проверенные домашние задания (< 70%) ---
-def report_checked_homework_below_70(wb, threshold=70.0) -> str:
-    ws = wb.worksheets[0]
-
-    def norm(x) -> str:
-        return str(x).strip().lower() if x is not None else ""
-
-    def to_num(x):
-        if x is None:
-            return None
-        try:
-            return float(str(x).replace(",", ".").strip())
-        except (ValueError, TypeError):
-            return None
-
-    def calc_pct(checked, received):
-        if checked is None or received is None:
-            return None
-        if received <= 0:
-            return None
-        return (checked / received) * 100.0
-
-    header_row = None
-    header_vals = None
-    for r_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=10, values_only=True), start=1):
-        row_norm = [norm(c) for c in row]
-        joined = " ".join(row_norm)
-        if (("месяц" in joined or "мес" in joined) and ("нед" in joined) and ("день" in joined)):
-            header_row = r_idx
-            header_vals = row_norm
-            break
-
-    if header_row is None:
-        return "❌ Метод 5: не нашёл строку шапки с 'месяц/неделя/день'."
-
-    fio_idx = -1
-    for i, h in enumerate(header_vals):
-        if "фио" in h or "преподав" in h:
-            fio_idx = i
-            break
-    if fio_idx == -1:
-        fio_idx = 0
-
+def report_checked_homework_below_70(book, threshold=70.0) -> Report:
+    layout = book.layout.checked_homework
+    if layout is None:
+        return Report(
+            REPORT_CHECKED_HOMEWORK, threshold=threshold, error="❌ Метод 5: не нашёл строку шапки с 'месяц/неделя/день'."
+        )
+
+    if columnar.enabled():
+        entries = columnar.checked_homework(book, layout)
+        return with_threshold(Report(REPORT_CHECKED_HOMEWORK, entries, groups=tuple(layout["periods"])), threshold)
+
+    header_row = layout["header_row"]
+    fio_idx = layout["fio"]
+    pretty = layout["periods"]
     start = fio_idx + 1
 
-    raw_names = []
-    for b in range(3):
-        idx = start + b * 5
-        nm = header_vals[idx] if idx < len(header_vals) else ""
-        raw_names.append(nm)
-
-    pretty = []
-    for nm in raw_names:
-        if "месяц" in nm or "мес" in nm:
-            pretty.append("За месяц")
-        elif "нед" in nm:
-            pretty.append("За неделю")
-        elif "день" in nm:
-            pretty.append("За день")
-        else:
-            pretty.append(nm if nm else f"Период {len(pretty)+1}")
-
     RECEIVED_OFF = 2
     CHECKED_OFF = 3
 
     bad = {0: [], 1: [], 2: []}
 
-    for row in ws.iter_rows(min_row=header_row + 1, values_only=True):
+    for row in book.iter_rows(min_row=header_row + 1):
         if len(row) <= fio_idx:
             continue
 
@@ -340,136 +292,149 @@ def report_checked_homework_below_70(wb, threshold=70.0) -> str:
             checked = to_num(row[base + CHECKED_OFF])
             pct = calc_pct(checked, received)
 
-            if pct is None:
+            # Бесконечный процент не проходит ни один порог
+            if pct is None or not math.isfinite(pct):
                 continue
 
-            if pct < threshold:
-                bad[p].append((pct, fio, int(checked), int(received)))
-
-    if not bad[0] and not bad[1] and not bad[2]:
-        return f"✅ <b>Метод 5:</b> преподавателей с процентом проверенных ДЗ ниже {int(threshold)}% не найдено."
-
-    lines = [f"⚠️ <b>Проверенные ДЗ ниже {int(threshold)}%:</b>\n"]
+            bad[p].append((pct, fio, int(checked), int(received)))
 
+    entries = []
     for p in range(3):
-        if bad[p]:
-            bad[p].sort(key=lambda x: x[0])
-            lines.append(f"📌 <b>{pretty[p]}:</b>")
-            for pct, fio, checked, received in bad[p]:
-                lines.append(f"• <b>{fio}</b>: {pct:.0f}% (проверено {checked} из {received})")
-            lines.append("")
-        else:
-            lines.append(f"✅ <b>{pretty[p]}:</b> все >= порога.")
-            lines.append("")
+        bad[p].sort(key=lambda x: x[0])
+        for pct, fio, checked, received in bad[p]:
+            entries.append(ReportEntry(fio, pct, pretty[p], (checked, received)))
 
-    return "\n".join(lines).rstrip()
+    return with_threshold(Report(REPORT_CHECKED_HOMEWORK, entries, groups=tuple(pretty)), threshold)
 
 
 # --- Метод 6: Отчет по сданным домашним заданиям (< 70%) ---
-def report_students_homework_completion_below_70(wb, threshold=70.0) -> str:
-    ws = wb.worksheets[0]
-
-    def norm(x) -> str:
-        return str(x).strip().lower() if x is not None else ""
-
-    def to_percent(x):
-        if x is None:
-            return None
+def report_students_homework_completion_below_70(book, threshold=70.0) -> Report:
+    layout = book.layout.hw_completion
+    if layout is None:
+        return Report(
+            REPORT_HW_COMPLETION, threshold=threshold, error="❌ Метод 6: не нашёл заголовки 'FIO' и 'Percentage Homework'."
+        )
 
-        if isinstance(x, (int, float)):
-            val = float(x)
-            return val * 100 if 0 <= val <= 1 else val
+    fio_idx = layout["fio"]
+    pct_idx = layout["pct"]
+    header_row = layout["header_row"]
 
-        s = str(x).strip().replace("%", "").replace(",", ".")
-        if not s:
-            return None
-        try:
-            val = float(s)
-            return val * 100 if 0 <= val <= 1 else val
-        except ValueError:
-            return None
-
-    fio_idx = -1
-    pct_idx = -1
-    header_row = -1
-
-    for r_idx, row in enumerate(ws.iter_rows(min_row=1, max_row=10, values_only=True), start=1):
-        row_norm = [norm(c) for c in row]
-
-        for c_idx, v in enumerate(row_norm):
-            if v in ("fio", "фио"):
-                fio_idx = c_idx
-            if v == "percentage homework":
-                pct_idx = c_idx
-
-        if fio_idx != -1 and pct_idx != -1:
-            header_row = r_idx
-            break
-
-    if header_row == -1:
-        return "❌ Метод 6: не нашёл заголовки 'FIO' и 'Percentage Homework'."
+    if columnar.enabled():
+        entries = columnar.percent_sorted(book, fio_idx, pct_idx, header_row)
+        return with_threshold(Report(REPORT_HW_COMPLETION, entries), threshold)
 
     bad = []
-    for row in ws.iter_rows(min_row=header_row + 1, values_only=True):
+    for row in book.iter_rows(min_row=header_row + 1):
         if len(row) <= max(fio_idx, pct_idx):
             continue
 
         fio = row[fio_idx]
         pct = to_percent(row[pct_idx])
 
-        if not fio or pct is None:
+        if not fio or not is_scored(pct):
             continue
 
-        fio = str(fio).strip()
-
-        if pct < threshold:
-            bad.append((pct, fio))
-
-    if not bad:
-        return f"✅ <b>Метод 6:</b> студентов с % выполненных ДЗ ниже {int(threshold)}% не найдено."
+        bad.append((pct, str(fio).strip()))
 
     bad.sort(key=lambda x: x[0])
 
-    lines = [f"⚠️ <b>% выполненных ДЗ ниже {int(threshold)}%:</b>\n"]
-    for pct, fio in bad:
-        lines.append(f"• <b>{fio}</b>: {pct:.0f}%")
-
-    return "\n".join(lines)
+    entries = [ReportEntry(fio, pct) for pct, fio in bad]
+    return with_threshold(Report(REPORT_HW_COMPLETION, entries), threshold)
 
 
-# ---------- ДЛЯ КНОПОК МЕТОДОВ 3/6 ----------
+# ---------- ЗАГРУЗКА ФАЙЛА (один раз на загрузку) ----------
 
 def _load_wb_from_bytes(data: bytes):
     return openpyxl.load_workbook(io.BytesIO(data), data_only=True)  # загрузка из bytes
 
 
+def load_parsed_workbook(data: bytes, streaming=True, sheet=0, fast=PARSE_FAST_XML) -> ParsedWorkbook:
+    if streaming:
+        return ParsedWorkbook(data=data, sheet=sheet, fast=fast)
+
+    wb = _load_wb_from_bytes(data)
+    rows = list(wb.worksheets[sheet].iter_rows(values_only=True))
+    wb.close()
+    return ParsedWorkbook(rows=rows, sheet=sheet)
+
+
+def build_report(book: ParsedWorkbook) -> Report:
+    # Отчёты 3–6 — без порога: порог чата применяется при выводе,
+    # и смена порога не требует повторного разбора файла
+    if book.kind == REPORT_TEACHERS_ATTENDANCE:
+        return report_teachers_attendance_below_40(book, threshold=None)
+    elif book.kind == REPORT_CHECKED_HOMEWORK:
+        return report_checked_homework_below_70(book, threshold=None)
+    elif book.kind == REPORT_HW_COMPLETION:
+        return report_students_homework_completion_below_70(book, threshold=None)
+    elif book.kind == REPORT_STUDENTS:
+        return report_students_bad_grades(book, threshold=None)
+    elif book.kind == REPORT_TOPICS:
+        return report_bad_topics_grouped(book)
+    else:
+        return report_schedule_count(book)
+
+
+def build_students_choices(book: ParsedWorkbook) -> dict:
+    # Оба отчёта для кнопок 3/6 считаются из того же открытого файла,
+    # чтобы нажатие кнопки не требовало исходных байтов
+    return {
+        REPORT_STUDENTS: report_students_bad_grades(book, threshold=None),
+        REPORT_HW_COMPLETION: report_students_homework_completion_below_70(book, threshold=None),
+    }
+
+
+def process_upload(data: bytes, streaming=True, timings=None, sheet=0):
+    """
+    Единственная точка входа для загруженного файла: читает его один раз.
+    Возвращает (choices, result). Если нужен выбор отчёта 3/6 — result is None,
+    а choices — готовые отчёты по ключам REPORT_*. Иначе choices is None.
+    Отчёты 3–6 возвращаются без порога — перед выводом к ним применяют
+    thresholds.apply_thresholds с порогами чата.
+    В timings (если передан) записываются время этапов load (вместе с шапкой) и report
+    и тип отчёта kind — для статистики.
+    """
+    if detect_excel_type(data) != "xlsx":
+        return None, Report(None, error="❌ Нужен файл .xlsx")
+
+    if timings is None:
+        timings = {}
+    try:
+        start = time.perf_counter()
+        book = load_parsed_workbook(data, streaming=streaming, sheet=sheet)
+        loaded = time.perf_counter()
+        timings["load"] = loaded - start
+        timings["kind"] = book.kind
+
+        if book.is_students_choice:
+            result = build_students_choices(book), None
+        else:
+            result = None, build_report(book)
+        timings["report"] = time.perf_counter() - loaded
+        return result
+    except Exception as e:
+        return None, Report(None, error=f"{PROCESSING_ERROR}: {e}")
+
+
+# ---------- ДЛЯ КНОПОК МЕТОДОВ 3/6 ----------
+
 def process_students_bad_grades_from_bytes(data: bytes) -> str:
     if detect_excel_type(data) != "xlsx":
         return "❌ Нужен файл .xlsx"
-    wb = _load_wb_from_bytes(data)
-    return report_students_bad_grades(wb)
+    return render_html(report_students_bad_grades(load_parsed_workbook(data)))
 
 
 def process_students_hw_completion_from_bytes(data: bytes) -> str:
     if detect_excel_type(data) != "xlsx":
         return "❌ Нужен файл .xlsx"
-    wb = _load_wb_from_bytes(data)
-    return report_students_homework_completion_below_70(wb, threshold=70.0)
+    return render_html(report_students_homework_completion_below_70(load_parsed_workbook(data), threshold=70.0))
 
 
 def is_students_reports_3_or_6(data: bytes) -> bool:
     if detect_excel_type(data) != "xlsx":
         return False
     try:
-        wb = _load_wb_from_bytes(data)
-        ws = wb.worksheets[0]
-        for row in ws.iter_rows(min_row=1, max_row=10, values_only=True):
-            row_str = [str(c).strip().lower() for c in row if c is not None]
-            has_fio = any(s in ("fio", "фио") for s in row_str)
-            has_any = any(s in ("homework", "classroom", "percentage homework") for s in row_str)
-            if has_fio and has_any:
-                return True
-        return False
+        return load_parsed_workbook(data).is_students_choice
     except Exception:
         return False
 
@@ -480,53 +445,6 @@ def process_excel_file(data: bytes) -> str:
         return "❌ Нужен файл .xlsx"
 
     try:
-        wb = _load_wb_from_bytes(data)
-        ws = wb.worksheets[0]
-
-        is_teachers_attendance = False
-        is_checked_homework = False
-        is_students_hw_completion = False
-        is_students = False
-        is_topics = False
-
-        for row in ws.iter_rows(max_row=15, values_only=True):
-            row_str = [str(c).strip().lower() for c in row if c]
-
-            if any("фио преподавателя" in s for s in row_str) and any("средняя посещаемость" in s for s in row_str):
-                is_teachers_attendance = True
-                break
-
-            if (any("месяц" in s or "мес" in s for s in row_str)
-                    and any("нед" in s for s in row_str)
-                    and any("день" in s for s in row_str)):
-                is_checked_homework = True
-                break
-
-            if (any(s == "fio" or s == "фио" for s in row_str)
-                    and any("percentage homework" in s for s in row_str)):
-                is_students_hw_completion = True
-                break
-
-            if any("fio" in s or "фио" in s for s in row_str) and any("homework" in s for s in row_str):
-                is_students = True
-                break
-
-            if any("тема урока" in s for s in row_str):
-                is_topics = True
-                break
-
-        if is_teachers_attendance:
-            return report_teachers_attendance_below_40(wb, threshold=40.0)
-        elif is_checked_homework:
-            return report_checked_homework_below_70(wb, threshold=70.0)
-        elif is_students_hw_completion:
-            return report_students_homework_completion_below_70(wb, threshold=70.0)
-        elif is_students:
-            return report_students_bad_grades(wb)
-        elif is_topics:
-            return report_bad_topics_grouped(wb)
-        else:
-            return report_schedule_count(wb)
-
+        return render_html(apply_thresholds(build_report(load_parsed_workbook(data)), DEFAULT_LIMITS))
     except Exception as e:
-        return f"❌ Ошибка обработки: {e}"
+        return f"{PROCESSING_ERROR}: {e}"
@@ -0,0 +1,158 @@
+"""
+История отчётов 3–6 по чатам в SQLite: значения всех строк каждой загрузки
+с индексами по ФИО, разделу (список ДЗ/КР, период) и дате загрузки.
+
+Команды /trend и /streak отвечают по индексу, без повторного чтения xlsx.
+Загрузка записывается одной транзакцией (executemany); тот же результат,
+присланный повторно, второй раз не записывается. Неделя загрузки — дата её
+понедельника: из нескольких загрузок одной недели в ответах берётся последняя.
+"""
+import datetime
+import sqlite3
+import threading
+
+from snapshots import snapshot_values, values_digest
+from thresholds import LIMITS, is_scored, limit_of, score
+
+
+def week_of(moment: datetime.datetime) -> str:
+    monday = moment.date() - datetime.timedelta(days=moment.weekday())
+    return monday.isoformat()
+
+
+def name_key(name: str) -> str:
+    # Для поиска без учёта регистра (lower() в SQLite кириллицу не понимает)
+    return " ".join(name.casefold().replace("ё", "е").split())
+
+
+class HistoryStore:
+    """
+    Загрузки (uploads) и их строки (records). При указании path история хранится
+    в файле и переживает перезапуск бота; без path — в базе в памяти.
+    Бот вызывает методы из потоков (asyncio.to_thread): соединение одно, под блокировкой.
+    """
+
+    def __init__(self, path=None, keep_days=None):
+        self.keep_days = keep_days
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, kind TEXT NOT NULL, "
+            "uploaded REAL NOT NULL, week TEXT NOT NULL, digest TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS uploads_chat ON uploads (chat_id, kind, week);"
+            "CREATE TABLE IF NOT EXISTS records ("
+            "upload_id INTEGER NOT NULL, chat_id INTEGER NOT NULL, kind TEXT NOT NULL, grp TEXT NOT NULL, "
+            "name TEXT NOT NULL, name_key TEXT NOT NULL, value REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS records_name ON records (chat_id, name_key, upload_id);"
+            "CREATE INDEX IF NOT EXISTS records_upload ON records (upload_id, grp, value);"
+        )
+        self._db.commit()
+
+    # ---------- Запись ----------
+
+    def ingest(self, chat_id, reports, moment: datetime.datetime) -> int:
+        """Записать отчёты одной загрузки; возвращает число записанных строк."""
+        written = 0
+        with self._lock, self._db:
+            for report in reports:
+                if not report.ok or not report.entries:
+                    continue
+                digest = values_digest(snapshot_values(report))
+                last = self._db.execute(
+                    "SELECT digest FROM uploads WHERE chat_id = ? AND kind = ? ORDER BY id DESC LIMIT 1",
+                    (chat_id, report.kind),
+                ).fetchone()
+                if last is not None and last[0] == digest:
+                    continue  # тот же файл ещё раз — в истории он уже есть
+
+                upload_id = self._db.execute(
+                    "INSERT INTO uploads (chat_id, kind, uploaded, week, digest) VALUES (?, ?, ?, ?, ?)",
+                    (chat_id, report.kind, moment.timestamp(), week_of(moment), digest),
+                ).lastrowid
+                rows = [
+                    (upload_id, chat_id, report.kind, e.group, e.name, name_key(e.name), score(report, e))
+                    for e in report.entries
+                    if is_scored(score(report, e))
+                ]
+                self._db.executemany(
+                    "INSERT INTO records (upload_id, chat_id, kind, grp, name, name_key, value) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                written += len(rows)
+            if written and self.keep_days:
+                self._prune(moment.timestamp() - self.keep_days * 24 * 3600)
+        return written
+
+    def _prune(self, before):
+        old = [row[0] for row in self._db.execute("SELECT id FROM uploads WHERE uploaded < ?", (before,))]
+        if old:
+            self._db.executemany("DELETE FROM records WHERE upload_id = ?", [(i,) for i in old])
+            self._db.executemany("DELETE FROM uploads WHERE id = ?", [(i,) for i in old])
+
+    # ---------- Запросы ----------
+
+    def _latest_per_week(self, chat_id, kind, weeks):
+        """{id загрузки: неделя} — последняя загрузка каждой из последних weeks недель."""
+        rows = self._db.execute(
+            "SELECT MAX(id), week FROM uploads WHERE chat_id = ? AND kind = ? "
+            "GROUP BY week ORDER BY week DESC LIMIT ?",
+            (chat_id, kind, weeks),
+        ).fetchall()
+        return dict(rows)
+
+    def trend(self, chat_id, query: str, weeks: int, now: datetime.datetime):
+        """
+        Значения строк, где ФИО начинается с query, по неделям за последние weeks недель.
+        Возвращает {(тип отчёта, раздел, ФИО): [(неделя, значение), ...]} по возрастанию недели.
+        """
+        key = name_key(query)
+        since = week_of(now - datetime.timedelta(weeks=weeks - 1))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT r.kind, r.grp, r.name, u.week, r.value FROM records r JOIN uploads u ON u.id = r.upload_id "
+                "WHERE r.chat_id = ? AND r.name_key >= ? AND r.name_key < ? AND u.week >= ? ORDER BY u.id",
+                (chat_id, key, key + "\uffff", since),
+            ).fetchall()
+        series = {}
+        for kind, group, name, week, value in rows:
+            points = series.setdefault((kind, group, name), {})
+            points[week] = value  # позже загруженное за ту же неделю перекрывает раннее
+        return {line: sorted(points.items()) for line, points in series.items()}
+
+    def streak(self, chat_id, name: str, weeks: int, limits):
+        """
+        Кто ниже порога name (см. thresholds.LIMITS) в последней загрузке каждой
+        из последних weeks недель, за которые есть загрузки. Возвращает (недель в истории,
+        [(раздел, ФИО, [значения по неделям]), ...]).
+        """
+        kind, group, _, _ = LIMITS[name]
+        with self._lock:
+            return self._streak(chat_id, kind, group, weeks, limits)
+
+    def _streak(self, chat_id, kind, group, weeks, limits):
+        latest = self._latest_per_week(chat_id, kind, weeks)
+        if len(latest) < weeks:
+            return len(latest), []
+
+        bound, inclusive = limit_of(kind, group, limits)
+        ids = sorted(latest)
+        marks = ", ".join("?" * len(ids))
+        sql = (
+            f"SELECT grp, name_key, MIN(name), GROUP_CONCAT(value, ' ') FROM "
+            f"(SELECT upload_id, grp, name, name_key, value FROM records WHERE upload_id IN ({marks}) "
+            f"AND value {'<=' if inclusive else '<'} ?{' AND grp = ?' if group is not None else ''} "
+            f"ORDER BY upload_id) GROUP BY grp, name_key HAVING COUNT(DISTINCT upload_id) = ? ORDER BY grp, name_key"
+        )
+        params = [*ids, bound, *([group] if group is not None else []), weeks]
+        found = []
+        for grp, _, fio, values in self._db.execute(sql, params):
+            found.append((grp, fio, [float(v) for v in values.split()]))
+        return weeks, found
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,276 @@
+"""
+Очередь заданий на разбор в SQLite: бот кладёт файл, процессы worker.py забирают
+задания и записывают результат — Telegram-сессия одна, а разбор масштабируется
+на любое число процессов. Бот и воркеры должны работать на одной машине: база
+в режиме WAL на сетевой папке (NFS, SMB) не работает.
+
+Задание берётся в аренду на lease секунд, воркер продлевает её, пока разбирает.
+Если воркер упал, аренда истекает и задание достаётся другому воркеру; после
+max_attempts таких попыток задание считается неудачным (файл, который роняет
+разбор, не ходит по кругу бесконечно). Живые воркеры отмечаются в таблице workers:
+если ни один не отмечался worker_timeout секунд, бот не ждёт результат впустую.
+"""
+import asyncio
+import json
+import os
+import pickle
+import sqlite3
+import time
+import uuid
+
+from workers import QueueFull
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobFailed(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Задания и результаты — в таблице jobs, сами файлы — в spool_dir (в базе только
+    путь). Каждая операция открывает своё соединение: очередь используют и поток
+    бота, и процессы воркеров.
+    """
+
+    def __init__(self, path="jobs.sqlite3", spool_dir="job_files", lease=60, max_attempts=3, result_ttl=3600,
+                 worker_timeout=30):
+        self.path = path
+        self.spool_dir = spool_dir
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.worker_timeout = worker_timeout
+        os.makedirs(spool_dir, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, state TEXT NOT NULL, file TEXT NOT NULL, "
+                "report_id TEXT NOT NULL, params TEXT NOT NULL, worker TEXT, lease_until REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, result BLOB, error TEXT, "
+                "created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id)")
+            db.execute("CREATE TABLE IF NOT EXISTS workers (name TEXT PRIMARY KEY, seen REAL NOT NULL)")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA busy_timeout = 30000")
+        return _Connection(db)
+
+    # ---------- Сторона бота ----------
+
+    def enqueue(self, data: bytes, report_id="auto", params=None) -> int:
+        name = uuid.uuid4().hex + ".xlsx"
+        with open(os.path.join(self.spool_dir, name), "wb") as f:
+            f.write(data)
+
+        now = time.time()
+        with self._connect() as db:
+            cur = db.execute(
+                "INSERT INTO jobs (state, file, report_id, params, created, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (QUEUED, name, report_id, json.dumps(params or {}), now, now),
+            )
+            return cur.lastrowid
+
+    def position(self, job_id) -> int:
+        """Сколько заданий в очереди перед job_id (0 — уже разбирается или готово)."""
+        with self._connect() as db:
+            row = db.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row[0] != QUEUED:
+                return 0
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE state = ? AND id < ?", (QUEUED, job_id)).fetchone()[0] + 1
+
+    def take_result(self, job_id):
+        """
+        (готово, результат): результат забирается один раз — задание и файл удаляются.
+        Неудачное задание — JobFailed с текстом ошибки.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT state, file, result, error FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                raise JobFailed("задание пропало из очереди")
+            state, name, result, error = row
+            if state not in (DONE, FAILED):
+                return False, None
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        self._drop_file(name)
+        if state == FAILED:
+            raise JobFailed(error)
+        return True, pickle.loads(result)
+
+    def cancel(self, job_id):
+        """Снять задание, результат которого уже не нужен; воркер, который его разбирает, запишет в пустоту."""
+        with self._connect() as db:
+            row = db.execute("SELECT file FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        if row is not None:
+            self._drop_file(row[0])
+
+    def alive_workers(self) -> int:
+        """Сколько воркеров отмечалось за последние worker_timeout секунд."""
+        with self._connect() as db:
+            return db.execute(
+                "SELECT COUNT(*) FROM workers WHERE seen >= ?", (time.time() - self.worker_timeout,)
+            ).fetchone()[0]
+
+    def counts(self) -> dict:
+        with self._connect() as db:
+            rows = db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0}
+        counts.update(rows)
+        return counts
+
+    # ---------- Сторона воркера ----------
+
+    def heartbeat(self, worker: str):
+        """Отметка «воркер жив»; воркер ставит её не реже раза в worker_timeout / 3 секунд."""
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO workers (name, seen) VALUES (?, ?)", (worker, time.time()))
+
+    def leave(self, worker: str):
+        with self._connect() as db:
+            db.execute("DELETE FROM workers WHERE name = ?", (worker,))
+
+    def claim(self, worker: str):
+        """
+        Взять следующее задание (новое или с истёкшей арендой).
+        Возвращает (id, данные файла, report_id, params) или None.
+        """
+        now = time.time()
+        with self._connect() as db:
+            while True:
+                db.execute("BEGIN IMMEDIATE")
+                row = db.execute(
+                    "SELECT id, file, report_id, params, attempts FROM jobs "
+                    "WHERE state = ? OR (state = ? AND lease_until < ?) ORDER BY id LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                job_id, name, report_id, params, attempts = row
+                if attempts < self.max_attempts:
+                    break
+                # Прошлые воркеры падали на этом задании — больше не пробуем
+                db.execute(
+                    "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE id = ?",
+                    (FAILED, f"все попытки разбора прерваны (попыток: {attempts})", now, job_id),
+                )
+                db.execute("COMMIT")
+
+            db.execute(
+                "UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? "
+                "WHERE id = ?",
+                (RUNNING, worker, now + self.lease, now, job_id),
+            )
+            db.execute("COMMIT")
+
+        try:
+            with open(os.path.join(self.spool_dir, name), "rb") as f:
+                data = f.read()
+        except OSError as e:
+            self.fail(job_id, worker, f"не удалось прочитать файл задания: {e}")
+            return self.claim(worker)
+        return job_id, data, report_id, json.loads(params)
+
+    def extend(self, job_id, worker) -> bool:
+        """Продлить аренду; False — задание уже отдано другому воркеру."""
+        with self._connect() as db:
+            cur = db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND state = ?",
+                (time.time() + self.lease, job_id, worker, RUNNING),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, job_id, worker, result):
+        self._finish(job_id, worker, DONE, pickle.dumps(result), None)
+
+    def fail(self, job_id, worker, error: str):
+        self._finish(job_id, worker, FAILED, None, error)
+
+    def _finish(self, job_id, worker, state, result, error):
+        now = time.time()
+        with self._connect() as db:
+            # Результат записывает только тот, у кого аренда
+            db.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = ?, lease_until = NULL, updated = ? "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                (state, result, error, now, job_id, worker, RUNNING),
+            )
+            # Результаты, которые бот так и не забрал (например, упал сам)
+            for old_id, name in db.execute(
+                "SELECT id, file FROM jobs WHERE state IN (?, ?) AND updated < ?", (DONE, FAILED, now - self.result_ttl)
+            ).fetchall():
+                db.execute("DELETE FROM jobs WHERE id = ?", (old_id,))
+                self._drop_file(name)
+
+    def _drop_file(self, name):
+        try:
+            os.remove(os.path.join(self.spool_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+class _Connection:
+    """sqlite3-соединение, которое закрывается на выходе из with."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __enter__(self):
+        return self._db
+
+    def __exit__(self, *exc):
+        if self._db.in_transaction:
+            self._db.rollback()
+        self._db.close()
+
+
+class JobClient:
+    """
+    Замена ParsePool.submit для бота: задание уходит в очередь, результат
+    ожидается опросом базы (в потоке, чтобы не блокировать event loop).
+    Если за timeout секунд результата нет или живых воркеров не осталось,
+    задание снимается и поднимается JobFailed.
+    """
+
+    def __init__(self, queue: JobQueue, max_queue=20, poll_interval=0.2, timeout=600):
+        self.queue = queue
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    async def submit(self, data: bytes, report_id="auto", params=None, on_queued=None):
+        if (await asyncio.to_thread(self.queue.counts))[QUEUED] >= self.max_queue:
+            raise QueueFull()
+
+        job_id = await asyncio.to_thread(self.queue.enqueue, data, report_id, params)
+        notified = on_queued is None
+        deadline = time.monotonic() + self.timeout
+        check_workers = time.monotonic()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            ready, result = await asyncio.to_thread(self.queue.take_result, job_id)
+            if ready:
+                return result
+            now = time.monotonic()
+            if now >= deadline:
+                await asyncio.to_thread(self.queue.cancel, job_id)
+                raise JobFailed(f"файл не разобран за {self.timeout:.0f} с — воркеры перегружены или зависли")
+            if now >= check_workers:
+                check_workers = now + self.queue.worker_timeout / 3
+                if not await asyncio.to_thread(self.queue.alive_workers):
+                    await asyncio.to_thread(self.queue.cancel, job_id)
+                    raise JobFailed("не запущен ни один воркер разбора (python bot_app/worker.py)")
+            if not notified:
+                # Как у ParsePool: позицию сообщаем, если задание не взяли сразу
+                notified = True
+                position = await asyncio.to_thread(self.queue.position, job_id)
+                if position:
+                    await on_queued(position)
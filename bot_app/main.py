@@ -1,3 +1,8 @@
+import asyncio
+import os
+import sys
+import time
+
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ApplicationBuilder,
@@ -7,88 +12,735 @@ from telegram.ext import (
     ContextTypes,
     filters,
 )
-from config import BOT_TOKEN
-from excel_parser import (
-    process_excel_file,
-    is_students_reports_3_or_6,
-    process_students_bad_grades_from_bytes,
-    process_students_hw_completion_from_bytes,
+from config import (
+    BOT_TOKEN,
+    BOT_MODE,
+    UPDATE_CONCURRENCY,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_MAX_CONNECTIONS,
+    TELEGRAM_API_URL,
+    MAX_UPLOAD_BYTES,
+    PARSE_EXECUTOR,
+    PARSE_MAX_WORKERS,
+    PARSE_MAX_QUEUE,
+    PARSE_MAX_PER_USER,
+    PARSE_MAX_QUEUE_PER_USER,
+    PARSE_SUPERSEDE,
+    WORKER_PROCESSES,
+    PARSE_STREAMING,
+    PARSE_BACKEND,
+    JOB_QUEUE_PATH,
+    JOB_SPOOL_DIR,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RESULT_TTL,
+    JOB_POLL_INTERVAL,
+    JOB_RESULT_TIMEOUT,
+    JOB_WORKER_TIMEOUT,
+    REPORT_CACHE_MAX_ENTRIES,
+    REPORT_CACHE_MAX_BYTES,
+    REPORT_CACHE_TTL,
+    REPORT_CACHE_PATH,
+    UPLOAD_STORE_MAX_BYTES,
+    UPLOAD_STORE_MAX_SPILL_BYTES,
+    UPLOAD_STORE_TTL,
+    UPLOAD_STORE_SPILL_DIR,
+    REPORT_THRESHOLDS,
+    CHAT_SETTINGS_PATH,
+    DIFF_REPORTS,
+    SNAPSHOT_PATH,
+    HISTORY_PATH,
+    HISTORY_KEEP_DAYS,
+    TREND_WEEKS,
+    STREAK_WEEKS,
+    REPORT_FILE_THRESHOLD,
+    REPORT_FILE_FORMAT,
+    REPORT_FILE_WORKERS,
+    ADMIN_IDS,
+    STATS_WINDOW,
+    STATS_PROMETHEUS_PATH,
+    STATS_DUMP_INTERVAL,
+    PREWARM_PARSER,
+    PREVIEW_TOP_N,
+)
+# Разбор файлов (batch, excel_parser, report_files -> openpyxl, numpy) здесь не
+# импортируется: бот начинает принимать апдейты без них, а модули подгружаются
+# в фоне после запуска (PREWARM_PARSER) или при первом файле
+from chat_settings import ChatSettings
+from history import HistoryStore
+from job_queue import JobClient, JobFailed, JobQueue
+from report_cache import ReportCache, file_digest
+from reports import PROCESSING_ERROR, result_size
+from renderers import (
+    render_html,
+    render_summary,
+    render_diff_html,
+    render_preview_html,
+    render_trend_html,
+    render_streak_html,
+)
+from sheet_layout import REPORT_STUDENTS, REPORT_HW_COMPLETION
+from snapshots import SnapshotStore
+from stats import Stats, run_timed
+from thresholds import (
+    LIMITS,
+    apply_thresholds,
+    parse_limits,
+    format_limits,
+    has_thresholds,
+    list_threshold,
+    worst,
+)
+from upload_store import UploadStore
+from utils import download_bytes, send_long_message, send_queue
+from webhook import run_webhook
+from workers import FairScheduler, ParsePool, QueueFull, Superseded, UserQueueFull
+
+parse_pool = ParsePool(PARSE_EXECUTOR, max_workers=PARSE_MAX_WORKERS, max_queue=PARSE_MAX_QUEUE)
+# Файлы больших отчётов собираются отдельно: слоты parse_pool выдаёт только scheduler
+file_pool = ParsePool(PARSE_EXECUTOR, max_workers=REPORT_FILE_WORKERS, max_queue=PARSE_MAX_QUEUE)
+report_cache = ReportCache(
+    max_entries=REPORT_CACHE_MAX_ENTRIES,
+    max_bytes=REPORT_CACHE_MAX_BYTES,
+    ttl=REPORT_CACHE_TTL,
+    path=REPORT_CACHE_PATH,
 )
-from utils import send_long_message
+upload_store = UploadStore(
+    max_bytes=UPLOAD_STORE_MAX_BYTES,
+    ttl=UPLOAD_STORE_TTL,
+    spill_dir=UPLOAD_STORE_SPILL_DIR,
+    max_spill_bytes=UPLOAD_STORE_MAX_SPILL_BYTES,
+)
+stats = Stats(window=STATS_WINDOW)
+job_client = None
+if PARSE_BACKEND == "queue":
+    job_client = JobClient(
+        JobQueue(
+            JOB_QUEUE_PATH,
+            JOB_SPOOL_DIR,
+            lease=JOB_LEASE_SECONDS,
+            max_attempts=JOB_MAX_ATTEMPTS,
+            result_ttl=JOB_RESULT_TTL,
+            worker_timeout=JOB_WORKER_TIMEOUT,
+        ),
+        max_queue=PARSE_MAX_QUEUE,
+        poll_interval=JOB_POLL_INTERVAL,
+        timeout=JOB_RESULT_TIMEOUT,
+    )
+# Очередь перед разбором: по слоту на воркер, пользователи обслуживаются по кругу
+scheduler = FairScheduler(
+    (WORKER_PROCESSES or os.cpu_count() or 1) if job_client is not None else parse_pool.max_workers,
+    per_user=PARSE_MAX_PER_USER,
+    max_queue=PARSE_MAX_QUEUE,
+    max_user_queue=PARSE_MAX_QUEUE_PER_USER,
+)
+chat_settings = ChatSettings(REPORT_THRESHOLDS, path=CHAT_SETTINGS_PATH)
+snapshots = SnapshotStore(path=SNAPSHOT_PATH)
+history = HistoryStore(path=HISTORY_PATH, keep_days=HISTORY_KEEP_DAYS)
+
+QUEUE_FULL_TEXT = "🚦 Сейчас обрабатывается слишком много файлов. Попробуйте чуть позже."
+USER_QUEUE_FULL_TEXT = "🚦 У вас уже несколько файлов в очереди — дождитесь отчётов по ним."
+SUPERSEDED_TEXT = "⏭ Файл заменён более новой загрузкой с тем же именем — отчёт будет по ней."
+TOO_LARGE_TEXT = f"❌ Файл слишком большой. Максимум — {MAX_UPLOAD_BYTES // (1024 * 1024)} МБ."
+
+
+def _pool_gauges() -> dict:
+    if job_client is not None:
+        return {**job_client.queue.counts(), **scheduler.gauges(), "file_builds": file_pool.running}
+    return {
+        "workers": parse_pool.max_workers,
+        "running": parse_pool.running,
+        "waiting": parse_pool.waiting,
+        **scheduler.gauges(),
+        "file_builds": file_pool.running,
+    }
+
+
+async def _parse(data_bytes, on_queued=None):
+    """(результат process_batch, timings, прирост RSS) — в пуле бота или через очередь воркеров."""
+    if job_client is not None:
+        return await job_client.submit(data_bytes, params={"streaming": PARSE_STREAMING}, on_queued=on_queued)
+    from batch import process_batch
+
+    return await parse_pool.submit(
+        run_timed, process_batch, data_bytes, streaming=PARSE_STREAMING, on_queued=on_queued
+    )
+
+
+def _result_kind(choices, reports):
+    if choices is not None:
+        return "students_choice"
+    if len(reports) == 1:
+        return reports[0].kind or "error"
+    return "batch"
+
+
+async def reply_report(update: Update, report, limits):
+    # Отчёты 3–6 хранятся без порога — порог чата применяется здесь, при выводе
+    with stats.timer("render", report.kind):
+        report = apply_thresholds(report, limits)
+        text = render_html(report)
+
+    with stats.timer("send", report.kind):
+        await _send_report(update, report, text)
+
+
+async def _upload_diff(chat_id, report, limits):
+    """
+    Изменения отчёта с прошлой загрузки в чат (HTML) или None — тогда нужен полный отчёт.
+    Снимок чата обновляется, поэтому вызывается ровно один раз на новую загрузку.
+    """
+    if not (DIFF_REPORTS and report.ok and has_thresholds(report.kind)):
+        return None
+    with stats.timer("render", report.kind):
+        # Хэши строк и чтение/запись снимка в SQLite на больших отчётах — секунды, не в event loop
+        return await asyncio.to_thread(_diff_text, chat_id, report, limits)
+
+
+def _diff_text(chat_id, report, limits):
+    diff = snapshots.compare(chat_id, report, limits)
+    return None if diff is None else render_diff_html(diff)
+
+
+async def reply_diff(update: Update, report, text):
+    stats.count("diff_reports")
+    with stats.timer("send", report.kind):
+        await send_long_message(update, text)
+
+
+async def reply_upload_report(update: Update, report, chat_id, limits, upload_key=None):
+    """
+    Отчёт по новой загрузке. Если этот отчёт в чат уже присылали (тот же лист),
+    отправляются только изменения с прошлого раза; полный список — /full.
+    Иначе — reply_full_report.
+    """
+    text = await _upload_diff(chat_id, report, limits)
+    if text is not None:
+        await reply_diff(update, report, text)
+        return
+    await reply_full_report(update, report, limits, upload_key)
+
+
+async def reply_full_report(update: Update, report, limits, upload_key=None):
+    """
+    Большой отчёт сначала приходит превью — худшие строки и число строк
+    под порогом, полный список — по кнопке (upload_key — ключ загрузки, см. _remember_upload).
+    """
+    if upload_key is not None and await reply_preview(update, report, limits, upload_key):
+        return
+    await reply_report(update, report, limits)
+
+
+async def reply_preview(update: Update, report, limits, upload_key) -> bool:
+    """Превью вместо полного отчёта, если строк под порогом больше PREVIEW_TOP_N."""
+    if not PREVIEW_TOP_N or not report.ok or not has_thresholds(report.kind) or report.threshold is not None:
+        return False
+    with stats.timer("render", report.kind):
+        sections = worst(report, limits, PREVIEW_TOP_N)
+        total = sum(count for _, count, _ in sections)
+        if total <= PREVIEW_TOP_N:
+            return False
+        text = render_preview_html(report, sections, list_threshold(report.kind, limits))
+
+    stats.count("previews")
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"📋 Показать все ({total})", callback_data=f"all:{report.kind}:{upload_key}")]
+    ])
+    with stats.timer("send", report.kind):
+        await send_long_message(update, text, reply_markup=keyboard)
+    return True
+
+
+async def _send_report(update: Update, report, text):
+    # Большой табличный отчёт — одним файлом с итоговой строкой в подписи
+    if report.entries and len(text) > REPORT_FILE_THRESHOLD:
+        from report_files import build_report_file
+
+        try:
+            filename, payload = await file_pool.submit(build_report_file, report, REPORT_FILE_FORMAT)
+        except QueueFull:
+            pass
+        else:
+            caption = f"{render_summary(report)}\nПолный список — в файле."
+            await send_queue.send_document(update.message, payload, filename, caption=caption)
+            return
+
+    await send_long_message(update, text)
+
+
+# Кнопки под отчётом ссылаются на свою загрузку: начало sha256 файла, в callback_data
+UPLOAD_KEY_LEN = 16
+
+
+def _remember_upload(chat_id, user_id, digest, result, size) -> str:
+    """
+    Запомнить загрузку для кнопок под её отчётами; возвращает ключ для callback_data.
+    Кнопки живут, пока загрузка в upload_store (UPLOAD_STORE_TTL), независимо от кэша отчётов.
+    Для /threshold и /full запоминается и последняя загрузка пользователя в этом чате — ключом.
+    """
+    upload_key = digest[:UPLOAD_KEY_LEN]
+    upload_store.put(("upload", chat_id, upload_key), result, size)
+    upload_store.put(("latest", chat_id, user_id), upload_key, len(upload_key))
+    return upload_key
+
+
+def _find_upload(chat_id, upload_key):
+    """Разобранный результат загрузки по ключу из кнопки или None."""
+    return upload_store.get(("upload", chat_id, upload_key))
+
+
+def _latest_upload(chat_id, user_id):
+    """Последняя загрузка пользователя в этом чате или None — файл из лички в группе не найдётся."""
+    upload_key = upload_store.get(("latest", chat_id, user_id))
+    return None if upload_key is None else _find_upload(chat_id, upload_key)
+
+
+def _choice_keyboard(limits, upload_key):
+    hw, cr, completion = limits["homework"][0], limits["classroom"][0], limits["completion"][0]
+    hw_text = "ДЗ=1" if hw == REPORT_THRESHOLDS["homework"][0] else f"ДЗ≤{hw:g}"
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"📌 Отчёт по студентам ({hw_text}, КР<{cr:g})", callback_data=f"rep:3:{upload_key}")],
+        [InlineKeyboardButton(f"📌 % выполненных ДЗ (<{completion:g}%)", callback_data=f"rep:6:{upload_key}")],
+    ])
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("👋 Привет! Пришли мне .xlsx файл.")
+    await update.message.reply_text(
+        "👋 Привет! Пришли мне .xlsx файл или zip-архив с несколькими .xlsx.\n"
+        "Пороги отчётов в этом чате: /thresholds\n"
+        "История: /trend <ФИО> — динамика по неделям, /streak — ниже порога несколько недель подряд"
+    )
 
 
 async def on_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    started = time.perf_counter()
+    stats.count("uploads")
     doc = update.message.document
+    # Размер известен из апдейта — слишком большой файл не скачиваем вовсе
+    if doc.file_size and doc.file_size > MAX_UPLOAD_BYTES:
+        stats.count("too_large")
+        await update.message.reply_text(TOO_LARGE_TEXT)
+        return
+
     await update.message.reply_text("📥 Анализирую файл...")
 
+    async def notify_queued(position):
+        stats.observe_queue(position)
+        await update.message.reply_text(f"⏳ Файл в очереди, позиция {position}.")
+
     try:
-        tg_file = await doc.get_file()
-        data = await tg_file.download_as_bytearray()
-        data_bytes = bytes(data)
-
-        # Сохраняем последний файл пользователя для кнопок
-        context.user_data["last_xlsx_bytes"] = data_bytes
-
-        if is_students_reports_3_or_6(data_bytes):
-            keyboard = [
-                [InlineKeyboardButton("📌 Отчёт по студентам (ДЗ=1, КР<3)", callback_data="rep:3")],
-                [InlineKeyboardButton("📌 % выполненных ДЗ (<70%)", callback_data="rep:6")],
-            ]
+        with stats.timer("download"):
+            tg_file = await doc.get_file()
+            data_bytes = await download_bytes(tg_file)
+        if len(data_bytes) > MAX_UPLOAD_BYTES:
+            stats.count("too_large")
+            await update.message.reply_text(TOO_LARGE_TEXT)
+            return
+        with stats.timer("cache"):
+            digest = file_digest(data_bytes)
+            cache_key = ReportCache.make_key(digest, "auto")
+            result = report_cache.get(cache_key)
+
+        if result is None:
+            stats.count("cache_miss")
+            submitted = time.perf_counter()
+            user_id = update.effective_user.id
+            # Повторная загрузка того же файла (по имени) заменяет ещё не готовый разбор
+            key = (user_id, update.effective_chat.id, doc.file_name) if PARSE_SUPERSEDE and doc.file_name else None
+            # Файл читается один раз; для отчётов 3/6 сразу считаются оба варианта.
+            # Книга с несколькими листами или zip-архив разбираются пакетом.
+            # О позиции в очереди сообщает только scheduler: со слотом пул не ждёт
+            async with scheduler.slot(user_id, key, on_queued=notify_queued) as ticket:
+                result, timings, rss_growth = await _parse(data_bytes)
+            parse_seconds = timings["parse"]
+            kind = timings.get("kind")
+            stats.record("queue", time.perf_counter() - submitted - parse_seconds)
+            for stage in ("load", "report"):
+                if stage in timings:
+                    stats.record(stage, timings[stage], kind)
+            stats.record_parse(len(data_bytes), parse_seconds, rss_growth)
+
+            # Размер для бюджетов памяти — оценка по выборке строк: pickle большого результата
+            # в event loop занял бы сотни миллисекунд. Кэш и upload_store держат один и тот же объект
+            size = result_size(result)
+            if not any((r.error or "").startswith(PROCESSING_ERROR) for r in result[1]):
+                report_cache.put(cache_key, result, size)
+            if ticket.superseded:
+                # Разбор уже шёл, прервать его нельзя — результат только в кэше
+                stats.count("superseded")
+                await update.message.reply_text(SUPERSEDED_TEXT)
+                return
+        else:
+            stats.count("cache_hit")
+            size = result_size(result)
+
+        choices, reports = result
+        chat_id = update.effective_chat.id
+        limits = chat_settings.get(chat_id)
+        upload_key = _remember_upload(chat_id, update.effective_user.id, digest, result, size)
+        with stats.timer("history"):
+            # Хэш и запись всех строк в SQLite — в потоке, чтобы не задерживать других пользователей
+            scored = [r for r in list(reports) + list((choices or {}).values()) if has_thresholds(r.kind)]
+            await asyncio.to_thread(history.ingest, chat_id, scored, update.message.date.astimezone())
+        for report in reports:
+            await reply_upload_report(update, report, chat_id, limits, upload_key)
+
+        if choices is not None:
+            # Изменения отчётов 3/6 считаются сейчас, по новой загрузке, а показываются
+            # по первому нажатию кнопки; повторное нажатие присылает сам отчёт
+            for report in choices.values():
+                text = await _upload_diff(chat_id, report, limits)
+                if text is not None:
+                    upload_store.put(("diff", chat_id, upload_key, report.kind), text, len(text))
             await update.message.reply_text(
                 "Выберите отчет:",
-                reply_markup=InlineKeyboardMarkup(keyboard),
+                reply_markup=_choice_keyboard(limits, upload_key),
             )
-            return
 
-        report_text = process_excel_file(data_bytes)
-        await send_long_message(update, report_text)
+        stats.record("total", time.perf_counter() - started, _result_kind(choices, reports))
 
+    except Superseded:
+        stats.count("superseded")
+        await update.message.reply_text(SUPERSEDED_TEXT)
+    except UserQueueFull:
+        stats.count("user_queue_full")
+        await update.message.reply_text(USER_QUEUE_FULL_TEXT)
+    except QueueFull:
+        stats.count("queue_full")
+        await update.message.reply_text(QUEUE_FULL_TEXT)
+    except JobFailed as e:
+        stats.count("errors")
+        await update.message.reply_text(f"{PROCESSING_ERROR}: {e}")
     except Exception as e:
+        stats.count("errors")
         await update.message.reply_text(f"❌ Критическая ошибка бота: {e}")
 
 
 async def on_choose_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    started = time.perf_counter()
     query = update.callback_query
     await query.answer()
 
-    data_bytes = context.user_data.get("last_xlsx_bytes")
-    if not data_bytes:
+    choice, _, upload_key = query.data.partition(":")[2].partition(":")
+    if upload_key:
+        stored = _find_upload(query.message.chat_id, upload_key)
+    else:
+        # Кнопка из сообщения до появления ключей — последняя загрузка пользователя в этом чате
+        stored = _latest_upload(query.message.chat_id, update.effective_user.id)
+    if stored is None or stored[0] is None:
         await query.edit_message_text("❌ Файл не найден. Пришлите .xlsx заново.")
         return
+    choices = stored[0]
 
     try:
-        if query.data == "rep:3":
-            await query.edit_message_text("📥 Готовлю отчёт по студентам (ДЗ=1, КР<3)...")
-            report_text = process_students_bad_grades_from_bytes(data_bytes)
-        elif query.data == "rep:6":
+        if choice == "3":
+            await query.edit_message_text("📥 Готовлю отчёт по студентам...")
+            report = choices[REPORT_STUDENTS]
+        elif choice == "6":
             await query.edit_message_text("📥 Готовлю отчёт по % выполненных ДЗ...")
-            report_text = process_students_hw_completion_from_bytes(data_bytes)
+            report = choices[REPORT_HW_COMPLETION]
         else:
             await query.edit_message_text("❌ Неизвестный выбор.")
             return
 
-        await send_long_message(Update(update.update_id, message=query.message), report_text)
+        chat_id = query.message.chat_id
+        limits = chat_settings.get(chat_id)
+        message_update = Update(update.update_id, message=query.message)
+        diff_key = ("diff", chat_id, upload_key, report.kind)
+        text = upload_store.get(diff_key) if upload_key else None
+        if text is not None:
+            upload_store.discard(diff_key)
+            await reply_diff(message_update, report, text)
+        else:
+            await reply_full_report(message_update, report, limits, upload_key or None)
+        stats.record("total", time.perf_counter() - started, report.kind)
 
     except Exception as e:
+        stats.count("errors")
         await query.edit_message_text(f"❌ Ошибка при формировании отчёта: {e}")
 
 
+async def on_show_all(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Полный отчёт после превью — из уже разобранного результата, файл не читается
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_reply_markup(reply_markup=None)
+
+    # В кнопках из сообщений до появления ключей загрузки ключа нет — такой файл не найти
+    _, kind, upload_key = (query.data + ":").split(":")[:3]
+    stored = _find_upload(query.message.chat_id, upload_key) if upload_key else None
+    found = None
+    if stored is not None:
+        choices, reports = stored
+        found = next((r for r in list(reports) + list((choices or {}).values()) if r.kind == kind), None)
+    if found is None:
+        await query.message.reply_text("❌ Файл не найден. Пришлите .xlsx заново.")
+        return
+
+    limits = chat_settings.get(query.message.chat_id)
+    await reply_report(Update(update.update_id, message=query.message), found, limits)
+
+
+# ---------- Пороги отчётов (/thresholds, /threshold) ----------
+
+THRESHOLD_HELP = (
+    "Изменить: /threshold <имя> <число> [ещё числа — границы распределения]\n"
+    "Например: /threshold attendance 40 60 80\n"
+    "Сбросить: /threshold <имя> reset или /threshold reset"
+)
+
+
+async def show_thresholds(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    limits = chat_settings.get(chat_id)
+    lines = ["⚙️ Пороги отчётов в этом чате:"]
+    for name, (_, _, _, description) in LIMITS.items():
+        mark = "" if chat_settings.is_default(chat_id, name) else " (изменён)"
+        lines.append(f"• {name} — {description}: {format_limits(name, limits[name])}{mark}")
+    lines += ["", THRESHOLD_HELP]
+    await update.message.reply_text("\n".join(lines))
+
+
+async def set_threshold(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = context.args or []
+    if not args:
+        await show_thresholds(update, context)
+        return
+
+    chat_id = update.effective_chat.id
+    if args == ["reset"]:
+        chat_settings.reset(chat_id)
+        names = list(LIMITS)
+        await update.message.reply_text("✅ Все пороги сброшены к значениям по умолчанию.")
+    else:
+        name = args[0].lower()
+        if name not in LIMITS:
+            await update.message.reply_text(f"❌ Нет порога «{args[0]}». Доступны: {', '.join(LIMITS)}.")
+            return
+        names = [name]
+        if args[1:] == ["reset"]:
+            chat_settings.reset(chat_id, name)
+        else:
+            try:
+                chat_settings.set(chat_id, name, parse_limits(args[1:]))
+            except ValueError as e:
+                await update.message.reply_text(f"❌ {e}.\n{THRESHOLD_HELP}")
+                return
+        limits = chat_settings.get(chat_id)
+        await update.message.reply_text(f"✅ {name}: {format_limits(name, limits[name])}")
+
+    # Последний файл пользователя в этом чате уже разобран без порога — только оформляем заново
+    stored = _latest_upload(chat_id, update.effective_user.id)
+    if stored is None:
+        return
+    choices, reports = stored
+    kinds = {LIMITS[name][0] for name in names}
+    limits = chat_settings.get(chat_id)
+    for report in list(reports) + list((choices or {}).values()):
+        if report.kind in kinds:
+            stats.count("rerender")
+            await reply_report(update, report, limits)
+
+
+async def show_full(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Полные списки по последнему файлу пользователя в этом чате — вместо отчёта об изменениях
+    stored = _latest_upload(update.effective_chat.id, update.effective_user.id)
+    if stored is None:
+        await update.message.reply_text("❌ Файл не найден. Пришлите .xlsx заново.")
+        return
+    choices, reports = stored
+    limits = chat_settings.get(update.effective_chat.id)
+    for report in list(reports) + list((choices or {}).values()):
+        await reply_report(update, report, limits)
+
+
+# ---------- История (/trend, /streak) ----------
+
+MAX_WEEKS = 52
+
+
+def _weeks_arg(args, default):
+    """Число недель последним аргументом команды: (недель, остальные аргументы)."""
+    if args and args[-1].isdigit():
+        return max(1, min(int(args[-1]), MAX_WEEKS)), args[:-1]
+    return default, args
+
+
+async def show_trend(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    weeks, args = _weeks_arg(context.args or [], TREND_WEEKS)
+    query = " ".join(args)
+    if not query:
+        await update.message.reply_text(
+            "Использование: /trend <ФИО или начало ФИО> [недель]\n"
+            f"Например: /trend Иванов {TREND_WEEKS}"
+        )
+        return
+    with stats.timer("history"):
+        series = await asyncio.to_thread(
+            history.trend, update.effective_chat.id, query, weeks, update.message.date.astimezone()
+        )
+    await send_long_message(update, render_trend_html(series, query, weeks))
+
+
+async def show_streak(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    weeks, args = _weeks_arg(context.args or [], STREAK_WEEKS)
+    name = args[0].lower() if args else "classroom"
+    if name not in LIMITS or len(args) > 1:
+        await update.message.reply_text(
+            "Использование: /streak [имя порога] [недель]\n"
+            f"Например: /streak classroom {STREAK_WEEKS} — КР ниже порога {STREAK_WEEKS} недели подряд.\n"
+            f"Пороги: {', '.join(LIMITS)}."
+        )
+        return
+    chat_id = update.effective_chat.id
+    limits = chat_settings.get(chat_id)
+    with stats.timer("history"):
+        have, found = await asyncio.to_thread(history.streak, chat_id, name, weeks, limits)
+    if have < weeks:
+        await update.message.reply_text(f"📭 В истории чата загрузок этого отчёта за {have} нед. из {weeks}.")
+        return
+    await send_long_message(update, render_streak_html(name, limits[name][0], weeks, found))
+
+
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text("⛔ Команда доступна только администраторам.")
+        return
+    await send_long_message(update, stats.render_html(_pool_gauges()))
+
+
+# ---------- Выгрузка статистики в файл (Prometheus) ----------
+
+_dump_task = None
+
+
+def _dump_stats():
+    try:
+        stats.write_prometheus(STATS_PROMETHEUS_PATH, _pool_gauges())
+    except OSError as e:
+        print(f"Не удалось записать статистику: {e}")
+
+
+async def _dump_stats_loop():
+    while True:
+        await asyncio.sleep(STATS_DUMP_INTERVAL)
+        _dump_stats()
+
+
+# ---------- Прогрев модулей разбора ----------
+
+_prewarm_task = None
+
+
+def _prewarm():
+    started = time.perf_counter()
+    import report_files  # noqa: F401 — openpyxl, нужен и для выгрузки больших отчётов
+
+    if job_client is None:
+        # Разбирают процессы worker.py — боту excel_parser и numpy не нужны
+        import batch  # noqa: F401
+        import columnar
+
+        columnar.enabled()
+    stats.record("prewarm", time.perf_counter() - started)
+
+
+async def _prewarm_in_background():
+    try:
+        await asyncio.to_thread(_prewarm)
+    except Exception as e:
+        # Не прогрелось — модули импортируются при первом файле
+        print(f"Не удалось прогреть модули разбора: {e}")
+
+
+# ---------- Запуск и остановка ----------
+
+async def post_init(application):
+    global _dump_task, _prewarm_task
+    if STATS_PROMETHEUS_PATH:
+        _dump_task = asyncio.create_task(_dump_stats_loop())
+    if PREWARM_PARSER:
+        _prewarm_task = asyncio.create_task(_prewarm_in_background())
+
+
+async def post_stop(application):
+    if _dump_task is not None:
+        _dump_task.cancel()
+        _dump_stats()
+
+
+def build_application(request=None):
+    """
+    Application со всеми обработчиками; адрес Bot API — TELEGRAM_API_URL из config.py.
+    request — свой транспорт запросов к Bot API (заглушка bench/fake_telegram.py для прогонов без сети).
+    """
+    # concurrent_updates: пока один файл разбирается в пуле, остальные апдейты обрабатываются
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(UPDATE_CONCURRENCY)
+        .post_init(post_init)
+        .post_stop(post_stop)
+    )
+    if TELEGRAM_API_URL:
+        base = TELEGRAM_API_URL.rstrip("/")
+        builder = builder.base_url(f"{base}/bot").base_file_url(f"{base}/file/bot")
+    if request is not None:
+        builder = builder.request(request)
+    app = builder.build()
+    app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("stats", show_stats))
+    app.add_handler(CommandHandler("thresholds", show_thresholds))
+    app.add_handler(CommandHandler("threshold", set_threshold))
+    app.add_handler(CommandHandler("full", show_full))
+    app.add_handler(CommandHandler("trend", show_trend))
+    app.add_handler(CommandHandler("streak", show_streak))
+    app.add_handler(MessageHandler(filters.Document.ALL, on_document))
+    app.add_handler(CallbackQueryHandler(on_choose_report, pattern=r"^rep:(3|6)(:\w+)?$"))
+    app.add_handler(CallbackQueryHandler(on_show_all, pattern=r"^all:\w+(:\w+)?$"))
+    return app
+
+
 def main():
     if not BOT_TOKEN or "PASTE" in BOT_TOKEN:
         print("Ошибка: Укажи токен в config.py!")
         return
 
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(MessageHandler(filters.Document.ALL, on_document))
-    app.add_handler(CallbackQueryHandler(on_choose_report, pattern=r"^rep:(3|6)$"))
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        print("Ошибка: для BOT_MODE = \"webhook\" укажи WEBHOOK_URL в config.py!")
+        return
 
+    app = build_application()
     print("Бот запущен...")
-    app.run_polling()
+    try:
+        if BOT_MODE == "webhook":
+            asyncio.run(run_webhook(
+                app,
+                WEBHOOK_URL,
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                path=WEBHOOK_PATH,
+                secret=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+            ))
+        else:
+            app.run_polling()
+    finally:
+        # Пул дожидается уже запущенного разбора (wait=True)
+        parse_pool.shutdown()
+        file_pool.shutdown()
+        # Пул процессов пакетной обработки есть, только если приходили пакеты
+        if "batch" in sys.modules:
+            sys.modules["batch"].shutdown_executor()
+        report_cache.close()
+        chat_settings.close()
+        snapshots.close()
+        history.close()
+        upload_store.clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,376 @@
+import csv
+import html
+import io
+import json
+import re
+
+from reports import GROUP_HOMEWORK, GROUP_CLASSROOM
+from sheet_layout import (
+    REPORT_SCHEDULE,
+    REPORT_TOPICS,
+    REPORT_STUDENTS,
+    REPORT_TEACHERS_ATTENDANCE,
+    REPORT_CHECKED_HOMEWORK,
+    REPORT_HW_COMPLETION,
+)
+from thresholds import DEFAULT_LIMITS, LIMITS, score
+
+STUDENTS_DEFAULT = (DEFAULT_LIMITS["homework"][0], DEFAULT_LIMITS["classroom"][0])
+# Разделы метода 3 названы по порогам по умолчанию — в распределении пишем просто ДЗ/КР
+DISTRIBUTION_TITLES = {GROUP_HOMEWORK: "ДЗ", GROUP_CLASSROOM: "КР"}
+
+
+def _e(value) -> str:
+    return html.escape(str(value), quote=False)
+
+
+def _n(value) -> str:
+    # Порог без лишних нулей: 40, 70, 1.05
+    return f"{value:g}"
+
+
+def _html_distribution(report, unit=""):
+    """Строки распределения по интервалам между границами (если их несколько)."""
+    lines = []
+    for group, limits, counts, inclusive in report.distribution:
+        # Граница входит в нижний интервал при «не больше», в верхний — при «меньше»
+        low, high = ("≤", ">") if inclusive else ("<", "≥")
+        parts = [f"{low} {_n(limits[0])}{unit}: {counts[0]}"]
+        for a, b, count in zip(limits, limits[1:], counts[1:]):
+            parts.append(f"{_n(a)}–{_n(b)}{unit}: {count}")
+        parts.append(f"{high} {_n(limits[-1])}{unit}: {counts[-1]}")
+        title = f" ({DISTRIBUTION_TITLES.get(group, group)})" if group else ""
+        lines.append(_e(f"📊 Распределение{title}: " + " · ".join(parts)))
+    return lines
+
+
+# ---------- Telegram HTML ----------
+
+def _html_schedule(report):
+    if not report.entries:
+        return "Не нашел строк 'Предмет:'."
+
+    lines = ["📊 <b>Количество пар по предметам:</b>\n"]
+    for e in report.entries:
+        lines.append(f"▫️ {_e(e.name)}: <b>{e.value}</b>")
+    return "\n".join(lines)
+
+
+def _html_topics(report):
+    if not report.entries:
+        return "✅ Все темы верные!"
+
+    lines = [f"⚠️ <b>Темы с ошибками ({len(report.entries)} шт):</b>\n"]
+    current = None
+    for e in report.entries:
+        if e.group != current:
+            if current is not None:
+                lines.append("")
+            current = e.group
+            lines.append(f"📕 <b>{_e(current)}</b>")
+        # extra — нарушенное правило шаблона (у пустой ячейки его нет)
+        rule = f" — <i>{_e(e.extra[0])}</i>" if e.extra else ""
+        lines.append(f"  • {_e(e.name)}{rule}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _html_students(report):
+    hw_limit, cr_limit = report.threshold or STUDENTS_DEFAULT
+    # Тексты для порогов по умолчанию — прежние («ДЗ = 1»)
+    hw_text = "ДЗ = 1" if hw_limit == STUDENTS_DEFAULT[0] else f"ДЗ ≤ {_n(hw_limit)}"
+    hw_grade = "оценка 1" if hw_limit == STUDENTS_DEFAULT[0] else f"оценка ≤ {_n(hw_limit)}"
+    cr_limit = _n(cr_limit)
+    dist = _html_distribution(report)
+
+    if not report.entries:
+        if hw_limit == STUDENTS_DEFAULT[0]:
+            text = f"🎉 <b>Идеально!</b> Нет студентов с ДЗ=1 или КР&lt;{cr_limit}."
+        else:
+            text = f"🎉 <b>Идеально!</b> Нет студентов с {_e(hw_text)} или КР&lt;{cr_limit}."
+        return "\n".join([text, *dist])
+
+    hw = [e for e in report.entries if e.group == GROUP_HOMEWORK]
+    cr = [e for e in report.entries if e.group == GROUP_CLASSROOM]
+    lines = []
+
+    if hw:
+        lines.append(f"📉 <b>{_e(hw_text)} ({len(hw)} чел):</b>")
+        for e in hw:
+            lines.append(f"  • {_e(e.name)} (ДЗ: {_e(e.value)})")
+    else:
+        lines.append(f"✅ <b>По ДЗ ({_e(hw_grade)}):</b> никого не найдено.")
+
+    lines.append("")
+
+    if cr:
+        lines.append(f"🆘 <b>КР меньше {cr_limit} ({len(cr)} чел):</b>")
+        for e in cr:
+            lines.append(f"  • {_e(e.name)} (КР: {_e(e.value)})")
+    else:
+        lines.append(f"✅ <b>По КР (оценка меньше {cr_limit}):</b> никого не найдено.")
+
+    if dist:
+        lines += ["", *dist]
+    return "\n".join(lines)
+
+
+def _html_attendance(report):
+    threshold = _n(report.threshold)
+    dist = _html_distribution(report, "%")
+    if not report.entries:
+        return "\n".join([f"✅ <b>Посещаемость {threshold}% и ниже</b>: преподавателей не найдено.", *dist])
+
+    lines = [f"⚠️ <b>Посещаемость {threshold}% и ниже:</b>\n"]
+    for e in report.entries:
+        lines.append(f"• <b>{_e(e.name)}</b>: {e.value:.0f}%")
+    if dist:
+        lines += ["", *dist]
+    return "\n".join(lines)
+
+
+def _html_checked_homework(report):
+    threshold = _n(report.threshold)
+    dist = _html_distribution(report, "%")
+    if not report.entries:
+        return "\n".join(
+            [f"✅ <b>Метод 5:</b> преподавателей с процентом проверенных ДЗ ниже {threshold}% не найдено.", *dist]
+        )
+
+    lines = [f"⚠️ <b>Проверенные ДЗ ниже {threshold}%:</b>\n"]
+    for period in report.groups:
+        entries = [e for e in report.entries if e.group == period]
+        if entries:
+            lines.append(f"📌 <b>{_e(period)}:</b>")
+            for e in entries:
+                checked, received = e.extra
+                lines.append(f"• <b>{_e(e.name)}</b>: {e.value:.0f}% (проверено {checked} из {received})")
+        else:
+            lines.append(f"✅ <b>{_e(period)}:</b> все &gt;= порога.")
+        lines.append("")
+    lines += dist
+    return "\n".join(lines).rstrip()
+
+
+def _html_hw_completion(report):
+    threshold = _n(report.threshold)
+    dist = _html_distribution(report, "%")
+    if not report.entries:
+        return "\n".join([f"✅ <b>Метод 6:</b> студентов с % выполненных ДЗ ниже {threshold}% не найдено.", *dist])
+
+    lines = [f"⚠️ <b>% выполненных ДЗ ниже {threshold}%:</b>\n"]
+    for e in report.entries:
+        lines.append(f"• <b>{_e(e.name)}</b>: {e.value:.0f}%")
+    if dist:
+        lines += ["", *dist]
+    return "\n".join(lines)
+
+
+HTML_RENDERERS = {
+    REPORT_SCHEDULE: _html_schedule,
+    REPORT_TOPICS: _html_topics,
+    REPORT_STUDENTS: _html_students,
+    REPORT_TEACHERS_ATTENDANCE: _html_attendance,
+    REPORT_CHECKED_HOMEWORK: _html_checked_homework,
+    REPORT_HW_COMPLETION: _html_hw_completion,
+}
+
+
+def render_html(report) -> str:
+    if report.error is not None:
+        return report.error
+    return HTML_RENDERERS[report.kind](report)
+
+
+def render_text(report) -> str:
+    return html.unescape(re.sub(r"<[^>]+>", "", render_html(report)))
+
+
+def render_summary(report) -> str:
+    # Первая строка отчёта — итог («Темы с ошибками (N шт)» и т.п.)
+    return render_html(report).split("\n", 1)[0]
+
+
+# ---------- Изменения с прошлой загрузки ----------
+
+DIFF_TITLES = {
+    REPORT_STUDENTS: "Оценки студентов",
+    REPORT_TEACHERS_ATTENDANCE: "Посещаемость преподавателей",
+    REPORT_CHECKED_HOMEWORK: "Проверенные ДЗ",
+    REPORT_HW_COMPLETION: "% выполненных ДЗ",
+}
+
+
+def _diff_value(kind, value):
+    return f"{value:g}" if kind == REPORT_STUDENTS else f"{value:.0f}%"
+
+
+def _diff_threshold(kind, threshold):
+    if kind == REPORT_STUDENTS:
+        hw, cr = threshold
+        return f"ДЗ ≤ {_n(hw)}, КР &lt; {_n(cr)}"
+    sign = "≤" if kind == REPORT_TEACHERS_ATTENDANCE else "&lt;"
+    return f"{sign} {_n(threshold)}%"
+
+
+def _diff_name(group, name):
+    section = DISTRIBUTION_TITLES.get(group, group)
+    return f"{_e(name)} ({_e(section)})" if section else _e(name)
+
+
+def render_diff_html(diff) -> str:
+    title = f"🔄 <b>{DIFF_TITLES[diff.kind]}: изменения с прошлой загрузки</b> ({_diff_threshold(diff.kind, diff.threshold)})"
+    if diff.empty:
+        return f"{title}\n\n✅ Изменений нет."
+
+    lines = [title]
+    sections = (
+        ("🆕", "Впервые ниже порога", diff.below),
+        ("✅", "Выправились", diff.recovered),
+        ("✏️", "Изменилось значение", diff.changed),
+    )
+    for icon, label, rows in sections:
+        if not rows:
+            continue
+        lines.append(f"\n{icon} <b>{label} ({len(rows)}):</b>")
+        for group, name, old, new in rows:
+            if old is None:
+                value = f"{_diff_value(diff.kind, new)} (новая строка)"
+            else:
+                value = f"{_diff_value(diff.kind, old)} → {_diff_value(diff.kind, new)}"
+            lines.append(f"• {_diff_name(group, name)}: {value}")
+    if diff.gone:
+        lines.append(f"\n➖ Нет в новом файле (были ниже порога): {diff.gone}")
+    lines.append("\nПолный список: /full")
+    return "\n".join(lines)
+
+
+# ---------- Превью: худшие строки большого отчёта ----------
+
+def render_preview_html(report, sections, threshold) -> str:
+    """sections — [(раздел, строк под порогом, худшие строки), ...] из thresholds.worst."""
+    total = sum(count for _, count, _ in sections)
+    shown = sum(len(rows) for _, _, rows in sections)
+    lines = [
+        f"🔎 <b>{DIFF_TITLES[report.kind]}</b> ({_diff_threshold(report.kind, threshold)}): "
+        f"ниже порога — <b>{total}</b>, худшие {shown}:"
+    ]
+    for group, count, rows in sections:
+        if group:
+            section = DISTRIBUTION_TITLES.get(group, group)
+            lines.append(f"\n<b>{_e(section)}</b> ({count}):")
+        else:
+            lines.append("")
+        for e in rows:
+            lines.append(f"• {_e(e.name)}: {_diff_value(report.kind, score(report, e))}")
+        if count > len(rows):
+            lines.append(f"  … и ещё {count - len(rows)}")
+    return "\n".join(lines)
+
+
+# ---------- История (/trend, /streak) ----------
+
+def _week(week):
+    # "2026-10-12" -> "12.10"
+    return f"{week[8:10]}.{week[5:7]}"
+
+
+def render_trend_html(series, query, weeks) -> str:
+    """series — {(тип отчёта, раздел, ФИО): [(неделя, значение), ...]} из HistoryStore.trend."""
+    if not series:
+        return f"🔍 Нет данных по «{_e(query)}» за {weeks} нед."
+
+    lines = [f"📈 <b>Динамика за {weeks} нед.</b>"]
+    for (kind, group, name), points in sorted(series.items()):
+        values = " · ".join(f"{_week(week)}: {_diff_value(kind, value)}" for week, value in points)
+        lines.append(f"\n<b>{DIFF_TITLES[kind]}</b> — {_diff_name(group, name)}\n{values}")
+    return "\n".join(lines)
+
+
+def render_streak_html(name, bound, weeks, found) -> str:
+    """found — [(раздел, ФИО, [значения по неделям]), ...] из HistoryStore.streak для порога name."""
+    kind, group, inclusive, _ = LIMITS[name]
+    sign = "≤" if inclusive else "&lt;"
+    unit = "" if kind == REPORT_STUDENTS else "%"
+    limit = f"{DISTRIBUTION_TITLES.get(group, '')} {sign} {_n(bound)}{unit}".lstrip()
+    title = f"📉 <b>{DIFF_TITLES[kind]}: ниже порога {weeks} нед. подряд</b> ({limit})"
+    if not found:
+        return f"{title}\n\n✅ Таких нет."
+
+    lines = [title, ""]
+    for section, fio, values in found:
+        lines.append(f"• {_diff_name(section, fio)}: {' → '.join(_diff_value(kind, v) for v in values)}")
+    lines.append(f"\nВсего: {len(found)}")
+    return "\n".join(lines)
+
+
+# ---------- Таблица (CSV, файлы) ----------
+
+TABLE_COLUMNS = {
+    REPORT_SCHEDULE: ("Предмет", "Количество пар"),
+    REPORT_TOPICS: ("Предмет", "Тема урока", "Ошибка"),
+    REPORT_STUDENTS: ("Список", "ФИО", "Оценка"),
+    REPORT_TEACHERS_ATTENDANCE: ("ФИО преподавателя", "Средняя посещаемость, %"),
+    REPORT_CHECKED_HOMEWORK: ("Период", "ФИО преподавателя", "% проверенных ДЗ", "Проверено", "Получено"),
+    REPORT_HW_COMPLETION: ("ФИО", "% выполненных ДЗ"),
+}
+
+
+def _table_row(kind, e):
+    if kind == REPORT_SCHEDULE:
+        return (e.name, e.value)
+    if kind == REPORT_TOPICS:
+        return (e.group, e.name, e.extra[0] if e.extra else "")
+    if kind == REPORT_STUDENTS:
+        return (e.group, e.name, e.value)
+    if kind == REPORT_CHECKED_HOMEWORK:
+        return (e.group, e.name, round(e.value, 1), *e.extra)
+    return (e.name, round(e.value, 1))
+
+
+def report_table(report):
+    """Возвращает (колонки, генератор строк) — строки не копируются в отдельный список."""
+    if report.error is not None:
+        return (), iter(())
+    return TABLE_COLUMNS[report.kind], (_table_row(report.kind, e) for e in report.entries)
+
+
+def render_csv(report) -> str:
+    columns, rows = report_table(report)
+    out = io.StringIO()
+    writer = csv.writer(out, delimiter=";")
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+# ---------- JSON ----------
+
+def render_json(report) -> str:
+    data = {
+        "kind": report.kind,
+        "threshold": report.threshold,
+        "error": report.error,
+        "groups": list(report.groups),
+        "distribution": [
+            {"group": group, "limits": list(limits), "counts": list(counts), "inclusive": inclusive}
+            for group, limits, counts, inclusive in report.distribution
+        ],
+        "entries": [
+            {"name": e.name, "value": e.value, "group": e.group, "extra": list(e.extra)}
+            for e in report.entries
+        ],
+    }
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+RENDERERS = {
+    "html": render_html,
+    "text": render_text,
+    "csv": render_csv,
+    "json": render_json,
+}
+
+
+def render(report, fmt="html") -> str:
+    return RENDERERS[fmt](report)
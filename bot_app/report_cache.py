@@ -0,0 +1,108 @@
+import hashlib
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+# Меняется, когда меняется формат сохраняемых результатов, — старые записи SQLite не читаются
+CACHE_FORMAT = 6
+
+
+def file_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ReportCache:
+    """
+    Кэш готовых отчётов по содержимому файла: ключ — sha256 байтов + тип отчёта + порог.
+    В памяти — LRU с ограничением по размеру и TTL; при указании path записи
+    дополнительно хранятся в SQLite и переживают перезапуск бота. Размер записи
+    для бюджета — size из put, иначе длина pickle значения.
+    """
+
+    def __init__(self, max_entries=500, max_bytes=64 * 1024 * 1024, ttl=24 * 3600, path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key -> (created, size, value)
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS reports ("
+                "key TEXT PRIMARY KEY, created REAL NOT NULL, value BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(digest, report_id, threshold=None) -> str:
+        return f"v{CACHE_FORMAT}:{digest}:{report_id}:{threshold}"
+
+    def get(self, key):
+        now = time.time()
+
+        item = self._items.get(key)
+        if item is not None:
+            created, size, value = item
+            if now - created <= self.ttl:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return value
+            self._drop(key)
+
+        if self._db is not None:
+            row = self._db.execute("SELECT created, value FROM reports WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                created, blob = row
+                if now - created <= self.ttl:
+                    value = pickle.loads(blob)
+                    self._remember(key, created, value, len(blob))
+                    self.hits += 1
+                    return value
+                self._db.execute("DELETE FROM reports WHERE key = ?", (key,))
+                self._db.commit()
+
+        self.misses += 1
+        return None
+
+    def put(self, key, value, size=None):
+        created = time.time()
+        self._remember(key, created, value, size)
+
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO reports (key, created, value) VALUES (?, ?, ?)",
+                (key, created, pickle.dumps(value)),
+            )
+            self._db.execute("DELETE FROM reports WHERE created < ?", (created - self.ttl,))
+            self._db.commit()
+
+    def _remember(self, key, created, value, size=None):
+        if key in self._items:
+            self._drop(key)
+
+        if size is None:
+            size = len(value.encode("utf-8")) if isinstance(value, str) else len(pickle.dumps(value))
+        if size > self.max_bytes:
+            return
+
+        self._items[key] = (created, size, value)
+        self.size_bytes += size
+
+        while len(self._items) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._items))
+            self._drop(oldest)
+
+    def _drop(self, key):
+        _, size, _ = self._items.pop(key)
+        self.size_bytes -= size
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,66 @@
+import html
+import io
+
+import openpyxl
+
+from sheet_layout import (
+    REPORT_SCHEDULE,
+    REPORT_TOPICS,
+    REPORT_STUDENTS,
+    REPORT_TEACHERS_ATTENDANCE,
+    REPORT_CHECKED_HOMEWORK,
+    REPORT_HW_COMPLETION,
+)
+from renderers import render_csv, render_summary, report_table
+
+FILE_NAMES = {
+    REPORT_SCHEDULE: "pairs_by_subject",
+    REPORT_TOPICS: "bad_topics",
+    REPORT_STUDENTS: "students_bad_grades",
+    REPORT_TEACHERS_ATTENDANCE: "teachers_attendance",
+    REPORT_CHECKED_HOMEWORK: "checked_homework",
+    REPORT_HW_COMPLETION: "homework_completion",
+}
+
+
+def _xlsx(columns, rows) -> bytes:
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Отчёт")
+    ws.append(list(columns))
+    for row in rows:
+        ws.append(list(row))
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def _html(columns, rows, title) -> bytes:
+    out = io.StringIO()
+    out.write(f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title></head><body>")
+    out.write(f"<h3>{html.escape(title)}</h3><table border='1' cellspacing='0' cellpadding='4'><tr>")
+    for col in columns:
+        out.write(f"<th>{html.escape(str(col))}</th>")
+    out.write("</tr>")
+    for row in rows:
+        out.write("<tr>")
+        for value in row:
+            out.write(f"<td>{html.escape('' if value is None else str(value))}</td>")
+        out.write("</tr>")
+    out.write("</table></body></html>")
+    return out.getvalue().encode("utf-8")
+
+
+def build_report_file(report, fmt="xlsx"):
+    """Собирает отчёт в файл в памяти. Возвращает (имя файла, байты)."""
+    name = FILE_NAMES.get(report.kind, "report")
+    if fmt == "csv":
+        # BOM — чтобы Excel сам распознал UTF-8
+        return f"{name}.csv", render_csv(report).encode("utf-8-sig")
+
+    columns, rows = report_table(report)
+    if fmt == "html":
+        title = html.unescape(render_summary(report).replace("<b>", "").replace("</b>", ""))
+        return f"{name}.html", _html(columns, rows, title)
+    if fmt == "xlsx":
+        return f"{name}.xlsx", _xlsx(columns, rows)
+    raise ValueError(f"Неизвестный формат файла: {fmt}")
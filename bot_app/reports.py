@@ -0,0 +1,77 @@
+import pickle
+from dataclasses import dataclass, field, replace
+
+PROCESSING_ERROR = "❌ Ошибка обработки"
+
+# Сколько строк отчёта сериализуется при оценке размера результата (result_size)
+SIZE_SAMPLE = 64
+
+
+@dataclass(slots=True)
+class ReportEntry:
+    """Одна строка отчёта: ФИО (предмет, тема), значение и раздел отчёта."""
+
+    name: str
+    value: object = None
+    group: str = ""      # период (метод 5), список ДЗ/КР (метод 3), предмет (метод 2)
+    extra: tuple = ()    # доп. значения: (проверено, получено) в методе 5
+
+
+@dataclass(slots=True)
+class Report:
+    """
+    Результат анализа без оформления. Текст для Telegram, файл, JSON
+    и т.п. строятся из него отдельно — см. renderers.py.
+    """
+
+    kind: str | None
+    entries: list = field(default_factory=list)
+    threshold: float | tuple | None = None   # None у отчётов 3–6 — все строки, без порога
+    groups: tuple = ()   # порядок разделов, в т.ч. пустых
+    error: str | None = None
+    distribution: tuple = ()   # (раздел, границы, число строк в интервалах, «не больше») — см. thresholds.py
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass(slots=True)
+class ReportDiff:
+    """
+    Изменения отчёта 3–6 с прошлой загрузки в чат (см. snapshots.py).
+    Строки — (раздел, ФИО, было, стало); у новых строк было = None.
+    """
+
+    kind: str
+    threshold: float | tuple | None = None
+    below: list = field(default_factory=list)       # впервые под порогом
+    recovered: list = field(default_factory=list)   # были под порогом, теперь нет
+    changed: list = field(default_factory=list)     # под порогом оба раза, значение другое
+    gone: int = 0                                   # были под порогом, в новом файле их нет
+
+    @property
+    def empty(self) -> bool:
+        return not (self.below or self.recovered or self.changed or self.gone)
+
+
+# Разделы метода 3
+GROUP_HOMEWORK = "ДЗ = 1"
+GROUP_CLASSROOM = "КР < 3"
+
+
+def result_size(result, sample=SIZE_SAMPLE) -> int:
+    """
+    Примерный размер результата разбора (choices, reports) в pickle — для бюджетов памяти
+    кэша отчётов и upload_store. Из строк каждого отчёта сериализуется выборка в sample штук,
+    а её размер пересчитывается на все строки: большой отчёт целиком не сериализуется.
+    """
+    choices, reports = result
+    size = 0
+    for report in list(reports) + list((choices or {}).values()):
+        entries = report.entries
+        size += len(pickle.dumps(replace(report, entries=[])))
+        if entries:
+            picked = entries[::max(1, len(entries) // sample)][:sample]
+            size += len(pickle.dumps(picked)) * len(entries) // len(picked)
+    return size
@@ -0,0 +1,218 @@
+import re
+from itertools import islice
+
+# Типы отчётов, которые определяет маршрутизатор
+REPORT_SCHEDULE = "schedule"
+REPORT_TOPICS = "topics"
+REPORT_STUDENTS = "students"
+REPORT_TEACHERS_ATTENDANCE = "teachers_attendance"
+REPORT_CHECKED_HOMEWORK = "checked_homework"
+REPORT_HW_COMPLETION = "hw_completion"
+
+HEAD_ROWS = 15  # сколько строк шапки просматриваем
+
+# Подстроки, которые ищем в ячейках шапки: тег -> текст (без учёта регистра)
+SUBSTRING_SIGNATURES = {
+    "fio_teacher": "фио преподавателя",
+    "avg_attendance": "средняя посещаемость",
+    "month": "мес",
+    "week": "нед",
+    "day": "день",
+    "fio_ru": "фио",
+    "fio_en": "fio",
+    "teacher": "преподав",
+    "homework_any": "homework",
+    "pct_homework_any": "percentage homework",
+    "topic_any": "тема урока",
+}
+
+# Подстроки с учётом регистра (так их ищет метод 2)
+CASE_SENSITIVE_SIGNATURES = {
+    "topic": "Тема урока",
+    "subject": "Предмет",
+}
+
+# Ячейка целиком (после strip/lower) -> тег
+EXACT_SIGNATURES = {
+    "fio": "fio",
+    "фио": "fio",
+    "homework": "homework",
+    "дз": "homework_ru",
+    "домашняяработа": "homework_ru",
+    "classroom": "classroom",
+    "кр": "classroom_ru",
+    "класснаяработа": "classroom_ru",
+    "percentage homework": "pct_homework",
+}
+
+
+def _compile_signatures():
+    # Одна регулярка на ячейку: необязательные lookahead-группы для подстрок
+    # (каждая проверяется независимо) + точное совпадение всей ячейки
+    parts = []
+    for tag, text in SUBSTRING_SIGNATURES.items():
+        parts.append(f"(?:(?=.*?(?P<{tag}>{re.escape(text)})))?")
+    for tag, text in CASE_SENSITIVE_SIGNATURES.items():
+        parts.append(f"(?:(?=.*?(?P<{tag}>(?-i:{re.escape(text)}))))?")
+    exact = "|".join(re.escape(text) for text in EXACT_SIGNATURES)
+    parts.append(rf"(?:\s*(?P<exact>{exact})\s*\Z)?")
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+SIGNATURE_REGEX = _compile_signatures()
+
+
+def cell_tags(value) -> set:
+    m = SIGNATURE_REGEX.match(str(value))
+    tags = {tag for tag, found in m.groupdict().items() if found is not None and tag != "exact"}
+    if m.group("exact") is not None:
+        tags.add(EXACT_SIGNATURES[m.group("exact").lower()])
+    return tags
+
+
+class SheetLayout:
+    """
+    Результат одного прохода по шапке листа: тип отчёта для маршрутизатора,
+    нужен ли выбор отчёта 3/6 и номера колонок для каждого метода
+    (None — метод не нашёл свои заголовки).
+    """
+
+    __slots__ = ("kind", "is_students_choice", "topics", "students", "attendance", "checked_homework", "hw_completion")
+
+    def __init__(self):
+        self.kind = REPORT_SCHEDULE
+        self.is_students_choice = False
+        self.topics = None
+        self.students = None
+        self.attendance = None
+        self.checked_homework = None
+        self.hw_completion = None
+
+
+def _route(row_tags) -> str | None:
+    def has(tag):
+        return any(tag in tags for tags in row_tags)
+
+    if has("fio_teacher") and has("avg_attendance"):
+        return REPORT_TEACHERS_ATTENDANCE
+    if has("month") and has("week") and has("day"):
+        return REPORT_CHECKED_HOMEWORK
+    if has("fio") and has("pct_homework_any"):
+        return REPORT_HW_COMPLETION
+    if (has("fio_en") or has("fio_ru")) and has("homework_any"):
+        return REPORT_STUDENTS
+    if has("topic_any"):
+        return REPORT_TOPICS
+    return None
+
+
+def _last_col(row_tags, *tags):
+    idx = -1
+    for c_idx, cell in enumerate(row_tags):
+        if any(t in cell for t in tags):
+            idx = c_idx
+    return idx
+
+
+def _period_names(header_vals, start):
+    pretty = []
+    for b in range(3):
+        idx = start + b * 5
+        nm = header_vals[idx] if idx < len(header_vals) else ""
+        if "месяц" in nm or "мес" in nm:
+            pretty.append("За месяц")
+        elif "нед" in nm:
+            pretty.append("За неделю")
+        elif "день" in nm:
+            pretty.append("За день")
+        else:
+            pretty.append(nm if nm else f"Период {len(pretty)+1}")
+    return pretty
+
+
+def classify_header(rows) -> SheetLayout:
+    layout = SheetLayout()
+    routed = False
+
+    # Состояние поиска колонок по методам (значения накапливаются от строки к строке)
+    subject_col = -1
+    students = {"fio": -1, "homework": -1, "classroom": -1}
+    attendance = {"fio": -1, "avg": -1}
+    completion = {"fio": -1, "pct": -1}
+
+    for r_idx, row in enumerate(islice(rows, HEAD_ROWS), start=1):
+        row_tags = [cell_tags(c) if c else () for c in row]
+
+        if not routed:
+            kind = _route(row_tags)
+            if kind is not None:
+                layout.kind = kind
+                routed = True
+
+        if r_idx <= 10 and not layout.is_students_choice:
+            has_fio = any("fio" in tags for tags in row_tags)
+            has_any = any(("homework" in tags or "classroom" in tags or "pct_homework" in tags) for tags in row_tags)
+            layout.is_students_choice = has_fio and has_any
+
+        if r_idx <= 10 and layout.topics is None:
+            col = _last_col(row_tags, "subject")
+            if col != -1:
+                subject_col = col
+            col = _last_col(row_tags, "topic")
+            if col != -1:
+                layout.topics = {
+                    "header_row": r_idx,
+                    "topic": col,
+                    "subject": subject_col if subject_col != -1 else 2,
+                }
+
+        if r_idx <= 5 and students is not None and layout.students is None:
+            for key, tags in (("fio", ("fio",)),
+                              ("homework", ("homework", "homework_ru")),
+                              ("classroom", ("classroom", "classroom_ru"))):
+                col = _last_col(row_tags, *tags)
+                if col != -1:
+                    students[key] = col
+            if students["fio"] != -1 and students["homework"] != -1:
+                if students["classroom"] != -1:
+                    layout.students = {"header_row": r_idx, **students}
+                students = None
+
+        if r_idx <= 10 and layout.attendance is None:
+            for key, tag in (("fio", "fio_teacher"), ("avg", "avg_attendance")):
+                col = _last_col(row_tags, tag)
+                if col != -1:
+                    attendance[key] = col
+            if attendance["fio"] != -1 and attendance["avg"] != -1:
+                layout.attendance = {"header_row": r_idx, **attendance}
+
+        if r_idx <= 10 and layout.checked_homework is None:
+            if (any("month" in t for t in row_tags) and any("week" in t for t in row_tags)
+                    and any("day" in t for t in row_tags)):
+                fio_idx = next(
+                    (i for i, t in enumerate(row_tags) if "fio_ru" in t or "teacher" in t), 0
+                )
+                header_vals = [str(c).strip().lower() if c is not None else "" for c in row]
+                layout.checked_homework = {
+                    "header_row": r_idx,
+                    "fio": fio_idx,
+                    "periods": _period_names(header_vals, fio_idx + 1),
+                }
+
+        if r_idx <= 10 and layout.hw_completion is None:
+            for key, tag in (("fio", "fio"), ("pct", "pct_homework")):
+                col = _last_col(row_tags, tag)
+                if col != -1:
+                    completion[key] = col
+            if completion["fio"] != -1 and completion["pct"] != -1:
+                layout.hw_completion = {"header_row": r_idx, **completion}
+
+    if layout.topics is None:
+        # Метод 2 работает и без шапки: колонки по умолчанию
+        layout.topics = {
+            "header_row": 1,
+            "topic": 5,
+            "subject": subject_col if subject_col != -1 else 2,
+        }
+
+    return layout
@@ -0,0 +1,212 @@
+"""
+Снимки последнего результата отчётов 3–6 по чатам и отчёт об изменениях.
+
+Снимок — значения всех строк отчёта без порога по ключу (раздел, ФИО) и хэш
+каждой строки. При повторной загрузке того же отчёта в чат бот присылает только
+разницу: кто впервые оказался под порогом, кто выправился и у кого поменялось
+значение. Порог применяется к обоим снимкам при сравнении, так что смена порога
+в чате снимки не портит.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from reports import ReportDiff
+from thresholds import limit_of, list_threshold, passes, score
+
+_SEP = "\x1f"
+
+# Меньшая доля общих строк — значит, прислали другой лист (другую группу, филиал),
+# сравнивать не с чем
+MIN_OVERLAP = 0.5
+
+
+def snapshot_values(report) -> dict:
+    """Ключ «раздел␟ФИО␟номер повтора» -> число, как его сравнивает порог."""
+    seen = Counter()
+    values = {}
+    for e in report.entries:
+        seen[e.group, e.name] += 1
+        values[_SEP.join((e.group, e.name, str(seen[e.group, e.name])))] = score(report, e)
+    return values
+
+
+def values_digest(values: dict) -> str:
+    return hashlib.sha256(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def row_hashes(values: dict) -> dict:
+    """Ключ строки -> 64-битный хэш ключа и значения: по нему видно, какие строки изменились."""
+    return {
+        key: int.from_bytes(hashlib.blake2b(f"{key}{_SEP}{value!r}".encode("utf-8"), digest_size=8).digest(),
+                            "big", signed=True)
+        for key, value in values.items()
+    }
+
+
+def rows_digest(hashes: dict) -> str:
+    # Сумма хэшей строк не зависит от порядка строк в файле
+    return f"{len(hashes)}:{sum(hashes.values()) & 0xFFFFFFFFFFFFFFFF:016x}"
+
+
+def same_sheet(previous: dict, current: dict) -> bool:
+    if not previous or not current:
+        return False
+    common = len(previous.keys() & current.keys())
+    return common >= MIN_OVERLAP * min(len(previous), len(current))
+
+
+def diff_values(kind, previous: dict, current: dict, limits) -> ReportDiff:
+    """Разница двух снимков под порогами limits; проходит по строкам один раз."""
+    diff = ReportDiff(kind, threshold=list_threshold(kind, limits))
+    by_group = {}
+
+    def limit(group):
+        found = by_group.get(group)
+        if found is None:
+            found = by_group[group] = limit_of(kind, group, limits)
+        return found
+
+    for key, new in current.items():
+        group, name, _ = key.split(_SEP)
+        bound = limit(group)
+        old = previous.get(key)
+        now_below = passes(new, *bound)
+        was_below = old is not None and passes(old, *bound)
+        if now_below and not was_below:
+            diff.below.append((group, name, old, new))
+        elif was_below and not now_below:
+            diff.recovered.append((group, name, old, new))
+        elif now_below and old != new:
+            diff.changed.append((group, name, old, new))
+
+    for key, old in previous.items():
+        if key not in current:
+            group = key.split(_SEP, 1)[0]
+            if passes(old, *limit(group)):
+                diff.gone += 1
+    return diff
+
+
+class SnapshotStore:
+    """
+    Последний снимок каждого типа отчёта в каждом чате. При указании path снимки
+    хранятся только в SQLite (в памяти их не держим — чатов может быть много)
+    и переживают перезапуск бота; без path — в словаре в памяти.
+
+    В базе снимок лежит по строке на запись вместе с хэшем строки: при сравнении
+    читаются хэши, а значения — только изменившихся и пропавших строк; записываются
+    тоже только они. compare вызывается из потока (asyncio.to_thread) — соединение общее,
+    операции идут под блокировкой.
+    """
+
+    def __init__(self, path=None):
+        self._items = {}  # (chat_id, kind) -> (digest, values), если базы нет
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            # Прежний формат — снимок одним JSON; после обновления первая загрузка придёт полным отчётом
+            self._db.execute("DROP TABLE IF EXISTS snapshots")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_heads ("
+                "chat_id INTEGER NOT NULL, kind TEXT NOT NULL, digest TEXT NOT NULL, "
+                "updated REAL NOT NULL, PRIMARY KEY (chat_id, kind))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_rows ("
+                "chat_id INTEGER NOT NULL, kind TEXT NOT NULL, key TEXT NOT NULL, hash INTEGER NOT NULL, "
+                "value, PRIMARY KEY (chat_id, kind, key)) WITHOUT ROWID"
+            )
+            self._db.commit()
+
+    def compare(self, chat_id, report, limits):
+        """
+        Запомнить report как последний снимок и вернуть разницу с прошлым
+        (ReportDiff) или None, если сравнивать не с чем — первая загрузка
+        или прислан другой лист.
+        """
+        values = snapshot_values(report)
+        hashes = row_hashes(values)
+        digest = rows_digest(hashes)
+        with self._lock:
+            if self._db is None:
+                return self._compare_memory(chat_id, report.kind, values, digest, limits)
+            return self._compare_db(chat_id, report.kind, values, hashes, digest, limits)
+
+    def _compare_memory(self, chat_id, kind, values, digest, limits):
+        item = self._items.get((chat_id, kind))
+        if item is not None and item[0] == digest:
+            return ReportDiff(kind, threshold=list_threshold(kind, limits))
+        self._items[chat_id, kind] = (digest, values)
+        if item is None or not same_sheet(item[1], values):
+            return None
+        return diff_values(kind, item[1], values, limits)
+
+    def _compare_db(self, chat_id, kind, values, hashes, digest, limits):
+        db = self._db
+        head = db.execute("SELECT digest FROM snapshot_heads WHERE chat_id = ? AND kind = ?", (chat_id, kind)).fetchone()
+        if head is not None and head[0] == digest:
+            # Тот же результат — строки прошлого снимка можно даже не читать
+            return ReportDiff(kind, threshold=list_threshold(kind, limits))
+
+        # Хэши прошлого снимка — по ним видно, какие строки новые или изменились
+        previous_hashes = dict(db.execute(
+            "SELECT key, hash FROM snapshot_rows WHERE chat_id = ? AND kind = ?", (chat_id, kind)
+        ))
+        touched = {key: value for key, value in values.items() if previous_hashes.get(key) != hashes[key]}
+        gone = previous_hashes.keys() - values.keys()
+        # Как same_sheet, но без прошлых значений: общие строки — все прошлые, кроме пропавших
+        common = len(previous_hashes) - len(gone)
+        compared = bool(previous_hashes and values) and common >= MIN_OVERLAP * min(len(previous_hashes), len(values))
+        previous = None
+        if compared:
+            # Значения читаются только у изменившихся и пропавших строк
+            previous = self._values(chat_id, kind, [key for key in touched if key in previous_hashes] + list(gone))
+
+        try:
+            if gone and len(gone) == len(previous_hashes):
+                # Совсем другой лист — прошлый снимок удаляется одним запросом
+                db.execute("DELETE FROM snapshot_rows WHERE chat_id = ? AND kind = ?", (chat_id, kind))
+            else:
+                db.executemany(
+                    "DELETE FROM snapshot_rows WHERE chat_id = ? AND kind = ? AND key = ?",
+                    ((chat_id, kind, key) for key in gone),
+                )
+            db.executemany(
+                "INSERT OR REPLACE INTO snapshot_rows (chat_id, kind, key, hash, value) VALUES (?, ?, ?, ?, ?)",
+                ((chat_id, kind, key, hashes[key], value) for key, value in touched.items()),
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO snapshot_heads (chat_id, kind, digest, updated) VALUES (?, ?, ?, ?)",
+                (chat_id, kind, digest, time.time()),
+            )
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+
+        if not compared:
+            return None
+        # Неизменившиеся строки в разницу не попадают — сравниваются только затронутые
+        return diff_values(kind, previous, touched, limits)
+
+    def _values(self, chat_id, kind, keys, chunk=500) -> dict:
+        found = {}
+        for i in range(0, len(keys), chunk):
+            part = keys[i:i + chunk]
+            found.update(self._db.execute(
+                f"SELECT key, value FROM snapshot_rows WHERE chat_id = ? AND kind = ? "
+                f"AND key IN ({', '.join('?' * len(part))})",
+                (chat_id, kind, *part),
+            ))
+        return found
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows: модуля нет, память в /stats не показывается
+    resource = None
+
+# Порог размера файла (байты) -> подпись корзины в /stats
+SIZE_BUCKETS = (
+    (100 * 1024, "< 100 КБ"),
+    (1024 * 1024, "< 1 МБ"),
+    (10 * 1024 * 1024, "< 10 МБ"),
+    (float("inf"), "≥ 10 МБ"),
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Порядок этапов в /stats и в выгрузке
+STAGES = ("prewarm", "download", "cache", "queue", "load", "report", "history", "render", "send", "total")
+
+
+def rss_bytes() -> int | None:
+    """Текущий RSS процесса; если /proc недоступен — пиковый (ru_maxrss); None — узнать нечем."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_timed(func, *args, **kwargs):
+    """
+    Выполняется в пуле разбора: func получает словарь timings и заполняет его сам,
+    parse — полное время вызова. Возвращает (результат, timings, прирост RSS за вызов
+    или None) — годится и для пула процессов.
+    """
+    timings = {}
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    result = func(*args, timings=timings, **kwargs)
+    timings["parse"] = time.perf_counter() - start
+    rss_after = rss_bytes()
+    growth = None if rss_before is None or rss_after is None else rss_after - rss_before
+    return result, timings, growth
+
+
+def _quantile(sorted_values, q):
+    # Ближайший ранг — для окна в сотни значений точности хватает
+    index = min(len(sorted_values) - 1, max(0, int(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Stats:
+    """
+    Счётчики и скользящие окна последних N замеров по этапам обработки файла.
+    Ключ окна — (этап, тип отчёта); тип None — все отчёты вместе.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.started = time.time()
+        self.counters = defaultdict(int)
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._sizes = deque(maxlen=window)        # (размер файла, время разбора)
+        self._rss_growth = deque(maxlen=window)   # прирост RSS за разбор
+        self.max_queue = 0
+
+    def record(self, stage, seconds, kind=None):
+        self._samples[(stage, None)].append(seconds)
+        if kind is not None:
+            self._samples[(stage, kind)].append(seconds)
+
+    @contextmanager
+    def timer(self, stage, kind=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, kind)
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def record_parse(self, size, seconds, rss_growth):
+        self._sizes.append((size, seconds))
+        if rss_growth is not None:
+            self._rss_growth.append(rss_growth)
+
+    def observe_queue(self, waiting):
+        self.max_queue = max(self.max_queue, waiting)
+
+    def quantiles(self, stage, kind=None):
+        values = self._samples.get((stage, kind))
+        if not values:
+            return None
+        ordered = sorted(values)
+        return [_quantile(ordered, q) for q in QUANTILES], len(ordered)
+
+    def kinds(self):
+        return sorted({kind for _, kind in self._samples if kind is not None})
+
+    def size_buckets(self):
+        """Разбор по размеру файла: корзина -> (число файлов, медиана секунд, секунд на МБ)."""
+        buckets = defaultdict(list)
+        for size, seconds in self._sizes:
+            for limit, label in SIZE_BUCKETS:
+                if size < limit:
+                    buckets[label].append((size, seconds))
+                    break
+
+        result = []
+        for _, label in SIZE_BUCKETS:
+            items = buckets.get(label)
+            if not items:
+                continue
+            times = sorted(seconds for _, seconds in items)
+            total_mb = sum(size for size, _ in items) / 1024 / 1024
+            per_mb = sum(times) / total_mb if total_mb else 0.0
+            result.append((label, len(items), _quantile(times, 0.5), per_mb))
+        return result
+
+    # ---------- Вывод ----------
+
+    def render_html(self, gauges) -> str:
+        uptime = int(time.time() - self.started)
+        lines = [f"📈 <b>Статистика</b> (аптайм {uptime // 3600} ч {uptime % 3600 // 60} мин)\n"]
+
+        lines.append("<b>Очередь разбора:</b> " + ", ".join(f"{k} {v}" for k, v in gauges.items())
+                     + f", макс. ожидание {self.max_queue}")
+        if self.counters:
+            lines.append("<b>Счётчики:</b> " + ", ".join(f"{k} {v}" for k, v in sorted(self.counters.items())))
+
+        lines.append("\n<b>Этапы, мс (p50 / p95 / p99, n):</b>")
+        for stage in STAGES:
+            q = self.quantiles(stage)
+            if q is not None:
+                lines.append(f"• {stage}: {_ms(q[0])}, n={q[1]}")
+
+        kinds = self.kinds()
+        if kinds:
+            lines.append("\n<b>Полное время по типам отчётов, мс:</b>")
+            for kind in kinds:
+                q = self.quantiles("total", kind)
+                if q is not None:
+                    lines.append(f"• {kind}: {_ms(q[0])}, n={q[1]}")
+
+        buckets = self.size_buckets()
+        if buckets:
+            lines.append("\n<b>Размер файла → разбор:</b>")
+            for label, n, median, per_mb in buckets:
+                lines.append(f"• {label}: {n} шт, медиана {median * 1000:.0f} мс, {per_mb:.2f} с/МБ")
+
+        rss = rss_bytes()
+        if self._rss_growth and rss is not None:
+            growth = sorted(self._rss_growth)
+            lines.append(
+                f"\n<b>Память:</b> RSS {rss / 1024 / 1024:.0f} МБ, "
+                f"прирост за разбор p50 {_quantile(growth, 0.5) / 1024 / 1024:.1f} МБ, "
+                f"p95 {_quantile(growth, 0.95) / 1024 / 1024:.1f} МБ"
+            )
+        return "\n".join(lines)
+
+    def render_prometheus(self, gauges) -> str:
+        lines = [
+            "# TYPE bot_stage_seconds summary",
+        ]
+        for (stage, kind), values in sorted(self._samples.items(), key=lambda item: (item[0][0], item[0][1] or "")):
+            ordered = sorted(values)
+            labels = f'stage="{stage}"' + (f',kind="{kind}"' if kind is not None else "")
+            for q in QUANTILES:
+                lines.append(f'bot_stage_seconds{{{labels},quantile="{q}"}} {_quantile(ordered, q):.6f}')
+            lines.append(f"bot_stage_seconds_sum{{{labels}}} {sum(ordered):.6f}")
+            lines.append(f"bot_stage_seconds_count{{{labels}}} {len(ordered)}")
+
+        lines.append("# TYPE bot_events_total counter")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f'bot_events_total{{event="{name}"}} {value}')
+
+        lines.append("# TYPE bot_parse_queue gauge")
+        for name, value in gauges.items():
+            lines.append(f'bot_parse_queue{{state="{name}"}} {value}')
+        lines.append(f'bot_parse_queue{{state="max_waiting"}} {self.max_queue}')
+
+        lines.append("# TYPE bot_parse_seconds_per_mb gauge")
+        for label, _, _, per_mb in self.size_buckets():
+            lines.append(f'bot_parse_seconds_per_mb{{size="{label}"}} {per_mb:.6f}')
+
+        rss = rss_bytes()
+        if rss is not None:
+            lines.append("# TYPE bot_rss_bytes gauge")
+            lines.append(f"bot_rss_bytes {rss}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, gauges):
+        # Через временный файл, чтобы сборщик не прочитал половину
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus(gauges))
+        os.replace(tmp, path)
+
+
+def _ms(values) -> str:
+    return " / ".join(f"{v * 1000:.0f}" for v in values)
@@ -0,0 +1,89 @@
+"""
+Разбор текста для методов 1–2 пачками: ячейки пачки склеиваются через перевод
+строки, и один скомпилированный многострочный regex проходит по всему тексту
+(finditer) — вместо splitlines/strip/startswith и match на каждую ячейку.
+
+Результат совпадает с построчной проверкой: границы строк те же, что
+у str.splitlines, а тема, в которой сама есть перевод строки (редкость),
+проверяется отдельно прежним THEME_REGEX.
+"""
+import re
+import sys
+from collections import Counter
+
+# Ячеек (строк листа) в одной пачке: текст склейки — не больше нескольких сотен КБ
+BATCH_CELLS = 4096
+
+# Всё, что str.splitlines считает концом строки
+_EOL = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+# Остальные концы строк в склейке заменяются на \n — так regex ищет от \n, это быстрее
+_OTHER_EOL = re.compile(f"[{_EOL[1:]}]")
+
+SUBJECT_MARK = "Предмет:"
+# «Предмет: ...» в начале строки ячейки (до него — только пробелы)
+SUBJECT_REGEX = re.compile(rf"\n[^\S\n]*{SUBJECT_MARK}([^\n]*)")
+
+THEME_REGEX = re.compile(r"^Урок\s*№\s*\d+\.\s*Тема:\s*.+$", re.IGNORECASE)
+# То же правило для склейки тем: у каждой темы ровно одно совпадение от её \n,
+# группа — первый символ названия темы, пустая — тема шаблону не подходит
+_THEME_LINES = re.compile(r"\n(?:Урок[^\S\n]*№[^\S\n]*\d+\.[^\S\n]*Тема:[^\S\n]*([^\n])|)", re.IGNORECASE)
+
+EMPTY_TOPIC = "(пустая ячейка)"
+
+# Какое правило нарушила тема: первое из префиксов шаблона, которому она не соответствует
+TOPIC_RULES = (
+    (re.compile(r"Урок", re.IGNORECASE), "нет «Урок»"),
+    (re.compile(r"Урок\s*№", re.IGNORECASE), "нет «№»"),
+    (re.compile(r"Урок\s*№\s*\d+", re.IGNORECASE), "нет номера урока"),
+    (re.compile(r"Урок\s*№\s*\d+\.", re.IGNORECASE), "нет точки после номера"),
+    (re.compile(r"Урок\s*№\s*\d+\.\s*Тема:", re.IGNORECASE), "нет «Тема:»"),
+    (re.compile(r"Урок\s*№\s*\d+\.\s*Тема:\s*\S", re.IGNORECASE), "нет названия темы"),
+)
+RULE_MULTILINE = "тема в несколько строк"
+
+
+def subject_name(value) -> str:
+    # Названия предметов повторяются тысячи раз — храним одну копию строки
+    return sys.intern(str(value).strip())
+
+
+def count_subjects(cells, counter=None) -> Counter:
+    """Сколько раз встречается каждый «Предмет: ...» в ячейках cells (строки)."""
+    if counter is None:
+        counter = Counter()
+    text = "\n" + "\n".join(cells)
+    if _OTHER_EOL.search(text):
+        text = _OTHER_EOL.sub("\n", text)
+    # findall + Counter считают совпадения без объектов Match; пробелы по краям
+    # срезаются уже у разных значений (их единицы), порядок первых появлений сохраняется
+    for raw, n in Counter(SUBJECT_REGEX.findall(text)).items():
+        subj = raw.strip()
+        if subj:
+            counter[sys.intern(subj)] += n
+    return counter
+
+
+def topic_rule(topic: str) -> str:
+    """Почему тема (без пробелов по краям) не прошла проверку."""
+    for regex, rule in TOPIC_RULES:
+        if not regex.match(topic):
+            return rule
+    return RULE_MULTILINE
+
+
+def invalid_topics(topics) -> list:
+    """
+    Номера тем (строки без пробелов по краям), не подходящих под шаблон
+    «Урок № N. Тема: ...», — одним findall по склейке всех тем.
+    """
+    text = "\n" + "\n".join(topics)
+    multiline = text.count("\n") != len(topics)
+    if multiline:
+        # Тема с переводом строки идёт в склейку пустой строкой и проверяется отдельно
+        text = "\n" + "\n".join("" if "\n" in t else t for t in topics)
+
+    bad = [i for i, mark in enumerate(_THEME_LINES.findall(text)) if not mark]
+    if multiline:
+        bad = [i for i in bad if not ("\n" in topics[i] and THEME_REGEX.match(topics[i]))]
+    return bad
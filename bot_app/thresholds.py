@@ -0,0 +1,190 @@
+"""
+Пороги отчётов 3–6 и их применение к уже посчитанному отчёту.
+
+Анализ файла (excel_parser, threshold=None) оставляет все строки, у которых есть
+значение, — порог выбирается только при выводе. Поэтому смена порога в чате
+не требует повторного чтения файла: apply_thresholds отбирает строки из готового
+отчёта и считает распределение по нескольким границам за один проход.
+"""
+import heapq
+import math
+import operator
+from bisect import bisect_left, bisect_right
+from dataclasses import replace
+
+from columnar import to_float
+from config import REPORT_THRESHOLDS
+from reports import GROUP_HOMEWORK, GROUP_CLASSROOM
+from sheet_layout import (
+    REPORT_STUDENTS,
+    REPORT_TEACHERS_ATTENDANCE,
+    REPORT_CHECKED_HOMEWORK,
+    REPORT_HW_COMPLETION,
+)
+
+# Имя порога -> (тип отчёта, раздел отчёта или None, «не больше» (True) / «меньше» (False), описание)
+LIMITS = {
+    "attendance": (REPORT_TEACHERS_ATTENDANCE, None, True, "средняя посещаемость преподавателя, %"),
+    "checked": (REPORT_CHECKED_HOMEWORK, None, False, "проверенные ДЗ, %"),
+    "completion": (REPORT_HW_COMPLETION, None, False, "выполненные ДЗ студента, %"),
+    "homework": (REPORT_STUDENTS, GROUP_HOMEWORK, True, "оценка за ДЗ"),
+    "classroom": (REPORT_STUDENTS, GROUP_CLASSROOM, False, "оценка за КР"),
+}
+
+DEFAULT_LIMITS = REPORT_THRESHOLDS
+
+MAX_LIMITS = 10  # границ в одном пороге (для распределения)
+
+
+def _names(kind):
+    return [name for name, (k, _, _, _) in LIMITS.items() if k == kind]
+
+
+def has_thresholds(kind) -> bool:
+    return any(k == kind for k, _, _, _ in LIMITS.values())
+
+
+def score(report, entry):
+    # В методе 3 в отчёте хранится исходное значение ячейки
+    return to_float(entry.value) if report.kind == REPORT_STUDENTS else entry.value
+
+
+def limit_of(kind, group, limits):
+    """(граница списка, «не больше») для строки раздела group отчёта kind."""
+    for name in _names(kind):
+        _, section, inclusive, _ = LIMITS[name]
+        if section is None or section == group:
+            return (limits.get(name) or DEFAULT_LIMITS[name])[0], inclusive
+    return None
+
+
+def list_threshold(kind, limits):
+    """Порог списка, как его хранит Report.threshold: число или (ДЗ, КР) для метода 3."""
+    values = [(limits.get(name) or DEFAULT_LIMITS[name])[0] for name in _names(kind)]
+    return tuple(values) if len(values) > 1 else values[0]
+
+
+def passes(value, limit, inclusive):
+    return value <= limit if inclusive else value < limit
+
+
+def distribution(values, limits, inclusive) -> tuple:
+    """
+    Число значений в каждом интервале между границами limits (по возрастанию) —
+    один проход с двоичным поиском. Интервалов на один больше, чем границ.
+    """
+    counts = [0] * (len(limits) + 1)
+    find = bisect_left if inclusive else bisect_right
+    for value in values:
+        counts[find(limits, value)] += 1
+    return tuple(counts)
+
+
+def apply_thresholds(report, limits):
+    """
+    Отчёт со всеми строками -> отчёт под пороги limits (имя -> кортеж границ).
+    Первая граница — порог списка, при нескольких границах добавляется распределение.
+    Отчёт, к которому порог уже применён (или без порогов вообще), возвращается как есть.
+    """
+    names = _names(report.kind)
+    if not names or report.error is not None or report.threshold is not None:
+        return report
+
+    entries = report.entries
+    spread = []
+    for name in names:
+        _, group, inclusive, _ = LIMITS[name]
+        bounds = limits.get(name) or DEFAULT_LIMITS[name]
+        if len(bounds) > 1:
+            selected = entries if group is None else [e for e in entries if e.group == group]
+            edges = tuple(sorted(set(bounds)))
+            if report.kind == REPORT_CHECKED_HOMEWORK:
+                # Распределение — по каждому периоду отдельно
+                for period in report.groups:
+                    values = [e.value for e in selected if e.group == period]
+                    spread.append((period, edges, distribution(values, edges, inclusive), inclusive))
+            else:
+                values = [score(report, e) for e in selected]
+                spread.append((group or "", edges, distribution(values, edges, inclusive), inclusive))
+
+    below = []
+    by_group = {}
+    for e in entries:
+        limit = by_group.get(e.group)
+        if limit is None:
+            limit = by_group[e.group] = limit_of(report.kind, e.group, limits)
+        if passes(score(report, e), *limit):
+            below.append(e)
+
+    return replace(report, entries=below, threshold=list_threshold(report.kind, limits), distribution=tuple(spread))
+
+
+def worst(report, limits, n):
+    """
+    Превью отчёта со всеми строками: по разделам — (раздел, строк под порогом,
+    n худших строк по возрастанию значения). Худшие выбирает heapq.nsmallest —
+    куча размера n, а не сортировка всех строк под порогом.
+    """
+    entries = report.entries
+    if report.kind == REPORT_STUDENTS:
+        values = [to_float(e.value) for e in entries]
+    else:
+        values = [e.value for e in entries]
+    groups = [e.group for e in entries]
+    # dict.fromkeys — разделы в порядке первого появления
+    present = dict.fromkeys(groups)
+
+    sections = []
+    for group in report.groups or tuple(present):
+        limit, inclusive = limit_of(report.kind, group, limits)
+        below = operator.le if inclusive else operator.lt
+        if len(present) == 1 and group in present:
+            index = [i for i, value in enumerate(values) if below(value, limit)]
+        else:
+            index = [i for i, (value, g) in enumerate(zip(values, groups)) if g == group and below(value, limit)]
+        # nsmallest устойчива: при равных значениях — строки в порядке файла, как в полном отчёте
+        top = heapq.nsmallest(n, index, key=values.__getitem__)
+        sections.append((group, len(index), [entries[i] for i in top]))
+    return sections
+
+
+def with_threshold(report, threshold):
+    """Порог одного отчёта, как его передают функциям report_*: число или (ДЗ, КР) для метода 3."""
+    if threshold is None:
+        return report
+    values = threshold if isinstance(threshold, tuple) else (threshold,)
+    return apply_thresholds(report, {name: (value,) for name, value in zip(_names(report.kind), values)})
+
+
+def is_scored(value) -> bool:
+    # Строки без числа (и nan) в отчёт со всеми строками не попадают
+    return value is not None and not math.isnan(value)
+
+
+# ---------- Разбор и вывод настроек ----------
+
+def parse_limits(args) -> tuple:
+    """Аргументы команды /threshold -> кортеж границ; ValueError с текстом для пользователя."""
+    if not args:
+        raise ValueError("укажите хотя бы одно число")
+    if len(args) > MAX_LIMITS:
+        raise ValueError(f"не больше {MAX_LIMITS} границ")
+    values = []
+    for arg in args:
+        try:
+            value = float(arg.strip().rstrip("%").replace(",", "."))
+        except ValueError:
+            raise ValueError(f"«{arg}» — не число") from None
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f"«{arg}» — порог должен быть неотрицательным числом")
+        values.append(value)
+    return tuple(values)
+
+
+def format_limits(name, bounds) -> str:
+    _, _, inclusive, _ = LIMITS[name]
+    sign = "≤" if inclusive else "<"
+    text = f"{sign} {bounds[0]:g}"
+    if len(bounds) > 1:
+        text += " (распределение: " + " / ".join(f"{b:g}" for b in sorted(set(bounds))) + ")"
+    return text
@@ -0,0 +1,113 @@
+import os
+import pickle
+import tempfile
+import time
+from collections import OrderedDict
+
+
+class UploadStore:
+    """
+    Последние загрузки пользователей (уже разобранные результаты, не сырые байты).
+    Общий бюджет памяти max_bytes: самые давно использованные записи сверх бюджета
+    выгружаются во временные файлы, а сверх max_spill_bytes — удаляются совсем.
+    Записи старше ttl секунд удаляются. Размер записи — size из put (например,
+    оценка reports.result_size), а если он не передан — длина pickle значения.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=6 * 3600, spill_dir=None, max_spill_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.size_bytes = 0     # сколько занимают записи в памяти
+        self.spilled_bytes = 0  # сколько занимают записи на диске
+        self._memory = OrderedDict()   # key -> (stored_at, size, value)
+        self._spilled = OrderedDict()  # key -> (stored_at, size, path)
+
+    def __len__(self):
+        return len(self._memory) + len(self._spilled)
+
+    def put(self, key, value, size=None):
+        self.discard(key)
+        self._expire()
+
+        if size is None:
+            size = len(pickle.dumps(value))
+        self._memory[key] = (time.time(), size, value)
+        self.size_bytes += size
+        self._enforce_budget()
+
+    def get(self, key):
+        self._expire()
+
+        item = self._memory.get(key)
+        if item is not None:
+            self._memory.move_to_end(key)
+            return item[2]
+
+        item = self._spilled.pop(key, None)
+        if item is None:
+            return None
+
+        stored_at, size, path = item
+        self.spilled_bytes -= size
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        finally:
+            _remove_file(path)
+
+        # Вернули в память как самую свежую запись, время жизни прежнее
+        self._memory[key] = (stored_at, size, value)
+        self.size_bytes += size
+        self._enforce_budget()
+        return value
+
+    def discard(self, key):
+        item = self._memory.pop(key, None)
+        if item is not None:
+            self.size_bytes -= item[1]
+
+        item = self._spilled.pop(key, None)
+        if item is not None:
+            self.spilled_bytes -= item[1]
+            _remove_file(item[2])
+
+    def clear(self):
+        for key in list(self._memory) + list(self._spilled):
+            self.discard(key)
+
+    def _expire(self):
+        deadline = time.time() - self.ttl
+        for items in (self._memory, self._spilled):
+            for key, item in list(items.items()):
+                if item[0] < deadline:
+                    self.discard(key)
+
+    def _enforce_budget(self):
+        while self.size_bytes > self.max_bytes and len(self._memory) > 1:
+            key, (stored_at, size, value) = self._memory.popitem(last=False)
+            self.size_bytes -= size
+            self._spill(key, stored_at, size, value)
+
+        while self.spilled_bytes > self.max_spill_bytes and self._spilled:
+            oldest = next(iter(self._spilled))
+            self.discard(oldest)
+
+    def _spill(self, key, stored_at, size, value):
+        if size > self.max_spill_bytes:
+            return
+
+        fd, path = tempfile.mkstemp(prefix="upload_", suffix=".pickle", dir=self.spill_dir)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self._spilled[key] = (stored_at, size, path)
+        self.spilled_bytes += size
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,19 +1,224 @@
-from telegram import Update
+import asyncio
+import re
+import time
+from datetime import timedelta
+
+from telegram import InputFile, Update
 from telegram.constants import ParseMode
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
 
-async def send_long_message(update: Update, text: str):
-    LIMIT = 4050
+from config import (
+    SEND_GLOBAL_RATE,
+    SEND_PRIVATE_CHAT_RATE,
+    SEND_GROUP_CHAT_RATE,
+    SEND_CHAT_BURST,
+    SEND_MAX_RETRIES,
+)
 
-    if len(text) <= LIMIT:
-        await update.message.reply_text(text, parse_mode=ParseMode.HTML)
-        return
+LIMIT = 4050
 
-    buffer = ""
+TAG_REGEX = re.compile(r"<(/?)([a-zA-Z]+)[^>]*>")
+
+
+# ---------- Разбиение HTML на сообщения ----------
+
+def _safe_cut(line: str, limit: int) -> int:
+    # Не режем посередине тега <...> или сущности &...;
+    cut = limit
+    lt = line.rfind("<", 0, cut)
+    if lt != -1 and line.find(">", lt, cut) == -1:
+        cut = lt
+    amp = line.rfind("&", 0, cut)
+    if amp != -1 and line.find(";", amp, cut) == -1:
+        cut = amp
+    return cut if cut > 0 else limit
+
+
+def _pieces(text: str, limit: int):
     for line in text.splitlines(keepends=True):
-        if len(buffer) + len(line) > LIMIT:
-            await update.message.reply_text(buffer, parse_mode=ParseMode.HTML)
-            buffer = ""
-        buffer += line
+        while len(line) > limit:
+            cut = _safe_cut(line, limit)
+            yield line[:cut]
+            line = line[cut:]
+        if line:
+            yield line
+
+
+def _track_tags(open_tags: list, piece: str):
+    for m in TAG_REGEX.finditer(piece):
+        closing, name = m.group(1), m.group(2).lower()
+        if not closing:
+            open_tags.append((name, m.group(0)))
+            continue
+        for i in range(len(open_tags) - 1, -1, -1):
+            if open_tags[i][0] == name:
+                del open_tags[i]
+                break
+
+
+def split_html(text: str, limit=LIMIT) -> list:
+    """Режет текст по строкам; открытые теги закрываются в конце части и открываются в следующей."""
+    if len(text) <= limit:
+        return [text]
+
+    chunks = []
+    buffer = ""
+    open_tags = []
+
+    for piece in _pieces(text, limit):
+        if buffer and len(buffer) + len(piece) > limit:
+            chunks.append(buffer + "".join(f"</{name}>" for name, _ in reversed(open_tags)))
+            buffer = "".join(tag for _, tag in open_tags)
+        buffer += piece
+        _track_tags(open_tags, piece)
 
     if buffer:
-        await update.message.reply_text(buffer, parse_mode=ParseMode.HTML)
+        chunks.append(buffer)
+
+    return [c for c in chunks if c.strip()]
+
+
+# ---------- Скачивание файла ----------
+
+class _Sink:
+    """
+    Приёмник для File.download_to_memory: сохраняет ссылки на полученные байты, не копируя их.
+    PTB получает файл одним объектом bytes и передаёт его одним write().
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data) -> int:
+        self.parts.append(data)
+        return len(data)
+
+
+async def download_bytes(tg_file) -> bytes:
+    """Скачивает файл в единственный буфер — тот же объект bytes, который вернул HTTP-клиент."""
+    sink = _Sink()
+    await tg_file.download_to_memory(sink)
+    if len(sink.parts) == 1 and isinstance(sink.parts[0], bytes):
+        return sink.parts[0]
+    return b"".join(sink.parts)
+
+
+# ---------- Очередь отправки с учётом лимитов Telegram ----------
+
+class RateBudget:
+    """Token bucket: rate сообщений в секунду, не больше burst подряд."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _ChatState:
+    __slots__ = ("lock", "budget", "last_used")
+
+    def __init__(self, rate, burst):
+        self.lock = asyncio.Lock()
+        self.budget = RateBudget(rate, burst)
+        self.last_used = time.monotonic()
+
+
+class SendQueue:
+    """
+    Отправка частей отчёта: части одного чата уходят строго по порядку,
+    разные чаты отправляются параллельно в рамках общего бюджета.
+    RetryAfter выжидается, сетевые ошибки повторяются с экспоненциальной задержкой.
+    TimedOut не повторяется: сообщение по нему часто уже доставлено, повтор дал бы дубль.
+    """
+
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, max_retries=SEND_MAX_RETRIES, backoff=0.5):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._global = RateBudget(global_rate, global_rate)
+        self._chats = {}
+
+    def _chat(self, chat_id) -> _ChatState:
+        state = self._chats.get(chat_id)
+        if state is None:
+            self._prune()
+            # В группах Telegram разрешает около 20 сообщений в минуту
+            rate = SEND_GROUP_CHAT_RATE if chat_id < 0 else SEND_PRIVATE_CHAT_RATE
+            state = self._chats[chat_id] = _ChatState(rate, SEND_CHAT_BURST)
+        state.last_used = time.monotonic()
+        return state
+
+    def _prune(self, idle=600):
+        if len(self._chats) < 1000:
+            return
+        deadline = time.monotonic() - idle
+        for chat_id, state in list(self._chats.items()):
+            if state.last_used < deadline and not state.lock.locked():
+                del self._chats[chat_id]
+
+    async def send(self, message, chunks, reply_markup=None):
+        # Кнопки (reply_markup) — под последней частью
+        state = self._chat(message.chat_id)
+        async with state.lock:
+            for i, chunk in enumerate(chunks, 1):
+                markup = reply_markup if i == len(chunks) else None
+                await self._send_one(state, lambda: message.reply_text(
+                    chunk, parse_mode=ParseMode.HTML, reply_markup=markup,
+                ))
+
+    async def send_document(self, message, payload: bytes, filename: str, caption=None):
+        state = self._chat(message.chat_id)
+        async with state.lock:
+            await self._send_one(state, lambda: message.reply_document(
+                document=InputFile(payload, filename=filename),
+                caption=caption,
+                parse_mode=ParseMode.HTML,
+            ))
+
+    async def _send_one(self, state, send):
+        attempt = 0
+        while True:
+            await state.budget.acquire()
+            await self._global.acquire()
+            try:
+                return await send()
+            except RetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(_seconds(e.retry_after))
+            except BadRequest:
+                raise
+            except TimedOut as e:
+                # Ответа не дождались, но запрос мог дойти — считаем часть отправленной
+                print(f"Отправка: нет ответа от Telegram ({e}), часть не отправляется повторно")
+                return None
+            except NetworkError:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+
+def _seconds(value) -> float:
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+send_queue = SendQueue()
+
+
+async def send_long_message(update: Update, text: str, reply_markup=None):
+    await send_queue.send(update.message, split_html(text), reply_markup)
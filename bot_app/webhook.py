@@ -0,0 +1,228 @@
+"""
+Режим webhook: Telegram присылает апдейты POST-запросами, а не бот забирает их
+через getUpdates. Несколько копий бота за балансировщиком принимают апдейты
+параллельно.
+
+HTTP-сервер — asyncio.start_server без сторонних библиотек (встроенный
+run_webhook из python-telegram-bot требует tornado). TLS снимает обратный
+прокси (nginx и т.п.), сюда приходит обычный HTTP.
+
+Остановка (SIGINT/SIGTERM): сервер перестаёт принимать соединения — Telegram
+повторит недоставленные апдейты, — затем Application.stop() дожидается уже
+принятых апдейтов вместе с их разбором в пуле, и только после этого бот
+закрывается.
+"""
+import asyncio
+import json
+import signal
+
+from telegram import Update
+
+MAX_HEADER_BYTES = 16 * 1024
+KEEP_ALIVE_TIMEOUT = 60        # секунд ожидания следующего запроса в соединении
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large"}
+
+
+class HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class WebhookServer:
+    """
+    Принимает апдейты на path и кладёт их в application.update_queue.
+    Если задан secret, запросы без правильного заголовка
+    X-Telegram-Bot-Api-Secret-Token отклоняются.
+    """
+
+    def __init__(self, application, listen="0.0.0.0", port=8443, path="/telegram", secret=None,
+                 max_body=1024 * 1024):
+        self.application = application
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret = secret or None
+        self.max_body = max_body
+        self.received = 0
+        self.rejected = 0
+        self._server = None
+        self._closing = False
+        self._idle = set()       # соединения, ждущие следующего запроса
+        self._handlers = set()   # задачи открытых соединений
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.listen, self.port, limit=MAX_HEADER_BYTES)
+        # При port=0 порт выбирает система — нужен настоящий
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Перестать принимать запросы и дождаться уже начатых."""
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._idle):
+            writer.close()
+        if self._handlers:
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+            self._server = None
+
+    # ---------- HTTP ----------
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            while not self._closing:
+                self._idle.add(writer)
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                        ConnectionError):
+                    break
+                finally:
+                    self._idle.discard(writer)
+
+                try:
+                    keep_alive = await self._request(head, reader, writer)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if not keep_alive:
+                    break
+        finally:
+            self._handlers.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _request(self, head, reader, writer) -> bool:
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await self._respond(writer, 400, keep_alive=False)
+            return False
+
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+        try:
+            length = int(headers["content-length"])
+        except (KeyError, ValueError):
+            length = None
+        if length is not None and length > self.max_body:
+            # Тело не читаем — соединение закрывается
+            self.rejected += 1
+            await self._respond(writer, 413, keep_alive=False)
+            return False
+
+        # Путь, метод и секрет проверяются до чтения тела: чужой запрос не читаем
+        try:
+            self._check(method, target.split("?", 1)[0], headers, length)
+        except HttpError as e:
+            self.rejected += 1
+            # Непрочитанное тело осталось в соединении — его приходится закрыть
+            keep_alive = keep_alive and not length
+            await self._respond(writer, e.status, keep_alive)
+            return keep_alive
+
+        body = await reader.readexactly(length) if length else b""
+        try:
+            payload = json.loads(body)
+            if not isinstance(payload, dict):
+                raise ValueError("апдейт — не JSON-объект")
+            update = Update.de_json(payload, self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            self.rejected += 1
+            await self._respond(writer, 400, keep_alive)
+            return keep_alive
+
+        # Принятый апдейт обрабатывается и при остановке: очередь разбирает Application.stop()
+        self.received += 1
+        await self.application.update_queue.put(update)
+        keep_alive = keep_alive and not self._closing
+        await self._respond(writer, 200, keep_alive)
+        return keep_alive
+
+    def _check(self, method, path, headers, length):
+        if path != self.path:
+            raise HttpError(404)
+        if method != "POST":
+            raise HttpError(405)
+        if self.secret is not None and headers.get(SECRET_HEADER) != self.secret:
+            raise HttpError(403)
+        if length is None:
+            raise HttpError(411)
+
+    @staticmethod
+    async def _respond(writer, status, keep_alive):
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("ascii")
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+# ---------- Запуск ----------
+
+def _stop_on_signals(stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: Ctrl+C отменяет asyncio.run, остановка идёт через finally
+            pass
+
+
+async def run_webhook(application, url, listen="0.0.0.0", port=8443, path="/telegram", secret=None,
+                      max_connections=40, stop=None):
+    """
+    Аналог application.run_polling() для webhook: запуск, регистрация адреса url + path
+    в Telegram и работа до сигнала (или до stop.set()), затем мягкая остановка.
+    """
+    if stop is None:
+        stop = asyncio.Event()
+        _stop_on_signals(stop)
+
+    server = WebhookServer(application, listen, port, path, secret)
+    await application.initialize()
+    if application.post_init is not None:
+        await application.post_init(application)
+    await application.start()
+    try:
+        await server.start()
+        # Адрес остаётся зарегистрированным и после остановки: апдейты подождут
+        # в Telegram или уйдут другой копии бота
+        await application.bot.set_webhook(
+            url=url.rstrip("/") + path,
+            secret_token=secret or None,
+            max_connections=max_connections,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        print(f"Webhook: слушаю {server.listen}:{server.port}{path}")
+        await stop.wait()
+    finally:
+        print("Остановка: дожидаюсь принятых апдейтов и разбора файлов...")
+        await server.stop()
+        await application.stop()
+        if application.post_stop is not None:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown is not None:
+            await application.post_shutdown(application)
@@ -0,0 +1,125 @@
+"""
+Процессы разбора для PARSE_BACKEND = "queue": берут задания из очереди
+(job_queue.py), разбирают файл тем же process_batch, что и бот, и записывают
+результат. Бот при этом занимается только Telegram.
+
+Запуск — на той же машине, что и бот (SQLite-очередь на сетевой папке не работает):
+    python bot_app/worker.py
+    python bot_app/worker.py --processes 4
+
+Упавший процесс перезапускается, а его задание после истечения аренды
+забирает другой процесс. По Ctrl+C / SIGTERM процессы дорабатывают текущее
+задание и выходят.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from config import (
+    JOB_QUEUE_PATH,
+    JOB_SPOOL_DIR,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RESULT_TTL,
+    JOB_WORKER_TIMEOUT,
+    WORKER_PROCESSES,
+    WORKER_IDLE_SLEEP,
+)
+from job_queue import JobQueue
+
+
+def open_queue() -> JobQueue:
+    return JobQueue(
+        JOB_QUEUE_PATH,
+        JOB_SPOOL_DIR,
+        lease=JOB_LEASE_SECONDS,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        result_ttl=JOB_RESULT_TTL,
+        worker_timeout=JOB_WORKER_TIMEOUT,
+    )
+
+
+def _keep_lease(queue, job_id, worker, done):
+    # Продлеваем аренду, пока идёт разбор; задание отдали другому — дальше не продлеваем.
+    # Заодно отмечаемся живыми: длинный разбор не должен выглядеть как остановленный воркер
+    while not done.wait(min(queue.lease, queue.worker_timeout) / 3):
+        queue.heartbeat(worker)
+        if not queue.extend(job_id, worker):
+            return
+
+
+def run_job(queue, worker, job):
+    # Импорт здесь: процесс-надзиратель разбор не выполняет
+    from batch import process_batch
+    from excel_parser import PROCESSING_ERROR
+    from stats import run_timed
+
+    job_id, data, report_id, params = job
+    done = threading.Event()
+    keeper = threading.Thread(target=_keep_lease, args=(queue, job_id, worker, done), daemon=True)
+    keeper.start()
+    try:
+        result = run_timed(process_batch, data, streaming=params.get("streaming", True))
+    except Exception as e:
+        queue.fail(job_id, worker, f"{PROCESSING_ERROR}: {e}")
+    else:
+        queue.complete(job_id, worker, result)
+    finally:
+        done.set()
+        keeper.join()
+
+
+def work(stop):
+    # Ctrl+C ловит надзиратель; по сигналам процесс дорабатывает задание и выходит по stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    queue = open_queue()
+    beat = 0.0
+    while not stop.is_set():
+        if time.monotonic() >= beat:
+            queue.heartbeat(worker)
+            beat = time.monotonic() + queue.worker_timeout / 3
+        job = queue.claim(worker)
+        if job is None:
+            stop.wait(WORKER_IDLE_SLEEP)
+            continue
+        run_job(queue, worker, job)
+    queue.leave(worker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Процессы разбора файлов из очереди заданий бота")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES or os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    open_queue()  # создаёт базу и папку файлов, если их ещё нет
+    stop = multiprocessing.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    # Не daemon: process_batch сам запускает процессы для книг с несколькими листами
+    processes = {}
+    print(f"Воркеры разбора: {args.processes}, очередь {JOB_QUEUE_PATH}")
+    while not stop.is_set():
+        for slot in range(args.processes):
+            proc = processes.get(slot)
+            if proc is None or not proc.is_alive():
+                if proc is not None:
+                    print(f"Воркер {proc.pid} завершился с кодом {proc.exitcode} — перезапускаю")
+                proc = multiprocessing.Process(target=work, args=(stop,), name=f"parse-worker-{slot}")
+                proc.start()
+                processes[slot] = proc
+        stop.wait(1)
+
+    print("Остановка: воркеры дорабатывают текущие задания...")
+    for proc in processes.values():
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
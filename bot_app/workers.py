@@ -0,0 +1,200 @@
+import asyncio
+import functools
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+
+class QueueFull(Exception):
+    pass
+
+
+class UserQueueFull(QueueFull):
+    """Очередь одного пользователя заполнена (общая — ещё нет)."""
+
+
+class Superseded(Exception):
+    """Задание заменено более новым (тот же файл от того же пользователя)."""
+
+
+class ParsePool:
+    """Пул для тяжёлого разбора Excel вне event loop, с ограниченной очередью."""
+
+    def __init__(self, kind="thread", max_workers=2, max_queue=20):
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        elif kind == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="parse")
+        else:
+            raise ValueError(f"Неизвестный тип пула: {kind}")
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.running = 0
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_workers)
+
+    async def submit(self, func, *args, on_queued=None, **kwargs):
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                raise QueueFull()
+
+            self.waiting += 1
+            try:
+                if on_queued is not None:
+                    await on_queued(self.waiting)
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class _Ticket:
+    __slots__ = ("user", "key", "started", "superseded")
+
+    def __init__(self, user, key):
+        self.user = user
+        self.key = key
+        self.started = asyncio.get_running_loop().create_future()
+        self.superseded = False
+
+
+class FairScheduler:
+    """
+    Допуск к разбору перед пулом: не больше slots заданий одновременно и не больше
+    per_user у одного пользователя. Ожидающие задания стоят в очереди своего
+    пользователя, свободное место получает следующий по кругу пользователь —
+    один пользователь с десятком файлов не задерживает остальных.
+
+    Задание с тем же key (тот же файл в том же чате), присланное повторно, заменяет
+    прежнее: ожидающее снимается с очереди (Superseded), у уже идущего выставляется
+    ticket.superseded — его результат отправлять не нужно. Замена происходит только
+    после допуска: если новому заданию нет места (QueueFull), прежнее остаётся в силе.
+    """
+
+    def __init__(self, slots, per_user=1, max_queue=20, max_user_queue=3):
+        self.slots = slots
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self.max_user_queue = max_user_queue
+        self.active = 0
+        self.waiting = 0
+        self._running = Counter()       # пользователь -> заданий в работе
+        self._queues = OrderedDict()    # пользователь -> deque ожидающих; порядок — очередь обхода
+        self._by_key = {}               # key -> последний _Ticket
+
+    @asynccontextmanager
+    async def slot(self, user, key=None, on_queued=None):
+        ticket = _Ticket(user, key)
+        # Сначала проверка места, потом замена: отказ не должен снимать прежнее задание
+        self._admit(user, self._by_key.get(key) if key is not None else None)
+        if key is not None:
+            self._supersede(key)
+            self._by_key[key] = ticket
+
+        try:
+            # Свободное место при непустой очереди бывает, только если все ожидающие
+            # упёрлись в per_user, — тогда новый пользователь начинает сразу
+            if self._can_start(user) and user not in self._queues:
+                self._start(ticket)
+            else:
+                await self._wait(ticket, on_queued)
+            try:
+                yield ticket
+            finally:
+                self._finish(ticket)
+        finally:
+            if key is not None and self._by_key.get(key) is ticket:
+                del self._by_key[key]
+
+    def _supersede(self, key):
+        old = self._by_key.get(key)
+        if old is None:
+            return
+        old.superseded = True
+        queue = self._queues.get(old.user)
+        if queue is not None and old in queue:
+            self._drop(old)
+            old.started.set_exception(Superseded())
+
+    def _admit(self, user, replaced):
+        # Ожидающее задание, которое заменит новое, своё место в очереди освободит
+        freed = replaced is not None and replaced in self._queues.get(replaced.user, ())
+        queued = len(self._queues.get(user, ())) - (freed and replaced.user == user)
+        if self._can_start(user) and not queued:
+            return
+        if self.waiting - freed >= self.max_queue:
+            raise QueueFull()
+        if queued >= self.max_user_queue:
+            raise UserQueueFull()
+
+    async def _wait(self, ticket, on_queued):
+        self._queues.setdefault(ticket.user, deque()).append(ticket)
+        self.waiting += 1
+        try:
+            if on_queued is not None:
+                await on_queued(self.waiting)
+            await ticket.started
+        except BaseException:
+            started = ticket.started
+            if started.done() and not started.cancelled() and started.exception() is None:
+                # Слот уже выдан, но задача отменена — вернуть его
+                self._finish(ticket)
+            else:
+                # Снято с очереди (отмена задачи, замена) — место в очереди освобождается
+                self._drop(ticket)
+            raise
+
+    def _drop(self, ticket):
+        queue = self._queues.get(ticket.user)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        self.waiting -= 1
+        if not queue:
+            del self._queues[ticket.user]
+
+    def _can_start(self, user) -> bool:
+        return self.active < self.slots and self._running[user] < self.per_user
+
+    def _start(self, ticket):
+        self.active += 1
+        self._running[ticket.user] += 1
+
+    def _finish(self, ticket):
+        self.active -= 1
+        self._running[ticket.user] -= 1
+        if not self._running[ticket.user]:
+            del self._running[ticket.user]
+        self._dispatch()
+
+    def _dispatch(self):
+        # Круговой обход: первый пользователь, которому можно начать, уходит в конец очереди обхода
+        while self.active < self.slots:
+            user = next((u for u in self._queues if self._running[u] < self.per_user), None)
+            if user is None:
+                return
+            queue = self._queues[user]
+            ticket = queue.popleft()
+            self.waiting -= 1
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            self._start(ticket)
+            ticket.started.set_result(None)
+
+    def gauges(self) -> dict:
+        return {"users_waiting": len(self._queues), "scheduled": self.active}
@@ -0,0 +1,426 @@
+"""
+Быстрое чтение значений листа .xlsx без объектной модели openpyxl.
+
+Читаются только workbook.xml, связи, стили (какие форматы — даты), sharedStrings.xml
+(потоково, через expat) и XML нужного листа. Лист разбирается кусками по строкам
+<row>: ячейки <c> выбираются скомпилированными регулярными выражениями — разметка
+ячеек в xlsx фиксирована, а вызов Python-обработчика expat на каждый элемент
+съедает почти весь выигрыш.
+
+Значения и форма строк те же, что у openpyxl load_workbook(read_only=True, data_only=True)
+и iter_rows(values_only=True) после reset_dimensions(): <dimension> в выгрузках сторонних
+программ бывает устаревшим, поэтому читается весь sheetData. Если файл устроен необычно (префиксы пространств имён,
+CDATA, комментарии, не UTF-8), FastSheet не создаётся (FastUnsupported) и вызывающий
+код открывает лист через openpyxl.
+"""
+import io
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils.datetime import from_excel, from_ISO8601, WINDOWS_EPOCH, MAC_EPOCH
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+# Имена элементов так, как их отдаёт expat с namespace_separator="}"
+_SST = MAIN_NS + "}sst"
+_SI = MAIN_NS + "}si"
+_T = MAIN_NS + "}t"
+_R = MAIN_NS + "}r"
+
+CHUNK_SIZE = 256 * 1024
+
+_ROOT_RE = re.compile(rb'^(?:\xef\xbb\xbf)?\s*(?:<\?xml([^>]*)\?>\s*)?<worksheet\b([^>]*)>')
+_ENCODING_RE = re.compile(rb'encoding\s*=\s*["\']([^"\']+)["\']')
+_DEFAULT_NS_RE = re.compile(rb'\sxmlns\s*=\s*["\']([^"\']+)["\']')
+_DIMENSION_RE = re.compile(rb'<dimension\b[^>]*?\sref\s*=\s*["\']([^"\']*)["\']')
+_SHEET_DATA_RE = re.compile(rb'<sheetData\b[^>]*?(/?)>')
+# Разметка, которую регулярные выражения не понимают, — такой лист читает openpyxl
+_UNSUPPORTED = (b"<![CDATA[", b"<!--", b"<!DOCTYPE", b"<!ENTITY")
+
+# Начало строки или ячейка целиком. Excel, LibreOffice и openpyxl пишут r первым
+# атрибутом — он берётся сразу, остальные атрибуты (их сочетаний на листе немного)
+# разбираются один раз и кэшируются. Типичное тело ячейки (<f>?<v>?) разбирается
+# тут же; если закрывающего </c> сразу за ним нет (строка в <is>), тело ищется отдельно.
+_TOKEN_RE = re.compile(rb"""
+    <row(?:\sr="(\d+)")?([^>]*)>
+  | <c(?:\sr="([A-Z]*)\d*")?([\s/][^>]*|)>
+        (?:<f\b[^>]*>(?:[^<]*</f>)?)?
+        (?:<v>([^<]*)</v>)?
+        (</c>)?
+""", re.X)
+_ATTR_RE = re.compile(rb'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_V_RE = re.compile(rb'<v\b[^>]*?>([^<]*)</v>')
+_IS_RE = re.compile(rb'<is\b[^>]*?>(.*?)</is>', re.S)
+_RPH_RE = re.compile(rb'<rPh\b.*?(?:/>|</rPh>)', re.S)
+_T_RE = re.compile(rb'<t\b[^>]*?(?:/>|>([^<]*)</t>)')
+_ENTITY_RE = re.compile(r"&(#x[0-9a-fA-F]+|#[0-9]+|lt|gt|amp|quot|apos);")
+_ENTITIES = {"lt": "<", "gt": ">", "amp": "&", "quot": '"', "apos": "'"}
+
+
+class FastUnsupported(Exception):
+    pass
+
+
+# ---------- Структура книги ----------
+
+def _rels(zf, path):
+    base = posixpath.dirname(posixpath.dirname(path))
+    tree = ET.fromstring(zf.read(path))
+    result = {}
+    for rel in tree.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            target = target[1:]
+        else:
+            target = posixpath.normpath(posixpath.join(base, target))
+        result[rel.get("Id")] = (rel.get("Type", ""), target)
+    return result
+
+
+def worksheet_parts(zf: zipfile.ZipFile) -> list:
+    """
+    [(имя листа, путь к XML)] рабочих листов в порядке wb.worksheets у openpyxl
+    (листы-диаграммы пропускаются).
+    """
+    rels = _rels(zf, "xl/_rels/workbook.xml.rels")
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    parts = []
+    for sheet in workbook.iter(f"{{{MAIN_NS}}}sheet"):
+        rel = rels.get(sheet.get(f"{{{REL_NS}}}id"))
+        if rel is not None and rel[0].endswith("/worksheet"):
+            parts.append((sheet.get("name"), rel[1]))
+    return parts
+
+
+def _epoch(zf):
+    workbook = ET.fromstring(zf.read("xl/workbook.xml"))
+    pr = workbook.find(f"{{{MAIN_NS}}}workbookPr")
+    if pr is not None and (pr.get("date1904") or "").lower() in ("1", "true"):
+        return MAC_EPOCH
+    return WINDOWS_EPOCH
+
+
+def _date_styles(zf, rels):
+    # Те же индексы стилей с форматом даты, что openpyxl строит при загрузке книги.
+    # timedelta_formats read-only лист не учитывает — длительности тоже отдаются как datetime
+    path = next((target for kind, target in rels.values() if kind.endswith("/styles")), None)
+    if path is None or path not in zf.namelist():
+        return set()
+    stylesheet = Stylesheet.from_tree(ET.fromstring(zf.read(path)))
+    if not stylesheet.cell_styles:
+        return set()
+    return stylesheet.date_formats
+
+
+# ---------- Общие строки ----------
+
+def read_shared_strings(zf, path) -> list:
+    """
+    Текст каждого <si> как Text.content у openpyxl: прямой <t> и <t> внутри <r>,
+    без фонетических подсказок <rPh>.
+    """
+    strings = []
+    stack = []
+    parts = None
+    collect = False
+
+    def start(name, attrs):
+        nonlocal parts, collect
+        if not stack and name != _SST:
+            raise FastUnsupported(f"неизвестный корень sharedStrings: {name}")
+        if name == _SI:
+            parts = []
+        elif name == _T and parts is not None:
+            collect = stack[-1] == _SI or (stack[-1] == _R and stack[-2] == _SI)
+        stack.append(name)
+
+    def end(name):
+        nonlocal parts, collect
+        stack.pop()
+        if name == _T:
+            collect = False
+        elif name == _SI:
+            strings.append("".join(parts).replace("x005F_", ""))
+            parts = None
+
+    def data(text):
+        if collect:
+            parts.append(text)
+
+    parser = expat.ParserCreate(namespace_separator="}")
+    parser.buffer_text = True
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = data
+    with zf.open(path) as f:
+        parser.ParseFile(f)
+    return strings
+
+
+# ---------- Лист ----------
+
+_COLUMNS = {}
+
+
+def _column_index(letters):
+    # Ключ — str или bytes (буквы прямо из XML листа)
+    index = _COLUMNS.get(letters)
+    if index is None:
+        index = 0
+        for ch in letters.decode("ascii") if isinstance(letters, bytes) else letters:
+            index = index * 26 + ord(ch) - 64
+        _COLUMNS[letters] = index
+    return index
+
+
+def _attrs(raw: bytes) -> dict:
+    return {m[0]: m[1] or m[2] for m in _ATTR_RE.findall(raw)}
+
+
+def _cell_attrs(rest: bytes):
+    # (t, s, самозакрытый тег, буквы колонки из r — если r был не первым)
+    attrs = _attrs(rest)
+    ref = attrs.get(b"r")
+    letters = ref.decode("ascii").rstrip("0123456789") if ref else None
+    return attrs.get(b"t"), attrs.get(b"s"), rest.endswith(b"/"), letters
+
+
+def _entity(match):
+    name = match.group(1)
+    if name[0] == "#":
+        return chr(int(name[2:], 16) if name[1] in "xX" else int(name[1:]))
+    return _ENTITIES[name]
+
+
+def _text(raw: bytes) -> str:
+    # То, что отдал бы XML-парсер: переводы строк нормализованы, сущности раскрыты
+    text = raw.decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    if "&" in text:
+        text = _ENTITY_RE.sub(_entity, text)
+    return text
+
+
+class FastSheet:
+    """
+    Лист, открытый без openpyxl; iter_rows совпадает с ReadOnlyWorksheet.iter_rows(values_only=True)
+    после reset_dimensions(). dimension — ref из <dimension> как есть, только подсказка:
+    строки и ячейки за его границами тоже читаются.
+    """
+
+    def __init__(self, data, sheet=0):
+        try:
+            self._zip = zipfile.ZipFile(io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data)
+            self._path = worksheet_parts(self._zip)[sheet][1]
+            rels = _rels(self._zip, "xl/_rels/workbook.xml.rels")
+            self._epoch = _epoch(self._zip)
+            self._date_formats = _date_styles(self._zip, rels)
+            strings = next((target for kind, target in rels.values() if kind.endswith("/sharedStrings")), None)
+            self._strings = read_shared_strings(self._zip, strings) if strings and strings in self._zip.namelist() else []
+            self.dimension = self._check_sheet()
+            self.max_column = self.max_row = None
+        except FastUnsupported:
+            raise
+        except Exception as e:
+            raise FastUnsupported(str(e)) from e
+
+    def _check_sheet(self):
+        """Проверяет, что лист можно читать регулярными выражениями; возвращает ref из <dimension>."""
+        dimension = None
+        tail = b""
+        first = True
+        with self._zip.open(self._path) as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if first:
+                    first = False
+                    root = _ROOT_RE.match(chunk)
+                    if root is None:
+                        raise FastUnsupported("корневой элемент листа с префиксом или не worksheet")
+                    encoding = _ENCODING_RE.search(root.group(1) or b"")
+                    if encoding and encoding.group(1).lower() not in (b"utf-8", b"utf8"):
+                        raise FastUnsupported(f"кодировка {encoding.group(1)!r}")
+                    ns = _DEFAULT_NS_RE.search(root.group(2))
+                    if ns is None or ns.group(1).decode() != MAIN_NS:
+                        raise FastUnsupported("лист не в пространстве имён spreadsheetml")
+                    data = _SHEET_DATA_RE.search(chunk)
+                    head = chunk[:data.start()] if data else chunk
+                    found = _DIMENSION_RE.search(head)
+                    if found:
+                        dimension = found.group(1).decode()
+                window = tail + chunk
+                for marker in _UNSUPPORTED:
+                    if marker in window:
+                        raise FastUnsupported(f"в листе есть {marker.decode()}")
+                tail = chunk[-16:]
+
+        return dimension
+
+    def _value(self, data_type, v, style):
+        if not v:
+            return None
+        if data_type is None or data_type == b"n":
+            value = float(v) if (b"." in v or b"E" in v or b"e" in v) else int(v)
+            if self._date_formats:
+                style = int(style) if style else 0
+                if style in self._date_formats:
+                    try:
+                        return from_excel(value, self._epoch)
+                    except (OverflowError, ValueError):
+                        return "#VALUE!"
+            return value
+        if data_type == b"s":
+            return self._strings[int(v)]
+        if data_type == b"b":
+            return bool(int(v))
+        if data_type == b"d":
+            return from_ISO8601(_text(v))
+        return _text(v)
+
+    def _complex_value(self, data_type, body, style):
+        # Ячейка с чем-то кроме <f> и <v> — обычно строка прямо в ячейке (<is>)
+        if data_type == b"inlineStr":
+            inline = _IS_RE.search(body)
+            if inline is None:
+                return None
+            runs = _RPH_RE.sub(b"", inline.group(1))
+            return "".join(_text(t) for t in _T_RE.findall(runs))
+        v = _V_RE.search(body)
+        return self._value(data_type, v.group(1) if v else None, style)
+
+    def _parse_rows(self):
+        """(номер строки, [(колонка, значение), ...]) по порядку строк листа."""
+        value = self._value
+        columns = _COLUMNS
+        cell_attrs = {}
+        row_counter = 0
+        cells = None
+        col = 0
+        buffer = b""
+        started = False
+        with self._zip.open(self._path) as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                buffer += chunk
+                if not started:
+                    data = _SHEET_DATA_RE.search(buffer)
+                    if data is None:
+                        if not chunk:
+                            return
+                        continue
+                    if data.group(1):  # <sheetData/>
+                        return
+                    buffer = buffer[data.end():]
+                    started = True
+
+                end = buffer.find(b"</sheetData>") if chunk else len(buffer)
+                finished = end != -1
+                if not finished:
+                    # Последняя строка может быть обрезана границей куска — её разберём со следующим
+                    end = buffer.rfind(b"</row>")
+                    end = 0 if end == -1 else end + len(b"</row>")
+                ready, buffer = buffer[:end], buffer[end:]
+
+                for m in _TOKEN_RE.finditer(ready):
+                    row_ref, row_rest, ref, rest, v, cell_end = m.groups()
+                    if row_rest is not None:
+                        if cells is not None:
+                            yield row_counter, cells
+                        if row_ref is None:
+                            row_ref = _attrs(row_rest).get(b"r")
+                        if row_ref is not None:
+                            try:
+                                row_counter = int(row_ref)
+                            except ValueError:
+                                val = float(row_ref)
+                                if not val.is_integer():
+                                    raise ValueError(f"{row_ref.decode()} is not a valid row number")
+                                row_counter = int(val)
+                        else:
+                            row_counter += 1
+                        cells = []
+                        col = 0
+                        continue
+
+                    parsed = cell_attrs.get(rest)
+                    if parsed is None:
+                        data_type, style, closed, letters = _cell_attrs(rest)
+                        # Число без формата даты — самый частый случай, его конвертируем на месте
+                        number = data_type in (None, b"n") and not (style and int(style) in self._date_formats)
+                        parsed = data_type, style, closed, letters, number
+                        if len(cell_attrs) < 4096:
+                            cell_attrs[rest] = parsed
+                    data_type, style, closed, letters, number = parsed
+                    if ref:
+                        col = columns.get(ref) or _column_index(ref)
+                    elif letters:
+                        col = _column_index(letters)
+                    else:
+                        col += 1
+
+                    if closed:
+                        cells.append((col, None))
+                    elif cell_end is not None:
+                        if number:
+                            if v:
+                                v = float(v) if b"." in v or b"E" in v or b"e" in v else int(v)
+                            else:
+                                v = None
+                            cells.append((col, v))
+                        else:
+                            cells.append((col, value(data_type, v, style)))
+                    else:
+                        body_end = ready.index(b"</c>", m.end())
+                        cells.append((col, self._complex_value(data_type, ready[m.start():body_end], style)))
+
+                if cells is not None:
+                    yield row_counter, cells
+                    cells = None
+
+                if finished or not chunk:
+                    return
+
+    def iter_rows(self, min_row=None, max_row=None, values_only=True):
+        # Повторяет ReadOnlyWorksheet._cells_by_row / _get_row для values_only=True
+        min_row = min_row or 1
+        max_row = max_row or self.max_row
+        max_col = self.max_column
+        empty_row = (None,) * max_col if max_col is not None else ()
+
+        counter = min_row
+        idx = 1
+        for idx, cells in self._parse_rows():
+            if max_row is not None and idx > max_row:
+                break
+
+            for _ in range(counter, idx):
+                counter += 1
+                yield empty_row
+
+            if counter <= idx:
+                counter += 1
+                yield _make_row(cells, max_col)
+
+        if max_row is not None and max_row < idx:
+            for _ in range(counter, max_row + 1):
+                yield empty_row
+
+
+def _make_row(cells, max_col):
+    if not cells and not max_col:
+        return ()
+    width = max_col or cells[-1][0]
+    row = [None] * width
+    for col, value in cells:
+        if 1 <= col <= width:
+            row[col - 1] = value
+    return tuple(row)